@@ -0,0 +1,5 @@
+# benchmarks/__init__.py
+"""
+Benchmarks for the Library Management System. Run them from the repository root,
+e.g. `python -m benchmarks.memory`.
+"""
@@ -0,0 +1,5 @@
+# benchmarks/__main__.py
+
+from benchmarks.hot_paths import main
+
+main()
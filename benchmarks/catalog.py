@@ -0,0 +1,79 @@
+# benchmarks/catalog.py
+"""
+Generates synthetic library catalogs of realistic shape for the benchmarks.
+"""
+
+import json
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+WORDS = ["the", "of", "and", "night", "river", "house", "garden", "secret", "war", "peace",
+         "stone", "light", "shadow", "winter", "summer", "king", "queen", "city", "sea", "road",
+         "history", "science", "journey", "letters", "silent", "golden", "last", "first", "lost", "empire"]
+SURNAMES = ["Smith", "Garcia", "Rowling", "Tolkien", "Austen", "Okafor", "Nakamura", "Ivanova",
+            "Dubois", "Rossi", "Kowalski", "Hansen", "Silva", "Chen", "Kumar", "Murphy"]
+GIVEN_NAMES = ["Anna", "Ben", "Chloe", "David", "Elif", "Farah", "George", "Hana", "Ivan", "Jia",
+               "Kavya", "Liam", "Maria", "Noah", "Olu", "Priya", "Quinn", "Rosa", "Sam", "Tomas"]
+
+
+def isbn_for(i: int) -> str:
+    """
+    Returns the synthetic ISBN of the i-th book.
+    """
+    return str(9780000000000 + i)
+
+
+def user_id_for(i: int) -> str:
+    """
+    Returns the synthetic user ID of the i-th user.
+    """
+    return f"U{i:08d}"
+
+
+def generate(books: int, users: int, checkout_ratio: float = 0.1, overdue_ratio: float = 0.25,
+             seed: int = 42) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Generates a catalog in the storage layout used by Storage.
+
+    Parameters:
+        books (int): The number of books.
+        users (int): The number of users.
+        checkout_ratio (float): The share of books that are checked out.
+        overdue_ratio (float): The share of checkouts that are overdue.
+        seed (int): The random seed, so runs are comparable.
+
+    Returns:
+        Dict[str, List[Dict[str, Any]]]: The 'books', 'users' and 'checkouts' sections.
+    """
+    rng = random.Random(seed)
+    authors = [f"{rng.choice(GIVEN_NAMES)} {rng.choice(SURNAMES)}" for _ in range(max(books // 20, 1))]
+    book_records = [
+        {"title": " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 6))).capitalize(),
+         "author": rng.choice(authors),
+         "isbn": isbn_for(i)}
+        for i in range(books)
+    ]
+    user_records = [
+        {"name": f"{rng.choice(GIVEN_NAMES)} {rng.choice(SURNAMES)}", "user_id": user_id_for(i)}
+        for i in range(users)
+    ]
+    now = datetime.now()
+    checkouts = []
+    if users:
+        for i in rng.sample(range(books), int(books * checkout_ratio)):
+            if rng.random() < overdue_ratio:
+                due = now - timedelta(days=rng.randint(1, 60))
+            else:
+                due = now + timedelta(days=rng.randint(1, 14))
+            checkouts.append({"user_id": user_id_for(rng.randrange(users)), "isbn": isbn_for(i),
+                              "due_date": due.isoformat()})
+    return {"books": book_records, "users": user_records, "checkouts": checkouts}
+
+
+def write_catalog(path: str, data: Dict[str, List[Dict[str, Any]]]) -> None:
+    """
+    Writes a generated catalog to a JSON data file as Storage would.
+    """
+    with open(path, 'w') as file:
+        json.dump(data, file, indent=4)
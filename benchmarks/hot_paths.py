@@ -0,0 +1,138 @@
+# benchmarks/hot_paths.py
+"""
+Times the manager hot paths on synthetic catalogs and reports the results as JSON.
+
+Usage:
+    python -m benchmarks.hot_paths [--sizes 10000,100000,1000000] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+from benchmarks.catalog import generate, isbn_for, user_id_for, write_catalog
+from book import Book
+from book_manager import BookManager
+from checkout_manager import CheckoutManager
+import overdue_analytics
+from storage import open_storage
+from user_manager import UserManager
+
+
+def timeit(func: Callable[[int], Any], iterations: int) -> Dict[str, float]:
+    """
+    Calls func(i) for i in range(iterations) and summarizes the latencies in microseconds.
+    """
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        func(i)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        "iterations": iterations,
+        "mean_us": round(statistics.fmean(samples), 2),
+        "p50_us": round(samples[len(samples) // 2], 2),
+        "p95_us": round(samples[min(int(len(samples) * 0.95), len(samples) - 1)], 2),
+        "min_us": round(samples[0], 2),
+    }
+
+
+def bench_size(size: int, backend: str, reads: int, writes: int, workdir: str) -> List[Dict[str, Any]]:
+    """
+    Runs every benchmark against one catalog size.
+    """
+    data = generate(size, size)
+    source = os.path.join(workdir, f"catalog_{size}.json")
+    write_catalog(source, data)
+    if backend == 'sqlite':
+        path = os.path.join(workdir, f"catalog_{size}.db")
+        from sqlite_storage import SQLiteStorage
+        storage = SQLiteStorage(path, migrate_from=source)
+    elif backend == 'binary':
+        path = os.path.join(workdir, f"catalog_{size}.snap")
+        from binary_snapshot import BinaryStorage, import_json
+        import_json(source, path)
+        storage = BinaryStorage(path)
+    else:
+        storage = open_storage(source, backend)
+    del data
+
+    results = []
+
+    def record(operation, stats):
+        results.append(dict({"size": size, "backend": backend, "operation": operation}, **stats))
+
+    record("manager_startup", timeit(lambda i: (BookManager(storage), UserManager(storage), CheckoutManager(storage)), 1))
+    record("cold_find_book_by_isbn", timeit(lambda i: BookManager(storage).find_book_by_isbn(isbn_for(i * 7919 % size)), 1))
+    book_manager = BookManager(storage)
+    checkout_manager = CheckoutManager(storage, book_manager=book_manager, user_manager=UserManager(storage))
+    checked_out = [checkout.isbn for checkout in checkout_manager.checkouts.values()]
+
+    record("storage_read", timeit(lambda i: storage.read(), min(reads, 3)))
+    snapshot = storage.read()
+    record("storage_write", timeit(lambda i: storage.write({"books": snapshot["books"]}), min(writes, 3)))
+    del snapshot
+
+    record("find_book_by_isbn", timeit(lambda i: book_manager.find_book_by_isbn(isbn_for(i * 7919 % size)), reads))
+    record("find_books_by_title", timeit(lambda i: book_manager.find_books_by_title("golden empire"), reads))
+    record("fuzzy_search_books", timeit(lambda i: book_manager.fuzzy_search_books("goldn empre"), reads))
+    record("find_overdue_books", timeit(lambda i: checkout_manager.find_overdue_books(), reads))
+    record("calculate_fine", timeit(lambda i: checkout_manager.calculate_fine(checked_out[i % len(checked_out)]), reads))
+    record("calculate_fines", timeit(lambda i: checkout_manager.calculate_fines(), min(reads, 3)))
+    if overdue_analytics.available():
+        record("fine_report", timeit(lambda i: checkout_manager.fine_report(), min(reads, 3)))
+    record("add_book", timeit(lambda i: book_manager.add_book(Book(f"Bench {i}", "Bench Author", f"B{size}-{i}")), writes))
+    record("checkout_book", timeit(lambda i: checkout_manager.checkout_book(user_id_for(i), f"B{size}-{i}"), writes))
+    record("checkin_book", timeit(lambda i: checkout_manager.checkin_book(f"B{size}-{i}"), writes))
+    record("available_copies", timeit(lambda i: checkout_manager.available_copies(isbn_for(i * 7919 % size)), reads))
+    record("loans_for_user", timeit(lambda i: checkout_manager.loans_for_user(user_id_for(i * 7919 % size)), reads))
+    storage.close()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the manager hot paths")
+    parser.add_argument("--sizes", default="10000,100000,1000000",
+                        help="Comma-separated catalog sizes (books and users each)")
+    parser.add_argument("--backend", choices=["json", "wal", "sqlite", "binary"], default="json")
+    parser.add_argument("--reads", type=int, default=1000, help="Iterations of each read operation")
+    parser.add_argument("--writes", type=int, default=20, help="Iterations of each mutating operation")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    # Calls that miss (e.g. calculate_fine on a book that is not overdue) log warnings; keep them quiet.
+    import logging
+    logging.disable(logging.WARNING)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in (int(s) for s in args.sizes.split(",")):
+            print(f"Benchmarking {size} records...", file=sys.stderr)
+            results.extend(bench_size(size, args.backend, args.reads, args.writes, workdir))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
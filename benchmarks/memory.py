@@ -0,0 +1,63 @@
+# benchmarks/memory.py
+"""
+Measures the resident size of the in-memory record types, in bytes per record.
+
+Usage:
+    python -m benchmarks.memory [--count 1000000]
+"""
+
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict
+
+from book import Book
+from checkout import Checkout
+from user import User
+
+
+def measure(build: Callable[[int], object], count: int) -> float:
+    """
+    Returns the bytes allocated per record by a collection of count records,
+    including the strings they hold and the dict that indexes them.
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = {str(i): build(i) for i in range(count)}
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del records
+    return (after - before) / count
+
+
+def run(count: int) -> Dict[str, object]:
+    due = int(time.time())
+    builders = {
+        "book": lambda i: Book(f"Title {i}", f"Author {i % 50000}", str(9780000000000 + i)),
+        "user": lambda i: User(f"Patron {i}", f"U{i:08d}"),
+        # Each record gets its own due date, so no record shares its due date object with another.
+        "checkout": lambda i: Checkout(str(9780000000000 + i), f"U{i:08d}", due + i),
+        # The previous checkout representation, for comparison: a formatted due date string per
+        # record, as Checkout.to_dict() makes.
+        "checkout_dict": lambda i: {"user_id": f"U{i:08d}", "isbn": str(9780000000000 + i),
+                                    "due_date": datetime.fromtimestamp(due + i).isoformat()},
+    }
+    return {
+        "count": count,
+        "bytes_per_record": {name: round(measure(build, count), 1) for name, build in builders.items()},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure bytes per in-memory record")
+    parser.add_argument("--count", type=int, default=1000000)
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.count), indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+# binary_snapshot.py
+"""
+A memory-mappable binary snapshot format for the library's data, and a Storage
+that uses it instead of JSON.
+
+Layout (all integers little-endian):
+    magic            8 bytes, b'LIBSNAP1'
+    header length    u32
+    header           JSON: the sections' field layouts, row and index offsets, and the heap offset
+    rows             per section, one fixed-size row per record. A string field is a
+                     (u32 offset, u32 length) reference into the heap, an integer field an i64.
+    key indexes      per section, the u32 row numbers sorted by record key
+    heap             the UTF-8 strings, each distinct string stored once
+
+Opening a snapshot only maps the file and parses the small header; records are
+decoded when they are accessed, and a record is found by key with a binary
+search over the key index.
+
+Usage:
+    python binary_snapshot.py export library_data.snap library_data.json
+    python binary_snapshot.py import library_data.json library_data.snap
+"""
+
+import argparse
+import json
+import mmap
+import os
+import stat
+import struct
+import tempfile
+from bisect import bisect_left
+from collections.abc import Sequence
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from metrics import increment, timed
+from storage import SECTION_KEYS, Storage, record_key
+
+MAGIC = b'LIBSNAP1'
+FORMAT_VERSION = 1
+
+# section -> (field, type) pairs: 's' for strings, 'i' for integers. Sections without
+# a layout are stored with each record as a single JSON-encoded string ('j').
+SECTION_FIELDS: Dict[str, Tuple[Tuple[str, str], ...]] = {
+    "books": (("isbn", "s"), ("title", "s"), ("author", "s"), ("copies", "i")),
+    "users": (("user_id", "s"), ("name", "s")),
+    "checkouts": (("isbn", "s"), ("user_id", "s"), ("due_date", "s")),
+}
+
+# Values for fields that records written by older versions may lack.
+FIELD_DEFAULTS: Dict[str, Any] = {"copies": 1}
+
+_FIELD_FORMATS = {"s": "II", "j": "II", "i": "q"}
+
+
+def _row_struct(fields: List[Tuple[str, str]]) -> struct.Struct:
+    return struct.Struct("<" + "".join(_FIELD_FORMATS[kind] for _, kind in fields))
+
+
+class SectionView(Sequence):
+    """
+    A read-only, lazily decoded view of one section of a mapped snapshot. It
+    behaves like the list of records Storage.read() returns: every access decodes
+    the record into a new dict.
+    """
+
+    def __init__(self, buffer, body: int, heap: int, name: str, layout: Dict[str, Any]):
+        self._buffer = buffer
+        self._heap = body + heap
+        self._fields = [tuple(field) for field in layout["fields"]]
+        self._struct = _row_struct(self._fields)
+        self._rows = body + layout["rows"]
+        self._count = layout["count"]
+        self._index = None if layout["index"] is None else body + layout["index"]
+        self._name = name
+        # (field name, position in the unpacked row, is a string) for each field.
+        self._plan = []
+        position = 0
+        for field, kind in self._fields:
+            self._plan.append((field, position, kind != "i"))
+            position += 1 if kind == "i" else 2
+        self._json = self._fields[0][1] == "j"
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _record(self, values: Tuple[Any, ...]) -> Dict[str, Any]:
+        buffer, heap = self._buffer, self._heap
+        if self._json:
+            return json.loads(buffer[heap + values[0]:heap + values[0] + values[1]])
+        record = {}
+        for name, position, is_string in self._plan:
+            if is_string:
+                start = heap + values[position]
+                record[name] = buffer[start:start + values[position + 1]].decode('utf-8')
+            else:
+                record[name] = values[position]
+        return record
+
+    def _decode(self, row: int) -> Dict[str, Any]:
+        return self._record(self._struct.unpack_from(self._buffer, self._rows + row * self._struct.size))
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._decode(row) for row in range(*i.indices(self._count))]
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("snapshot row out of range")
+        return self._decode(i)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        rows = memoryview(self._buffer)[self._rows:self._rows + self._count * self._struct.size]
+        for values in self._struct.iter_unpack(rows):
+            yield self._record(values)
+
+    def _row_at(self, position: int) -> int:
+        return struct.unpack_from("<I", self._buffer, self._index + position * 4)[0]
+
+    def _key_at(self, position: int) -> str:
+        return record_key(self._name, self._decode(self._row_at(position)))
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Finds a record by key with a binary search over the key index.
+
+        Returns:
+            Optional[Dict[str, Any]]: The record, or None if there is none with this key.
+        """
+        if self._index is None:
+            raise KeyError(f"Section {self._name} has no key index")
+        keys = _KeyColumn(self)
+        position = bisect_left(keys, key)
+        if position < self._count and keys[position] == key:
+            return self._decode(self._row_at(position))
+        return None
+
+
+class _KeyColumn(Sequence):
+    # The keys of a section in index order, decoded on access for bisect.
+
+    def __init__(self, view: SectionView):
+        self._view = view
+
+    def __len__(self) -> int:
+        return len(self._view)
+
+    def __getitem__(self, position: int) -> str:
+        return self._view._key_at(position)
+
+
+def _layout(name: str) -> List[Tuple[str, str]]:
+    return list(SECTION_FIELDS.get(name, (("record", "j"),)))
+
+
+def encode_snapshot(data: Dict[str, List[Any]]) -> bytes:
+    """
+    Encodes the library's sections in the binary snapshot format.
+    """
+    heap = bytearray()
+    heap_offsets: Dict[str, Tuple[int, int]] = {}
+
+    def intern(value: str) -> Tuple[int, int]:
+        reference = heap_offsets.get(value)
+        if reference is None:
+            encoded = value.encode('utf-8')
+            reference = heap_offsets[value] = (len(heap), len(encoded))
+            heap.extend(encoded)
+        return reference
+
+    body = bytearray()
+    sections = {}
+    for name, records in data.items():
+        fields = _layout(name)
+        row_struct = _row_struct(fields)
+        records = list(records)
+        rows_offset = len(body)
+        for record in records:
+            values = []
+            for field, kind in fields:
+                if kind == "j":
+                    values.extend(intern(json.dumps(record)))
+                    continue
+                value = record[field] if field in record else FIELD_DEFAULTS[field]
+                if kind == "i":
+                    values.append(int(value))
+                else:
+                    values.extend(intern(str(value)))
+            body.extend(row_struct.pack(*values))
+        index_offset = None
+        if name in SECTION_KEYS:
+            order = sorted(range(len(records)), key=lambda row: record_key(name, records[row]))
+            index_offset = len(body)
+            body.extend(struct.pack(f"<{len(order)}I", *order))
+        sections[name] = {"fields": fields, "rows": rows_offset, "count": len(records), "index": index_offset}
+
+    # Offsets in the header are relative to the body, which starts 8-byte aligned after the header.
+    header = json.dumps({"version": FORMAT_VERSION, "heap": len(body), "sections": sections}).encode('utf-8')
+    header += b' ' * (-(len(MAGIC) + 4 + len(header)) % 8)
+    return MAGIC + struct.pack("<I", len(header)) + header + bytes(body) + bytes(heap)
+
+
+def write_snapshot(filename: str, data: Dict[str, List[Any]]) -> int:
+    """
+    Atomically writes the library's sections to a binary snapshot file.
+
+    Returns:
+        int: The number of bytes written.
+    """
+    encoded = encode_snapshot(data)
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_filename = tempfile.mkstemp(dir=directory, prefix=os.path.basename(filename) + '.')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            # mkstemp creates the file readable by its owner only: keep the snapshot's own permissions.
+            if os.path.exists(filename):
+                os.chmod(tmp_filename, stat.S_IMODE(os.stat(filename).st_mode))
+            file.write(encoded)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        os.remove(tmp_filename)
+        raise
+    return len(encoded)
+
+
+def read_snapshot(filename: str) -> Dict[str, SectionView]:
+    """
+    Maps a binary snapshot file and returns a lazily decoded view of each section.
+
+    Raises:
+        ValueError: If the file is not a binary snapshot.
+    """
+    with open(filename, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            raise ValueError(f"Not a binary snapshot: {filename}")
+        # The mapping stays valid after the file is closed or replaced.
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    if buffer[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"Not a binary snapshot: {filename}")
+    header_length = struct.unpack_from("<I", buffer, len(MAGIC))[0]
+    start = len(MAGIC) + 4
+    header = json.loads(buffer[start:start + header_length])
+    if header["version"] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {header['version']}: {filename}")
+    body = start + header_length
+    return {name: SectionView(buffer, body, header["heap"], name, layout)
+            for name, layout in header["sections"].items()}
+
+
+def export_json(snapshot_filename: str, json_filename: str) -> None:
+    """
+    Writes the contents of a binary snapshot to a JSON data file, as used by Storage.
+    """
+    data = {name: list(records) for name, records in read_snapshot(snapshot_filename).items()}
+    with open(json_filename, 'w') as file:
+        json.dump(data, file, indent=4)
+
+
+def import_json(json_filename: str, snapshot_filename: str) -> None:
+    """
+    Writes the contents of a JSON data file, as written by Storage, to a binary snapshot.
+    """
+    with open(json_filename, 'r') as file:
+        write_snapshot(snapshot_filename, json.load(file))
+
+
+class BinaryStorage(Storage):
+    """
+    A Storage that keeps its data in a binary snapshot file instead of JSON. It
+    shares Storage's locking, transactions and snapshot cache; reading maps the
+    file and decodes records only when they are accessed, and find_record looks
+    a record up through the key index without decoding the rest.
+
+    Attributes:
+        filename (str): The file path for the binary snapshot.
+    """
+
+    def __new__(cls, filename='library_data.snap'):
+        return super().__new__(cls, filename)
+
+    def _read_file(self) -> Dict[str, List[Any]]:
+        try:
+            sections = read_snapshot(self.filename)
+        except FileNotFoundError:
+            return {"books": [], "users": [], "checkouts": []}
+        # Only the header is read now; count the mapped bytes as read.
+        increment("library_storage_bytes_mapped_total", os.path.getsize(self.filename))
+        return sections
+
+    def _write_file(self, data: Dict[str, List[Any]]):
+        increment("library_storage_bytes_written_total", write_snapshot(self.filename, data))
+
+    def _cache_snapshot(self, data: Dict[str, List[Any]]):
+        # Map the file just written rather than keeping the decoded lists, so
+        # lookups keep using the key index.
+        self._snapshot = self._read_file()
+        self._snapshot_stamp = self._stamp()
+        self.version += 1
+
+    @timed("library_storage_seconds", operation="find_record")
+    def find_record(self, section: str, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Finds a single record by key without decoding the rest of its section.
+
+        Parameters:
+            section (str): The section the record belongs to, e.g. 'books'.
+            key (str): The key identifying the record within the section.
+
+        Returns:
+            Optional[Dict[str, Any]]: The record, or None if there is none with this key.
+        """
+        with self._locked():
+            if self._txn_data is not None:
+                records = self._txn_data.get(section, [])
+                i = self._position(section, records, key)
+                return records[i] if i is not None else None
+            records = self._load_snapshot().get(section, [])
+            if isinstance(records, SectionView):
+                return records.get(key)
+            return super().find_record(section, key)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert between JSON data files and binary snapshots")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Write a binary snapshot out as JSON")
+    export_parser.add_argument("snapshot")
+    export_parser.add_argument("json")
+    import_parser = subparsers.add_parser("import", help="Write a JSON data file as a binary snapshot")
+    import_parser.add_argument("json")
+    import_parser.add_argument("snapshot")
+    args = parser.parse_args(argv)
+    if args.command == "export":
+        export_json(args.snapshot, args.json)
+    else:
+        import_json(args.json, args.snapshot)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,13 +8,17 @@ class Book():
         title (str): The title of the book.
         author (str): The author of the book.
         isbn (str) : isbn number of the book
+        copies (int): the number of copies the library holds
 
     """
 
-    def __init__(self, title: str, author: str, isbn: str):
+    __slots__ = ("title", "author", "isbn", "copies")
+
+    def __init__(self, title: str, author: str, isbn: str, copies: int = 1):
         self.title = title
         self.author = author
         self.isbn = isbn
+        self.copies = copies
 
     def __str__(self) -> str:
         """
@@ -29,6 +33,7 @@ class Book():
         return {
             "title": self.title,
             "author": self.author,
-            "isbn": self.isbn
+            "isbn": self.isbn,
+            "copies": self.copies
         }
 
@@ -1,38 +1,77 @@
 # book_manager.py
 
-from typing import List, Optional
-from storage import Storage
+from operator import attrgetter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from storage import StorageBackend
 from book import Book
+from bulk_import import ImportReport
+from metrics import timed
+from pagination import Page, page, print_lines, sort_key, stream
+from query_cache import QueryCache
+from reservation_manager import ReservationManager
+from search_index import FuzzyIndex, InvertedIndex, search_fields, tokenize
 import logging
 
+# The fields books can be listed in order of, mapped to the Book attributes holding them.
+BOOK_SORT_FIELDS = {"title": "title", "author": "author", "isbn": "isbn", "copies": "copies"}
+BOOK_KEY = attrgetter("isbn")
+
 class BookManager:
     """
     Manages the collection of books in the library, offering operations such as
     adding, listing, updating, and deleting books.
 
     Attributes:
-        storage (Storage): The storage handler for persistent data storage.
+        storage (StorageBackend): The storage handler for persistent data storage.
+        books (Dict[str, Book]): The books in the collection, indexed by ISBN.
+        query_cache (QueryCache): The results of recent searches, dropped whenever a book changes.
+        reservations (Optional[ReservationManager]): The waitlists a deleted book's holds are removed from.
     """
 
-    def __init__(self, storage: Storage):
+    def __init__(self, storage: StorageBackend, query_cache: Optional[QueryCache] = None,
+                 reservations: Optional[ReservationManager] = None):
         self.storage = storage
-        self.books = self.load_books()
-
-    def load_books(self) -> List[Book]:
+        self.query_cache = query_cache if query_cache is not None else QueryCache("books")
+        self.reservations = reservations
+        # The books and their search indexes are loaded on first access.
+        self._books: Optional[Dict[str, Book]] = None
+
+    @property
+    def books(self) -> Dict[str, Book]:
+        if self._books is None:
+            books = self.load_books()
+            self._title_index = InvertedIndex()
+            self._author_index = InvertedIndex()
+            # The words of every title and author, for typo-tolerant search.
+            self._fuzzy_index = FuzzyIndex()
+            for book in books.values():
+                self._index_book(book)
+            self._books = books
+        return self._books
+
+    @timed("library_manager_seconds", manager="books", operation="load_books")
+    def load_books(self) -> Dict[str, Book]:
         """
-        Loads books from storage into the book manager.
+        Loads books from storage into the book manager, indexed by ISBN.
         """
         book_data = self.storage.read().get("books", [])
-        return [Book(**data) for data in book_data]
+        return {data["isbn"]: Book(**data) for data in book_data}
+
+    def _index_book(self, book: Book):
+        self._title_index.add(book.isbn, book.title)
+        self._author_index.add(book.isbn, book.author)
+        self._fuzzy_index.add(book.isbn, f"{book.title} {book.author}")
+        self.query_cache.invalidate()
 
     def save_books(self):
         """
         Saves the current state of the book collection to storage.
         """
-        book_data = [book.to_dict() for book in self.books]  # Ensure Book has a to_dict method
+        book_data = [book.to_dict() for book in self.books.values()]  # Ensure Book has a to_dict method
         self.storage.write({"books": book_data})
         logging.info("Books have been saved to storage.")
 
+    @timed("library_manager_seconds", manager="books", operation="add_book")
     def add_book(self, book: Book) -> bool:
         """
         Adds a new book to the collection, ensuring no duplicates by ISBN.
@@ -43,57 +82,147 @@ class BookManager:
         Returns:
             bool: True if the book was added successfully, False otherwise.
         """
-        if any(b.isbn == book.isbn for b in self.books):
-            logging.warning(f"Duplicate book ISBN: {book.isbn}.")
+        if book.isbn in self.books:
+            logging.warning("Duplicate book ISBN: %s.", book.isbn)
             return False
-        self.books.append(book)
-        self.save_books()
-        logging.info(f"Book added: {book.isbn}")
+        self.books[book.isbn] = book
+        self._index_book(book)
+        self.storage.put_record("books", book.isbn, book.to_dict())
+        logging.info("Book added: %s", book.isbn)
         return True
 
-    def list_books(self) -> List[Book]:
-    # def list_books(self) -> None:
-
+    @timed("library_manager_seconds", manager="books", operation="add_books_bulk")
+    def add_books_bulk(self, books: Iterable[Book], batch_size: int = 1000,
+                       progress: Optional[Callable[[int], None]] = None,
+                       report: Optional[ImportReport] = None) -> ImportReport:
         """
-        Returns a list of all books in the collection.
+        Adds many books, skipping any whose ISBN already exists. The books are
+        consumed lazily and persisted once per batch.
+
+        Parameters:
+            books (Iterable[Union[Book, Tuple[Optional[int], Book]]]): The books to be added, alone
+                or as (row number, book) pairs from an import file so duplicates are reported by row.
+            batch_size (int): The number of books persisted together.
+            progress (Optional[Callable[[int], None]]): Called with the number of books processed after each batch.
+            report (Optional[ImportReport]): A report to record the outcome in; a new one is created if omitted.
 
         Returns:
-            List[Book]: The list of books.
+            ImportReport: The number of books added and the duplicates skipped.
         """
-        if not self.books:
-            print("No books available.")
+        report = report if report is not None else ImportReport()
+        processed = 0
+        # The books of the current batch, added to the collection once they are persisted.
+        batch: Dict[str, Book] = {}
+        for book in books:
+            row, book = book if isinstance(book, tuple) else (None, book)
+            processed += 1
+            if book.isbn in self.books or book.isbn in batch:
+                report.duplicate(row, book.isbn)
+            else:
+                batch[book.isbn] = book
+            if processed % batch_size == 0:
+                self._save_batch(batch, report)
+                batch = {}
+                if progress:
+                    progress(processed)
+        self._save_batch(batch, report)
+        if progress and processed % batch_size:
+            progress(processed)
+        logging.info("Bulk book import: %s", report)
+        return report
+
+    def _save_batch(self, batch: Dict[str, Book], report: ImportReport):
+        if not batch:
             return
-        for book in self.books:
-            # print(f"Title: {book.title}, Author: {book.author}, ISBN: {book.isbn}")
-            print(book)# Utilizes the __str__ method of the Book class 
+        with self.storage.transaction():
+            for isbn, book in batch.items():
+                self.storage.put_record("books", isbn, book.to_dict())
+        for book in batch.values():
+            self.books[book.isbn] = book
+            self._index_book(book)
+        report.added += len(batch)
+
+    def iter_books(self, where: Optional[Callable[[Book], bool]] = None, sort: Optional[str] = None,
+                   descending: bool = False, offset: int = 0, limit: Optional[int] = None,
+                   after: Optional[str] = None) -> Iterator[Book]:
+        """
+        Lazily lists the books in the collection. Without a sort the books are
+        streamed in catalog order in constant memory.
+
+        Parameters:
+            where (Optional[Callable[[Book], bool]]): Keeps only the books it returns True for.
+            sort (Optional[str]): The field to order by: 'title', 'author', 'isbn' or 'copies'.
+            descending (bool): Whether to list the largest values first.
+            offset (int): The number of leading books to skip.
+            limit (Optional[int]): The maximum number of books to list, or None for all.
+            after (Optional[str]): A cursor returned by page_books; only books after it are listed.
+
+        Returns:
+            Iterator[Book]: The matching books, in order.
+
+        Raises:
+            ValueError: If the sort field or cursor is invalid.
+        """
+        return stream(self.books.values(), BOOK_KEY, where, sort_key(sort, BOOK_SORT_FIELDS),
+                      descending, offset, limit, after)
+
+    def page_books(self, limit: int = 20, where: Optional[Callable[[Book], bool]] = None,
+                   sort: Optional[str] = None, descending: bool = False, after: Optional[str] = None) -> Page[Book]:
+        """
+        Fetches one page of books using cursor pagination. Parameters are as for iter_books.
+
+        Returns:
+            Page[Book]: The books on the page and the cursor of the next page.
+        """
+        return page(self.books.values(), BOOK_KEY, limit, where, sort_key(sort, BOOK_SORT_FIELDS), descending, after)
+
+    def list_books(self, where: Optional[Callable[[Book], bool]] = None, sort: Optional[str] = None,
+                   descending: bool = False, offset: int = 0, limit: Optional[int] = None,
+                   page_size: Optional[int] = None) -> int:
+        """
+        Prints the books in the collection as they are listed, pausing every
+        page_size books. Parameters are as for iter_books.
+
+        Returns:
+            int: The number of books printed.
+        """
+        books = self.iter_books(where, sort, descending, offset, limit)
+        return print_lines((str(book) for book in books), "No books available.", page_size)
 
-    def update_book(self, isbn: str, title: Optional[str] = None, author: Optional[str] = None) -> bool:
+    @timed("library_manager_seconds", manager="books", operation="update_book")
+    def update_book(self, isbn: str, title: Optional[str] = None, author: Optional[str] = None,
+                    copies: Optional[int] = None) -> bool:
         """
-        Updates the title and/or author of a book identified by its ISBN.
+        Updates the title, author and/or copy count of a book identified by its ISBN.
 
         Parameters:
             isbn (str): The ISBN of the book to update.
             title (Optional[str]): The new title of the book, if provided.
             author (Optional[str]): The new author of the book, if provided.
+            copies (Optional[int]): The new number of copies, if provided.
 
         Returns:
             bool: True if the book was updated successfully, False if the book was not found.
         """
-        for book in self.books:
-            if book.isbn == isbn:
-                if title:
-                    book.title = title
-                if author:
-                    book.author = author
-                self.save_books()
-                logging.info(f"Book updated: {isbn}")
-                return True
-        logging.warning(f"Book not found for update: {isbn}")
-        return False
+        book = self.books.get(isbn)
+        if book is None:
+            logging.warning("Book not found for update: %s", isbn)
+            return False
+        if title:
+            book.title = title
+        if author:
+            book.author = author
+        if copies is not None:
+            book.copies = copies
+        self._index_book(book)
+        self.storage.put_record("books", isbn, book.to_dict())
+        logging.info("Book updated: %s", isbn)
+        return True
 
+    @timed("library_manager_seconds", manager="books", operation="delete_book")
     def delete_book(self, isbn: str) -> bool:
         """
-        Deletes a book from the collection by its ISBN.
+        Deletes a book from the collection by its ISBN, along with the holds on it.
 
         Parameters:
             isbn (str): The ISBN of the book to delete.
@@ -101,15 +230,20 @@ class BookManager:
         Returns:
             bool: True if the book was deleted successfully, False if the book was not found.
         """
-        for i, book in enumerate(self.books):
-            if book.isbn == isbn:
-                del self.books[i]
-                self.save_books()
-                logging.info(f"Book deleted: {isbn}")
-                return True
-        logging.warning(f"Book not found for deletion: {isbn}")
-        return False
+        if self.books.pop(isbn, None) is None:
+            logging.warning("Book not found for deletion: %s", isbn)
+            return False
+        self._title_index.remove(isbn)
+        self._author_index.remove(isbn)
+        self._fuzzy_index.remove(isbn)
+        self.query_cache.invalidate()
+        self.storage.delete_record("books", isbn)
+        if self.reservations is not None:
+            self.reservations.remove_book_holds(isbn)
+        logging.info("Book deleted: %s", isbn)
+        return True
 
+    @timed("library_manager_seconds", manager="books", operation="find_book_by_isbn")
     def find_book_by_isbn(self, isbn: str) -> Optional[Book]:
         """
         Finds and returns a book by its ISBN.
@@ -120,11 +254,17 @@ class BookManager:
         Returns:
             Optional[Book]: The found book, or None if no book matches the ISBN.
         """
-        for book in self.books:
-            if book.isbn == isbn:
-                return book
-        return None
-
+        if self._books is None:
+            # Until the catalog is loaded, answer from the storage's key index if it has one.
+            try:
+                data = self.storage.find_record("books", isbn)
+            except NotImplementedError:
+                pass
+            else:
+                return Book(**data) if data is not None else None
+        return self.books.get(isbn)
+
+    @timed("library_manager_seconds", manager="books", operation="find_books_by_author")
     def find_books_by_author(self, author: str) -> List[Book]:
         """
         Finds books by a specific author.
@@ -135,9 +275,12 @@ class BookManager:
         Returns:
             List[Book]: A list of books by the specified author.
         """
-        return [book for book in self.books if author.lower() in book.author.lower()]
+        books = self.books
+        return list(self.query_cache.get_or_compute(
+            ("author", author.casefold()), lambda: [books[isbn] for isbn in self._author_index.find(author)]))
 
 
+    @timed("library_manager_seconds", manager="books", operation="find_books_by_title")
     def find_books_by_title(self, title: str) -> List[Book]:
         """
         Finds and returns books that contain the given title substring.
@@ -148,7 +291,48 @@ class BookManager:
         Returns:
             List[Book]: A list of books that match the search criteria.
         """
-        return [book for book in self.books if title.lower() in book.title.lower()]
+        books = self.books
+        return list(self.query_cache.get_or_compute(
+            ("title", title.casefold()), lambda: [books[isbn] for isbn in self._title_index.find(title)]))
+
+    @timed("library_manager_seconds", manager="books", operation="search_books")
+    def search_books(self, query: str, limit: Optional[int] = 10, offset: int = 0) -> List[Tuple[Book, float]]:
+        """
+        Searches titles and authors for every word of the query, best matches first.
+
+        Parameters:
+            query (str): The words or word fragments to search for.
+            limit (Optional[int]): The maximum number of results to return, or None for all.
+            offset (int): The number of leading results to skip, for pagination.
+
+        Returns:
+            List[Tuple[Book, float]]: (book, score) pairs ordered by descending score.
+        """
+        books = self.books
+
+        def search():
+            results = search_fields([self._title_index, self._author_index], query, limit, offset)
+            return [(books[isbn], score) for isbn, score in results]
+        return list(self.query_cache.get_or_compute(("search", tuple(sorted(tokenize(query))), limit, offset), search))
+
+    @timed("library_manager_seconds", manager="books", operation="fuzzy_search_books")
+    def fuzzy_search_books(self, query: str, limit: Optional[int] = 10) -> List[Tuple[Book, float]]:
+        """
+        Searches titles and authors for the words of the query, tolerating typos,
+        e.g. 'harry poter rowlng'. See FuzzyIndex.search for the scoring.
+
+        Parameters:
+            query (str): The words to search for.
+            limit (Optional[int]): The maximum number of results to return, or None for all.
+
+        Returns:
+            List[Tuple[Book, float]]: (book, score) pairs ordered by descending score, 1.0 being an exact match.
+        """
+        books = self.books
+
+        def search():
+            return [(books[isbn], score) for isbn, score in self._fuzzy_index.search(query, limit)]
+        return list(self.query_cache.get_or_compute(("fuzzy", tuple(tokenize(query)), limit), search))
     
 
     '''
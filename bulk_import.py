@@ -0,0 +1,172 @@
+# bulk_import.py
+
+import csv
+import json
+import os
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from book import Book
+from user import User
+
+
+class ImportReport:
+    """
+    Summarizes the outcome of a bulk import.
+
+    Attributes:
+        added (int): The number of records added.
+        duplicates (int): The number of records skipped because their key already existed.
+        errors (List[Tuple[Optional[int], str]]): (row number, message) pairs for rejected rows,
+            duplicates included. The row number is None when the records did not come from a file.
+    """
+
+    def __init__(self):
+        self.added = 0
+        self.duplicates = 0
+        self.errors: List[Tuple[Optional[int], str]] = []
+
+    def error(self, row: Optional[int], message: str):
+        """
+        Records a rejected row.
+        """
+        self.errors.append((row, message))
+
+    def duplicate(self, row: Optional[int], key: str):
+        """
+        Records a record skipped because its key already exists.
+        """
+        self.duplicates += 1
+        self.error(row, f"Duplicate key: {key}")
+
+    def __str__(self) -> str:
+        return f"Added: {self.added}, Duplicates: {self.duplicates}, Errors: {len(self.errors) - self.duplicates}"
+
+
+def iter_records(path: str, fmt: Optional[str] = None) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """
+    Streams the records of a CSV or JSON Lines file without loading it into memory.
+
+    Parameters:
+        path (str): The file to read.
+        fmt (Optional[str]): 'csv' or 'jsonl'. Inferred from the file extension when omitted.
+
+    Yields:
+        Tuple[int, Optional[Dict[str, Any]], Optional[str]]: (row number, record, error) for each
+        row, where exactly one of record and error is set. CSV row numbers exclude the header.
+    """
+    if fmt is None:
+        fmt = 'csv' if os.path.splitext(path)[1].lower() == '.csv' else 'jsonl'
+    with open(path, 'r', encoding='utf-8', newline='') as file:
+        if fmt == 'csv':
+            for row, record in enumerate(csv.DictReader(file), start=1):
+                yield row, record, None
+        elif fmt == 'jsonl':
+            for row, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    yield row, None, f"Invalid JSON: {e}"
+                    continue
+                if isinstance(record, dict):
+                    yield row, record, None
+                else:
+                    yield row, None, "Expected a JSON object"
+        else:
+            raise ValueError(f"Unknown import format: {fmt}")
+
+
+def _required(record: Dict[str, Any], fields: Tuple[str, ...]) -> Dict[str, str]:
+    values = {}
+    for field in fields:
+        value = record.get(field)
+        value = str(value).strip() if value is not None else ''
+        if not value:
+            raise ValueError(f"Missing required field: {field}")
+        values[field] = value
+    return values
+
+
+def book_from_record(record: Dict[str, Any]) -> Book:
+    """
+    Builds a validated Book from an imported record. The copies field is optional
+    and defaults to 1.
+
+    Raises:
+        ValueError: If the title, author or ISBN is missing or empty, or copies is not a positive integer.
+    """
+    book = Book(**_required(record, ("title", "author", "isbn")))
+    copies = record.get("copies")
+    if copies not in (None, ''):
+        try:
+            book.copies = int(copies)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid copies: {copies}")
+        if book.copies < 1:
+            raise ValueError(f"Invalid copies: {copies}")
+    return book
+
+
+def user_from_record(record: Dict[str, Any]) -> User:
+    """
+    Builds a validated User from an imported record.
+
+    Raises:
+        ValueError: If the name or user ID is missing or empty.
+    """
+    return User(**_required(record, ("name", "user_id")))
+
+
+def _valid(path: str, fmt: Optional[str], build: Callable[[Dict[str, Any]], Any],
+           report: ImportReport) -> Iterator[Tuple[int, Any]]:
+    # Yields (row number, record) pairs, so duplicates are reported against their row.
+    for row, record, error in iter_records(path, fmt):
+        if error is None:
+            try:
+                yield row, build(record)
+                continue
+            except ValueError as e:
+                error = str(e)
+        report.error(row, error)
+
+
+def import_books(book_manager, path: str, fmt: Optional[str] = None, batch_size: int = 1000,
+                 progress: Optional[Callable[[int], None]] = None) -> ImportReport:
+    """
+    Streams books from a CSV or JSON Lines file into a BookManager.
+
+    Parameters:
+        book_manager (BookManager): The manager to add the books to.
+        path (str): The file to import, with title, author and isbn columns or keys,
+            and optionally copies.
+        fmt (Optional[str]): 'csv' or 'jsonl'. Inferred from the file extension when omitted.
+        batch_size (int): The number of books persisted together.
+        progress (Optional[Callable[[int], None]]): Called with the number of books processed after each batch.
+
+    Returns:
+        ImportReport: The outcome of the import, including a per-row error report.
+    """
+    report = ImportReport()
+    return book_manager.add_books_bulk(_valid(path, fmt, book_from_record, report),
+                                       batch_size, progress, report)
+
+
+def import_users(user_manager, path: str, fmt: Optional[str] = None, batch_size: int = 1000,
+                 progress: Optional[Callable[[int], None]] = None) -> ImportReport:
+    """
+    Streams users from a CSV or JSON Lines file into a UserManager.
+
+    Parameters:
+        user_manager (UserManager): The manager to add the users to.
+        path (str): The file to import, with name and user_id columns or keys.
+        fmt (Optional[str]): 'csv' or 'jsonl'. Inferred from the file extension when omitted.
+        batch_size (int): The number of users persisted together.
+        progress (Optional[Callable[[int], None]]): Called with the number of users processed after each batch.
+
+    Returns:
+        ImportReport: The outcome of the import, including a per-row error report.
+    """
+    report = ImportReport()
+    return user_manager.add_users_bulk(_valid(path, fmt, user_from_record, report),
+                                       batch_size, progress, report)
@@ -0,0 +1,534 @@
+# change_feed.py
+"""
+A change feed for replicating a library between branches: every mutation the
+managers make is given a monotonically increasing version and appended to a
+change log next to the data file, so a replica can pull only the changes made
+since the last version it applied.
+
+Usage:
+    python change_feed.py export library_data.json --since 1200 --output delta.jsonl
+    python change_feed.py apply branch_data.json delta.jsonl
+    python change_feed.py pull hub_data.json branch_data.json
+    python change_feed.py compact library_data.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from itertools import chain
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+from storage import SECTION_KEYS, StorageBackend, open_storage, record_key
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+PUT = "put"
+DELETE = "delete"
+SET = "set"  # a whole section replaced by write()
+
+# A rewritten log starts with a header line giving its generation, so other
+# processes notice the rewrite and index the log again.
+_HEADER = b'{"generation":'
+
+
+class Change:
+    """
+    One versioned mutation.
+
+    Attributes:
+        version (int): The change's position in the feed; later changes have higher versions.
+        op (str): 'put', 'delete' or 'set'.
+        section (str): The section changed, e.g. 'books'.
+        key (Optional[str]): The key of the record put or deleted; None for 'set'.
+        record (Any): The record put, or for 'set' the section's new list of records.
+        origin (str): The replica the change was first made on.
+    """
+
+    __slots__ = ("version", "op", "section", "key", "record", "origin")
+
+    def __init__(self, version: int, op: str, section: str, key: Optional[str], record: Any, origin: str):
+        self.version = version
+        self.op = op
+        self.section = section
+        self.key = key
+        self.record = record
+        self.origin = origin
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Change':
+        return cls(data["v"], data["op"], data["s"], data.get("k"), data.get("r"), data["o"])
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {"v": self.version, "op": self.op, "s": self.section, "o": self.origin}
+        if self.key is not None:
+            data["k"] = self.key
+        if self.record is not None:
+            data["r"] = self.record
+        return data
+
+
+class ChangeLog:
+    """
+    An append-only JSON Lines log of changes, shared safely by every process
+    using the same data file. Versions are assigned under an advisory lock on
+    the log, and changes appended by other processes are picked up before each
+    append or read.
+
+    A log rewritten by compact() starts with a header holding a generation
+    number, raised by every rewrite, and the highest version issued so far.
+    Other processes compare the generation before reading so that they never
+    use file offsets indexed in an earlier generation.
+
+    Attributes:
+        filename (str): The log file.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._lock = threading.RLock()
+        # The version and file offset of every change, in version order.
+        self._versions = array('q')
+        self._offsets = array('q')
+        self._size = 0
+        # The generation of the indexed log, and the highest version issued before it was rewritten.
+        self._generation = 0
+        self._floor = 0
+        open(filename, 'ab').close()
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with self._lock, open(self.filename + '.lock', 'a+') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _refresh(self):
+        """
+        Indexes the changes appended since the log was last read. Must be called with the lock held.
+        """
+        with open(self.filename, 'rb') as file:
+            generation, floor, start = 0, 0, 0
+            if file.read(len(_HEADER)) == _HEADER:
+                file.seek(0)
+                header = file.readline()
+                start = len(header)
+                header = json.loads(header)
+                generation, floor = header["generation"], header["version"]
+            size = os.fstat(file.fileno()).st_size
+            if generation != self._generation or size < self._size:
+                # The log was rewritten by another process: index it again.
+                self._versions, self._offsets = array('q'), array('q')
+                self._generation, self._floor, self._size = generation, floor, start
+            if size == self._size:
+                return
+            file.seek(self._size)
+            offset = self._size
+            for line in file:
+                if not line.endswith(b'\n'):
+                    break  # a torn final write; overwritten by the next append
+                self._versions.append(json.loads(line)["v"])
+                self._offsets.append(offset)
+                offset += len(line)
+        self._size = offset
+
+    @property
+    def version(self) -> int:
+        """
+        The version of the latest change, or 0 if there are none.
+        """
+        with self._locked():
+            self._refresh()
+            return self._last()
+
+    def _last(self) -> int:
+        # The highest version issued, including those of changes a rewrite dropped.
+        return max(self._versions[-1] if self._versions else 0, self._floor)
+
+    def append(self, changes: List[Change]) -> List[Change]:
+        """
+        Assigns the next versions to changes and appends them to the log.
+
+        Returns:
+            List[Change]: The changes, with their versions set.
+        """
+        if not changes:
+            return changes
+        with self._locked():
+            self._refresh()
+            version = self._last()
+            lines = []
+            for change in changes:
+                version += 1
+                change.version = version
+                lines.append((json.dumps(change.to_dict(), separators=(',', ':')) + '\n').encode('utf-8'))
+            with open(self.filename, 'r+b') as file:
+                file.seek(self._size)
+                file.truncate()
+                file.write(b''.join(lines))
+                file.flush()
+                os.fsync(file.fileno())
+            self._refresh()
+        return changes
+
+    def discard(self, changes: List[Change]):
+        """
+        Removes changes made by one append() call, after the storage failed to
+        commit them. Their versions are not issued again.
+        """
+        if not changes:
+            return
+        with self._locked():
+            self._refresh()
+            start = bisect_left(self._versions, changes[0].version)
+            end = bisect_right(self._versions, changes[-1].version)
+            if start == end:
+                return
+            cut_to = self._offsets[end] if end < len(self._offsets) else self._size
+            self._rewrite(chain(self._read_range(self._offsets[0], self._offsets[start]),
+                                self._read_range(cut_to, self._size)))
+
+    def _read_range(self, start: int, end: int) -> Iterator[bytes]:
+        with open(self.filename, 'rb') as file:
+            file.seek(start)
+            while start < end:
+                chunk = file.read(min(end - start, 1 << 20))
+                if not chunk:
+                    break
+                start += len(chunk)
+                yield chunk
+
+    def changes_since(self, version: int, limit: Optional[int] = None,
+                      exclude_origin: Optional[str] = None) -> List[Change]:
+        """
+        Returns the changes with versions above version, oldest first.
+
+        Parameters:
+            version (int): The last version the caller has applied; 0 for every change.
+            limit (Optional[int]): The maximum number of changes to return, or None for all.
+            exclude_origin (Optional[str]): Skip the changes first made on this replica.
+
+        Returns:
+            List[Change]: The changes, in version order.
+        """
+        with self._locked():
+            self._refresh()
+            start = bisect_right(self._versions, version)
+            if start == len(self._versions):
+                return []
+            changes = []
+            with open(self.filename, 'rb') as file:
+                file.seek(self._offsets[start])
+                for line in file:
+                    if not line.endswith(b'\n') or (limit is not None and len(changes) >= limit):
+                        break
+                    change = Change.from_dict(json.loads(line))
+                    if change.origin != exclude_origin:
+                        changes.append(change)
+            return changes
+
+    def compact(self) -> int:
+        """
+        Rewrites the log keeping only the latest change to each record (and the
+        latest 'set' of each section), so the log grows with the data rather
+        than with its history. Versions are kept, so changes_since still returns
+        everything a replica needs to catch up.
+
+        Returns:
+            int: The number of changes dropped.
+        """
+        with self._locked():
+            self._refresh()
+            latest: Dict[tuple, Change] = {}
+            with open(self.filename, 'rb') as file:
+                file.seek(self._offsets[0] if self._offsets else self._size)
+                for line in file:
+                    if not line.endswith(b'\n'):
+                        break
+                    change = Change.from_dict(json.loads(line))
+                    if change.op == SET:
+                        # Replacing a section supersedes every earlier change to it.
+                        latest = {key: kept for key, kept in latest.items() if key[0] != change.section}
+                    latest[(change.section, change.key)] = change
+            kept = sorted(latest.values(), key=lambda change: change.version)
+            dropped = len(self._versions) - len(kept)
+            self._rewrite((json.dumps(change.to_dict(), separators=(',', ':')) + '\n').encode('utf-8')
+                          for change in kept)
+            return dropped
+
+    def _rewrite(self, chunks: Iterable[bytes]):
+        """
+        Atomically replaces the log with a new generation holding chunks, and
+        indexes it. Must be called with the lock held.
+        """
+        header = {"generation": self._generation + 1, "version": self._last()}
+        tmp_filename = self.filename + '.tmp'
+        with open(tmp_filename, 'wb') as file:
+            file.write((json.dumps(header, separators=(',', ':')) + '\n').encode('utf-8'))
+            for chunk in chunks:
+                file.write(chunk)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_filename, self.filename)
+        self._refresh()
+
+
+class VersionedStorage(StorageBackend):
+    """
+    Wraps a storage engine, recording every put, delete and write in a change
+    log. A replica pulls the changes made since the last version it applied
+    with changes_since() and applies them with apply_changes().
+
+    Every change is given its version and appended to the log while the
+    storage's transaction is still open, so versions follow the order the
+    storage commits changes in, and every change it commits is in the log.
+    If the storage then fails to commit, the changes are removed from the log.
+    Changes made inside a transaction are logged together. Changes made
+    by modifying the data a transaction yields are not logged; use put_record,
+    delete_record or write. Replicas apply changes in version order, so
+    concurrent changes to the same record resolve to the last one applied.
+
+    When the log is started on a storage that already holds data, it begins
+    with a put of every stored record, so a new replica pulling from version 0
+    receives the whole library.
+
+    Attributes:
+        storage (StorageBackend): The wrapped storage engine.
+        log (ChangeLog): The change log.
+        origin (str): The name this replica's changes are recorded under.
+    """
+
+    def __init__(self, storage: StorageBackend, log_filename: Optional[str] = None, origin: Optional[str] = None):
+        if log_filename is None:
+            log_filename = getattr(storage, 'filename', 'library_data') + '.changes'
+        self.storage = storage
+        self.log = ChangeLog(log_filename)
+        self.origin = origin or os.path.abspath(log_filename)
+        self._local = threading.local()
+        self._baseline()
+
+    def _baseline(self):
+        """
+        Seeds an empty log with the records already stored, as puts (or a 'set'
+        for sections without keys), so they reach replicas like any other change.
+        """
+        if self.log.version:
+            return
+        with self.storage.transaction():
+            if self.log.version:
+                return  # seeded by another process in the meantime
+            changes = []
+            for section, records in self.storage.read().items():
+                if section in SECTION_KEYS:
+                    changes.extend(Change(0, PUT, section, record_key(section, record), record, self.origin)
+                                   for record in records)
+                elif records:
+                    changes.append(Change(0, SET, section, None, list(records), self.origin))
+            self.log.append(changes)
+
+    @property
+    def version(self) -> int:
+        """
+        The version of the latest change made to this storage.
+        """
+        return self.log.version
+
+    def _record(self, op: str, section: str, key: Optional[str], record: Any, origin: Optional[str] = None):
+        # Always called inside transaction(), which logs the change before the storage commits it.
+        self._local.pending.append(Change(0, op, section, key, record, origin or self.origin))
+
+    def read(self) -> Dict[str, List[Any]]:
+        return self.storage.read()
+
+    def find_record(self, section: str, key: str) -> Optional[Dict[str, Any]]:
+        return self.storage.find_record(section, key)
+
+    def write(self, data: Dict[str, List[Any]]) -> None:
+        """
+        Replaces the given sections, logging each as a 'set' change.
+        """
+        self._write(data)
+
+    def _write(self, data: Dict[str, List[Any]], origin: Optional[str] = None):
+        with self.transaction():
+            self.storage.write(data)
+            for section, records in data.items():
+                self._record(SET, section, None, list(records), origin)
+
+    def put_record(self, section: str, key: str, record: Dict[str, Any]) -> None:
+        with self.transaction():
+            self.storage.put_record(section, key, record)
+            self._record(PUT, section, key, record)
+
+    def delete_record(self, section: str, key: str) -> None:
+        with self.transaction():
+            self.storage.delete_record(section, key)
+            self._record(DELETE, section, key, None)
+
+    @contextmanager
+    def transaction(self, snapshot: bool = False) -> Iterator[Optional[Dict[str, List[Any]]]]:
+        """
+        Runs a transaction on the storage. The changes made in it are versioned and
+        appended to the log just before the storage commits them, while its lock is
+        still held, and discarded from the log if the commit fails.
+        """
+        outermost = getattr(self._local, 'pending', None) is None
+        if outermost:
+            self._local.pending = []
+        logged: List[Change] = []
+        try:
+            with self.storage.transaction(snapshot) as data:
+                yield data
+                if outermost:
+                    logged = self.log.append(self._local.pending)
+        except BaseException:
+            if logged:
+                self.log.discard(logged)
+            raise
+        finally:
+            if outermost:
+                self._local.pending = None
+
+    def changes_since(self, version: int, limit: Optional[int] = None,
+                      exclude_origin: Optional[str] = None) -> List[Change]:
+        """
+        Returns the changes made after version, oldest first. See ChangeLog.changes_since.
+        """
+        return self.log.changes_since(version, limit, exclude_origin)
+
+    def apply_changes(self, changes: Iterable[Union[Change, Dict[str, Any]]]) -> int:
+        """
+        Applies changes pulled from another replica in one transaction. They are
+        logged here under their original origin, so they can be passed on to
+        further replicas without coming back to the one that made them.
+
+        Parameters:
+            changes (Iterable[Union[Change, Dict[str, Any]]]): The changes, in version order,
+                as Change objects or their dictionary form.
+
+        Returns:
+            int: The source version of the last change applied, or 0 if there were none.
+        """
+        last = 0
+        with self.transaction():
+            for change in changes:
+                if isinstance(change, dict):
+                    change = Change.from_dict(change)
+                if change.op == PUT:
+                    self.storage.put_record(change.section, change.key, change.record)
+                elif change.op == DELETE:
+                    self.storage.delete_record(change.section, change.key)
+                elif change.op == SET:
+                    self._write({change.section: change.record}, change.origin)
+                    last = change.version
+                    continue
+                else:
+                    raise ValueError(f"Unknown change: {change.op}")
+                self._record(change.op, change.section, change.key, change.record, change.origin)
+                last = change.version
+        return last
+
+    def close(self) -> None:
+        self.storage.close()
+
+
+def _open(filename: str) -> VersionedStorage:
+    return VersionedStorage(open_storage(filename))
+
+
+def pull(source: VersionedStorage, replica: VersionedStorage, state_filename: str) -> int:
+    """
+    Applies to replica the changes made on source since the last pull, remembering
+    the source version reached in a small JSON state file.
+
+    Returns:
+        int: The number of changes applied.
+    """
+    try:
+        with open(state_filename, 'r') as file:
+            state = json.load(file)
+    except FileNotFoundError:
+        state = {}
+    since = state.get(source.origin, 0)
+    # Read the version first: it also covers the changes skipped because they came from the replica.
+    reached = max(source.version, since)
+    changes = source.changes_since(since, exclude_origin=replica.origin)
+    reached = max(reached, replica.apply_changes(changes))
+    state[source.origin] = reached
+    with open(state_filename + '.tmp', 'w') as file:
+        json.dump(state, file)
+    os.replace(state_filename + '.tmp', state_filename)
+    return len(changes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export, apply and pull library change feeds")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Write the changes made since a version as JSON Lines")
+    export_parser.add_argument("data")
+    export_parser.add_argument("--since", type=int, default=0)
+    export_parser.add_argument("--output", help="The file to write (default: stdout)")
+    apply_parser = subparsers.add_parser("apply", help="Apply a JSON Lines file of changes")
+    apply_parser.add_argument("data")
+    apply_parser.add_argument("changes")
+    pull_parser = subparsers.add_parser("pull", help="Apply the changes made on one data file since the last pull")
+    pull_parser.add_argument("source")
+    pull_parser.add_argument("replica")
+    compact_parser = subparsers.add_parser("compact", help="Drop superseded changes from the log")
+    compact_parser.add_argument("data")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        storage = _open(args.data)
+        output = open(args.output, 'w') if args.output else sys.stdout
+        try:
+            for change in storage.changes_since(args.since):
+                output.write(json.dumps(change.to_dict()) + '\n')
+        finally:
+            if args.output:
+                output.close()
+            storage.close()
+    elif args.command == "apply":
+        storage = _open(args.data)
+        try:
+            with open(args.changes, 'r') as file:
+                last = storage.apply_changes(json.loads(line) for line in file if line.strip())
+            print(f"Applied changes up to version {last}.")
+        finally:
+            storage.close()
+    elif args.command == "pull":
+        source, replica = _open(args.source), _open(args.replica)
+        try:
+            count = pull(source, replica, args.replica + '.sync.json')
+            print(f"Applied {count} changes from {args.source}.")
+        finally:
+            source.close()
+            replica.close()
+    else:
+        storage = _open(args.data)
+        try:
+            print(f"Dropped {storage.log.compact()} superseded changes.")
+        finally:
+            storage.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# checkout.py
+
+from datetime import datetime
+from typing import Any, Dict
+
+
+class Checkout:
+    """
+    Represents a book that is checked out to a user.
+
+    Attributes:
+        isbn (str): The ISBN of the checked out book.
+        user_id (str): The ID of the user who has the book.
+        due (int): The due date as a Unix timestamp in whole seconds.
+    """
+
+    __slots__ = ("isbn", "user_id", "due")
+
+    def __init__(self, isbn: str, user_id: str, due: int):
+        self.isbn = isbn
+        self.user_id = user_id
+        self.due = due
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Checkout':
+        """
+        Creates a checkout from its stored dictionary form.
+        """
+        return cls(data["isbn"], data["user_id"], int(datetime.fromisoformat(data["due_date"]).timestamp()))
+
+    @property
+    def key(self) -> str:
+        """
+        The storage key of the checkout: a user holds at most one copy of each ISBN.
+        """
+        return f"{self.isbn}:{self.user_id}"
+
+    @property
+    def due_date(self) -> datetime:
+        """
+        The due date as a local datetime.
+        """
+        return datetime.fromtimestamp(self.due)
+
+    def __str__(self) -> str:
+        """
+        Provides a string representation of the checkout.
+        """
+        return f"ISBN: {self.isbn}, User ID: {self.user_id}, Due Date: {self.due_date.isoformat()}"
+
+    def to_dict(self):
+        """
+        Converts the checkout object to a dictionary for storage.
+        """
+        return {
+            "user_id": self.user_id,
+            "isbn": self.isbn,
+            "due_date": self.due_date.isoformat()
+        }
@@ -1,39 +1,154 @@
 # checkout_manager.py
 
+from bisect import bisect_left, insort
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
-from storage import Storage
+from itertools import islice, takewhile
+from operator import attrgetter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from storage import StorageBackend
+from book_manager import BookManager
+from user_manager import UserManager
+from checkout import Checkout
+from hold import Hold
+from circulation_journal import CirculationJournal
+from fine_policy import FinePolicy
+from metrics import timed
+from reservation_manager import ReservationManager
+from pagination import Page, page, print_lines, sort_key, stream
 import logging
 
+# The fields checkouts can be listed in order of, mapped to the Checkout attributes holding them.
+CHECKOUT_SORT_FIELDS = {"isbn": "isbn", "user_id": "user_id", "due_date": "due"}
+CHECKOUT_KEY = attrgetter("key")
+
 class CheckoutManager:
     """
     Manages the checkout and check-in processes for books in the library.
 
+    A book can be lent as many times at once as it has copies, and a user holds at
+    most one copy of each ISBN. When a BookManager and UserManager are given,
+    checkouts are validated against them and copy counts come from the catalog;
+    otherwise every ISBN is treated as a single copy. When a CirculationJournal is
+    given, every checkout and check-in is also appended to it, keeping the loan
+    history that check-in removes from the current checkouts. When a
+    ReservationManager is given, users can queue for books that are out: a
+    checked-in copy is set aside for the next hold instead of returning to the
+    shelf, and only that hold's user can check it out.
+
     Attributes:
-        storage (Storage): Storage handler for data persistence.
-        checkouts (List[Dict]): A list of dictionaries, each representing a checkout.
+        storage (StorageBackend): Storage handler for data persistence.
+        checkouts (Dict[str, Checkout]): The current checkouts, indexed by checkout key ('isbn:user_id').
+        fine_policy (FinePolicy): The policy used to calculate fines for overdue books.
+        book_manager (Optional[BookManager]): The catalog used to validate ISBNs and count copies.
+        user_manager (Optional[UserManager]): The users used to validate user IDs.
+        journal (Optional[CirculationJournal]): The journal checkouts and check-ins are recorded in.
+        reservations (Optional[ReservationManager]): The waitlists of holds on books that are out.
     """
 
-    def __init__(self, storage: Storage):
+    def __init__(self, storage: StorageBackend, fine_policy: Optional[FinePolicy] = None,
+                 book_manager: Optional[BookManager] = None, user_manager: Optional[UserManager] = None,
+                 journal: Optional[CirculationJournal] = None,
+                 reservations: Optional[ReservationManager] = None):
         self.storage = storage
-        self.checkouts = self.load_checkouts()
+        self.fine_policy = fine_policy if fine_policy is not None else FinePolicy()
+        self.book_manager = book_manager
+        self.user_manager = user_manager
+        self.journal = journal
+        self.reservations = reservations
+        if reservations is not None:
+            # Copies freed by holds removed outside this manager (a deleted user's) go to the next hold.
+            reservations.on_release = self.assign_holds
+        # The checkouts are loaded on first access.
+        self._checkouts: Optional[Dict[str, Checkout]] = None
+        # The checkouts as columns in due-date order, built for bulk fine calculations.
+        self._columns: Optional['LoanColumns'] = None
 
-    def load_checkouts(self) -> List[Dict[str, any]]:
+    @property
+    def checkouts(self) -> Dict[str, Checkout]:
+        if self._checkouts is None:
+            checkouts = self.load_checkouts()
+            # (due timestamp, checkout key) pairs kept sorted so the overdue checkouts are always a prefix.
+            self._due_order: List[Tuple[int, str]] = sorted((c.due, key) for key, c in checkouts.items())
+            # Loans indexed both ways: ISBN -> user ID -> checkout and user ID -> ISBN -> checkout.
+            self._loans_by_isbn: Dict[str, Dict[str, Checkout]] = {}
+            self._loans_by_user: Dict[str, Dict[str, Checkout]] = {}
+            for checkout in checkouts.values():
+                self._index_loan(checkout)
+            self._checkouts = checkouts
+        return self._checkouts
+
+    @timed("library_manager_seconds", manager="checkouts", operation="load_checkouts")
+    def load_checkouts(self) -> Dict[str, Checkout]:
         """
-        Loads the checkouts from storage.
+        Loads the checkouts from storage, indexed by checkout key.
         """
-        return self.storage.read().get("checkouts", [])
+        checkouts = (Checkout.from_dict(data) for data in self.storage.read().get("checkouts", []))
+        return {checkout.key: checkout for checkout in checkouts}
+
+    def _index_loan(self, checkout: Checkout):
+        self._loans_by_isbn.setdefault(checkout.isbn, {})[checkout.user_id] = checkout
+        self._loans_by_user.setdefault(checkout.user_id, {})[checkout.isbn] = checkout
+
+    def _unindex_loan(self, checkout: Checkout):
+        for index, outer, inner in ((self._loans_by_isbn, checkout.isbn, checkout.user_id),
+                                    (self._loans_by_user, checkout.user_id, checkout.isbn)):
+            loans = index[outer]
+            del loans[inner]
+            if not loans:
+                del index[outer]
 
     def save_checkouts(self):
         """
         Saves the current checkouts back to storage.
         """
-        self.storage.write({"checkouts": self.checkouts})
+        self.storage.write({"checkouts": [checkout.to_dict() for checkout in self.checkouts.values()]})
         logging.info("Checkouts have been successfully saved .")
 
+    def copies(self, isbn: str) -> int:
+        """
+        Returns the number of copies the library holds of a book: its catalog copy
+        count, 0 if it is not in the catalog, or 1 when no catalog is attached.
+        """
+        if self.book_manager is None:
+            return 1
+        book = self.book_manager.find_book_by_isbn(isbn)
+        return book.copies if book is not None else 0
+
+    @timed("library_manager_seconds", manager="checkouts", operation="available_copies")
+    def available_copies(self, isbn: str) -> int:
+        """
+        Returns the number of copies of a book currently on the shelf, not counting
+        copies set aside for holds.
+        """
+        self.checkouts  # loads the loan indexes on first use
+        on_hold = self.reservations.ready_count(isbn) if self.reservations is not None else 0
+        return max(self.copies(isbn) - len(self._loans_by_isbn.get(isbn, ())) - on_hold, 0)
+
+    def is_available(self, isbn: str) -> bool:
+        """
+        Returns True if at least one copy of the book is on the shelf.
+        """
+        return self.available_copies(isbn) > 0
+
+    @timed("library_manager_seconds", manager="checkouts", operation="loans_for_user")
+    def loans_for_user(self, user_id: str) -> List[Checkout]:
+        """
+        Returns the checkouts a user currently holds.
+        """
+        self.checkouts  # loads the loan indexes on first use
+        return list(self._loans_by_user.get(user_id, {}).values())
+
+    def loans_for_book(self, isbn: str) -> List[Checkout]:
+        """
+        Returns the current checkouts of a book's copies.
+        """
+        self.checkouts  # loads the loan indexes on first use
+        return list(self._loans_by_isbn.get(isbn, {}).values())
+
+    @timed("library_manager_seconds", manager="checkouts", operation="checkout_book")
     def checkout_book(self, user_id: str, isbn: str, due_date: Optional[datetime] = None) -> bool:
         """
-        Checks out a book to a user, marking it as unavailable.
+        Checks out a copy of a book to a user, making it unavailable.
 
         Parameters:
             user_id (str): The ID of the user checking out the book.
@@ -45,92 +160,358 @@ class CheckoutManager:
         """
         if due_date is None:
             due_date = datetime.now() + timedelta(days=14)
-        
-        if any(checkout['isbn'] == isbn for checkout in self.checkouts):
-            logging.warning(f"Book already checked out: ISBN {isbn}")
+
+        if self.book_manager is not None and self.book_manager.find_book_by_isbn(isbn) is None:
+            logging.warning("Checkout of unknown book: ISBN %s", isbn)
+            return False
+        if self.user_manager is not None and self.user_manager.find_user_by_id(user_id) is None:
+            logging.warning("Checkout by unknown user: User ID %s", user_id)
+            return False
+        self.checkouts  # loads the loan indexes on first use
+        if isbn in self._loans_by_user.get(user_id, ()):
+            logging.warning("Book already checked out: ISBN %s by User ID %s", isbn, user_id)
+            return False
+        hold = self.reservations.find_hold(isbn, user_id) if self.reservations is not None else None
+        # A ready hold means a copy was set aside for this user.
+        if not (hold is not None and hold.ready) and not self.is_available(isbn):
+            logging.warning("Book already checked out: ISBN %s", isbn)
             return False
 
-        self.checkouts.append({"user_id": user_id, "isbn": isbn, "due_date": due_date.isoformat()})
-        self.save_checkouts()
-        logging.info(f"Book checked out: ISBN {isbn} by User ID {user_id}")
+        checkout = Checkout(isbn, user_id, int(due_date.timestamp()))
+        self.checkouts[checkout.key] = checkout
+        self._index_loan(checkout)
+        insort(self._due_order, (checkout.due, checkout.key))
+        self._columns = None
+        self.storage.put_record("checkouts", checkout.key, checkout.to_dict())
+        if hold is not None:
+            self.reservations.fulfill(isbn, user_id)
+        if self.journal is not None:
+            self.journal.record_checkout(isbn, user_id, checkout.due)
+        logging.info("Book checked out: ISBN %s by User ID %s", isbn, user_id)
         return True
 
-    def checkin_book(self, isbn: str) -> bool:
+    @timed("library_manager_seconds", manager="checkouts", operation="checkin_book")
+    def checkin_book(self, isbn: str, user_id: Optional[str] = None) -> bool:
         """
-        Checks in a book, making it available again.
+        Checks in a copy of a book, making it available again.
 
         Parameters:
             isbn (str): The ISBN of the book being checked in.
+            user_id (Optional[str]): The user returning it. May be omitted when only one copy is out.
 
         Returns:
             bool: True if the check-in was successful, False otherwise.
         """
-        for i, checkout in enumerate(self.checkouts):
-            if checkout['isbn'] == isbn:
-                del self.checkouts[i]
-                self.save_checkouts()
-                logging.info(f"Book checked in: ISBN {isbn}")
-                return True
+        self.checkouts  # loads the loan indexes on first use
+        loans = self._loans_by_isbn.get(isbn, {})
+        if user_id is None and len(loans) > 1:
+            logging.warning("Several copies checked out, user ID required to check in: ISBN %s", isbn)
+            return False
+        checkout = loans.get(user_id) if user_id is not None else next(iter(loans.values()), None)
+        if checkout is None:
+            logging.warning("Attempt to check in a book not checked out: ISBN %s", isbn)
+            return False
+        del self.checkouts[checkout.key]
+        self._unindex_loan(checkout)
+        del self._due_order[bisect_left(self._due_order, (checkout.due, checkout.key))]
+        self._columns = None
 
-        logging.warning(f"Attempt to check in a book not checked out: ISBN {isbn}")
-        return False
+        self.storage.delete_record("checkouts", checkout.key)
+        if self.journal is not None:
+            self.journal.record_checkin(checkout.isbn, checkout.user_id)
+        logging.info("Book checked in: ISBN %s", isbn)
+        self.assign_holds(checkout.isbn)
+        return True
 
-    def list_checked_out_books(self) -> None:
+    def assign_holds(self, isbn: str, now: Optional[datetime] = None):
         """
-        Lists all currently checked out books.
+        Sets the free copies of a book aside for the holds next in its waitlist.
+        Runs after every check-in, cancelled ready hold and expiry; call it too
+        when a book's copy count is raised, so the new copies serve the waitlist.
         """
-        if not self.checkouts:
-            print("No books currently checked out.")
+        if self.reservations is None:
             return
+        while self.available_copies(isbn) > 0 and self.reservations.assign(isbn, now) is not None:
+            pass
 
-        for checkout in self.checkouts:
-            print(f"ISBN: {checkout['isbn']}, User ID: {checkout['user_id']}, Due Date: {checkout['due_date']}")
+    @timed("library_manager_seconds", manager="checkouts", operation="place_hold")
+    def place_hold(self, user_id: str, isbn: str, priority: int = 0) -> Optional[Hold]:
+        """
+        Places a user in the waitlist for a book. If a copy is on the shelf, it is
+        set aside for the hold at once.
 
+        Parameters:
+            user_id (str): The ID of the user placing the hold.
+            isbn (str): The ISBN of the book.
+            priority (int): Holds with a higher priority are served first; 0 by default.
 
-    def find_overdue_books(self) -> List[dict]:
+        Returns:
+            Optional[Hold]: The hold, or None if it could not be placed.
         """
-        Identifies books that are overdue for return.
+        if self.reservations is None:
+            logging.warning("Hold on ISBN %s by User ID %s: holds are not kept", isbn, user_id)
+            return None
+        if self.book_manager is not None and self.book_manager.find_book_by_isbn(isbn) is None:
+            logging.warning("Hold on unknown book: ISBN %s", isbn)
+            return None
+        if self.user_manager is not None and self.user_manager.find_user_by_id(user_id) is None:
+            logging.warning("Hold by unknown user: User ID %s", user_id)
+            return None
+        self.checkouts  # loads the loan indexes on first use
+        if isbn in self._loans_by_user.get(user_id, ()):
+            logging.warning("Hold on a book already checked out: ISBN %s by User ID %s", isbn, user_id)
+            return None
+        hold = self.reservations.place_hold(isbn, user_id, priority)
+        if hold is not None:
+            self.assign_holds(isbn)
+        return hold
+
+    @timed("library_manager_seconds", manager="checkouts", operation="cancel_hold")
+    def cancel_hold(self, user_id: str, isbn: str) -> bool:
+        """
+        Cancels a user's hold on a book. A copy set aside for it goes to the next hold.
+
+        Returns:
+            bool: True if the hold was cancelled, False if the user had none.
+        """
+        hold = self.reservations.cancel_hold(isbn, user_id) if self.reservations is not None else None
+        if hold is None:
+            return False
+        if hold.ready:
+            self.assign_holds(isbn)
+        return True
+
+    @timed("library_manager_seconds", manager="checkouts", operation="process_expired_holds")
+    def process_expired_holds(self, now: Optional[datetime] = None) -> List[Hold]:
+        """
+        Expires the ready holds not collected in time and sets their copies aside
+        for the next holds in line, or returns them to the shelf.
+
+        Parameters:
+            now (Optional[datetime]): The time to expire holds at. Defaults to the current time.
 
         Returns:
-            List[dict]: A list of checkouts that are overdue.
+            List[Hold]: The expired holds.
         """
-        today = datetime.now()
-        overdue_checkouts = [checkout for checkout in self.checkouts if datetime.fromisoformat(checkout['due_date']) < today]
-        return overdue_checkouts
+        if self.reservations is None:
+            return []
+        expired = self.reservations.expire(now)
+        for isbn in dict.fromkeys(hold.isbn for hold in expired):
+            self.assign_holds(isbn, now)
+        return expired
 
-    def list_overdue_books(self) -> None:
+    def iter_checkouts(self, isbn: Optional[str] = None, user_id: Optional[str] = None,
+                       where: Optional[Callable[[Checkout], bool]] = None, sort: Optional[str] = None,
+                       descending: bool = False, offset: int = 0, limit: Optional[int] = None,
+                       after: Optional[str] = None) -> Iterator[Checkout]:
         """
-        Prints a list of all overdue books, including the user who has them and the overdue days.
+        Lazily lists the current checkouts. Filtering by ISBN or user reads only
+        that book's or user's loans; without a sort the checkouts are streamed in
+        constant memory.
+
+        Parameters:
+            isbn (Optional[str]): Lists only the loans of this book.
+            user_id (Optional[str]): Lists only the loans of this user.
+            where (Optional[Callable[[Checkout], bool]]): Keeps only the checkouts it returns True for.
+            sort (Optional[str]): The field to order by: 'isbn', 'user_id' or 'due_date'.
+            descending (bool): Whether to list the largest values first.
+            offset (int): The number of leading checkouts to skip.
+            limit (Optional[int]): The maximum number of checkouts to list, or None for all.
+            after (Optional[str]): A cursor returned by page_checkouts; only checkouts after it are listed.
+
+        Returns:
+            Iterator[Checkout]: The matching checkouts, in order.
+
+        Raises:
+            ValueError: If the sort field or cursor is invalid.
         """
-        overdue_checkouts = self.find_overdue_books()
-        if not overdue_checkouts:
-            print("No books are currently overdue.")
-            return
+        return stream(self._select(isbn, user_id), CHECKOUT_KEY, where, sort_key(sort, CHECKOUT_SORT_FIELDS),
+                      descending, offset, limit, after)
+
+    def page_checkouts(self, limit: int = 20, isbn: Optional[str] = None, user_id: Optional[str] = None,
+                       where: Optional[Callable[[Checkout], bool]] = None, sort: Optional[str] = None,
+                       descending: bool = False, after: Optional[str] = None) -> Page[Checkout]:
+        """
+        Fetches one page of checkouts using cursor pagination. Parameters are as for iter_checkouts.
+
+        Returns:
+            Page[Checkout]: The checkouts on the page and the cursor of the next page.
+        """
+        return page(self._select(isbn, user_id), CHECKOUT_KEY, limit, where,
+                    sort_key(sort, CHECKOUT_SORT_FIELDS), descending, after)
+
+    def _select(self, isbn: Optional[str], user_id: Optional[str]) -> Iterable[Checkout]:
+        checkouts = self.checkouts  # loads the loan indexes on first use
+        if isbn is not None and user_id is not None:
+            checkout = checkouts.get(f"{isbn}:{user_id}")
+            return [checkout] if checkout is not None else []
+        if isbn is not None:
+            return self._loans_by_isbn.get(isbn, {}).values()
+        if user_id is not None:
+            return self._loans_by_user.get(user_id, {}).values()
+        return checkouts.values()
+
+    def list_checked_out_books(self, isbn: Optional[str] = None, user_id: Optional[str] = None,
+                               sort: Optional[str] = None, descending: bool = False,
+                               page_size: Optional[int] = None) -> int:
+        """
+        Prints the current checkouts as they are listed, pausing every page_size
+        checkouts. Parameters are as for iter_checkouts.
+
+        Returns:
+            int: The number of checkouts printed.
+        """
+        checkouts = self.iter_checkouts(isbn, user_id, sort=sort, descending=descending)
+        return print_lines((str(checkout) for checkout in checkouts), "No books currently checked out.", page_size)
+
+    def iter_overdue(self, now: Optional[datetime] = None, offset: int = 0,
+                     limit: Optional[int] = None) -> Iterator[Checkout]:
+        """
+        Lazily lists the overdue checkouts, most overdue first, by walking the
+        due-date order until the first checkout that is not yet due.
+
+        Parameters:
+            now (Optional[datetime]): The time to check against. Defaults to the current time.
+            offset (int): The number of leading checkouts to skip.
+            limit (Optional[int]): The maximum number of checkouts to list, or None for all.
+
+        Returns:
+            Iterator[Checkout]: The overdue checkouts.
+        """
+        now_timestamp = (now or datetime.now()).timestamp()
+        checkouts = self.checkouts  # loads the due-date order on first use
+        overdue = (checkouts[key] for due, key in takewhile(lambda entry: entry[0] < now_timestamp, self._due_order))
+        return islice(overdue, offset, None if limit is None else offset + limit)
+
+    def _overdue(self, now: Optional[datetime] = None) -> List[Tuple[int, str]]:
+        """
+        Returns the (due timestamp, checkout key) pairs due before now, most overdue first.
+        """
+        now_timestamp = (now or datetime.now()).timestamp()
+        self.checkouts  # loads the due-date order on first use
+        return self._due_order[:bisect_left(self._due_order, (now_timestamp,))]
+
+    @timed("library_manager_seconds", manager="checkouts", operation="find_overdue_books")
+    def find_overdue_books(self, now: Optional[datetime] = None) -> List[dict]:
+        """
+        Identifies books that are overdue for return.
+
+        Parameters:
+            now (Optional[datetime]): The time to check against. Defaults to the current time.
+
+        Returns:
+            List[dict]: A list of checkouts that are overdue, most overdue first.
+        """
+        return [self.checkouts[key].to_dict() for _, key in self._overdue(now)]
+
+    def list_overdue_books(self, page_size: Optional[int] = None) -> int:
+        """
+        Prints the overdue books as they are listed, most overdue first, including
+        the user who has them and the overdue days. Pauses every page_size books.
 
-        for checkout in overdue_checkouts:
-            due_date = datetime.fromisoformat(checkout['due_date'])
-            overdue_days = (datetime.now() - due_date).days
-            print(f"ISBN: {checkout['isbn']}, User ID: {checkout['user_id']}, Overdue by: {overdue_days} days")
+        Returns:
+            int: The number of overdue books printed.
+        """
+        now = datetime.now()
+        lines = (f"ISBN: {checkout.isbn}, User ID: {checkout.user_id}, "
+                 f"Overdue by: {FinePolicy.overdue_days(checkout.due, now.timestamp())} days"
+                 for checkout in self.iter_overdue(now))
+        return print_lines(lines, "No books are currently overdue.", page_size)
 
-    def calculate_fine(self, isbn: str) -> Optional[float]:
+    @timed("library_manager_seconds", manager="checkouts", operation="calculate_fine")
+    def calculate_fine(self, isbn: str, user_id: Optional[str] = None) -> Optional[float]:
         """
         Calculates the fine for an overdue book based on the number of days it is overdue.
+        Only the book's own loans are looked at, so this stays cheap however many
+        checkouts there are and however recently they changed.
 
         Parameters:
             isbn (str): The ISBN of the overdue book.
+            user_id (Optional[str]): The user holding it. When omitted, the fines of all
+                overdue copies of the book are added up.
 
         Returns:
             Optional[float]: The fine amount or None if the book is not found or not overdue.
         """
-        overdue_checkouts = self.find_overdue_books()
-        for checkout in overdue_checkouts:
-            if checkout['isbn'] == isbn:
-                due_date = datetime.fromisoformat(checkout['due_date'])
-                overdue_days = max((datetime.now() - due_date).days, 0)  # Ensure no negative days
-                fine_per_day = 0.5  # Assuming a fine of $0.5 per day
-                return overdue_days * fine_per_day
+        now = datetime.now()
+        self.checkouts  # loads the loan indexes on first use
+        loans = self._loans_by_isbn.get(isbn, {})
+        if user_id is not None:
+            loans = {user_id: loans[user_id]} if user_id in loans else {}
+        overdue = [(checkout.due, checkout.key) for checkout in loans.values() if checkout.due < now.timestamp()]
+        if not overdue:
+            logging.warning("Book with ISBN %s is not overdue or not found.", isbn)
+            return None
+        return sum(self._policy_fines(overdue, now)[1])
+
+    @timed("library_manager_seconds", manager="checkouts", operation="calculate_fines")
+    def calculate_fines(self, now: Optional[datetime] = None) -> List[dict]:
+        """
+        Calculates the fines for every overdue book in a single pass.
+
+        Parameters:
+            now (Optional[datetime]): The time to calculate fines at. Defaults to the current time.
+
+        Returns:
+            List[dict]: One entry per overdue checkout, most overdue first, with the
+            checkout's 'isbn', 'user_id' and 'due_date' plus 'overdue_days' and 'fine'.
+        """
+        now = now or datetime.now()
+        overdue = self._overdue(now)
+        overdue_days, amounts = self._fines(overdue, now)
+        return [dict(self.checkouts[key].to_dict(), overdue_days=days, fine=amount)
+                for (_, key), days, amount in zip(overdue, overdue_days, amounts)]
+
+    def _fines(self, overdue: List[Tuple[int, str]], now: datetime) -> Tuple[List[int], List[float]]:
+        """
+        Returns the overdue days and fines of every overdue checkout at now. They
+        come from the loan columns when NumPy is installed, and from the fine policy
+        one loan at a time otherwise; both compute the same amounts.
+
+        Parameters:
+            overdue (List[Tuple[int, str]]): The overdue checkouts' (due timestamp, checkout key)
+                pairs, as returned by _overdue.
+            now (datetime): The time to calculate fines at.
+        """
+        # The analytics, and NumPy with them, are only imported when fines are calculated.
+        import overdue_analytics
+        if not overdue_analytics.available():
+            return self._policy_fines(overdue, now)
+        # The overdue checkouts are the first rows of the loan columns.
+        columns, rows = self._loan_columns(), slice(0, len(overdue))
+        return (columns.overdue_days(now.timestamp(), rows).tolist(),
+                columns.fines(self.fine_policy, now.timestamp(), rows).tolist())
 
-        logging.warning(f"Book with ISBN {isbn} is not overdue or not found.")
-        return None
+    def _policy_fines(self, overdue: List[Tuple[int, str]], now: datetime) -> Tuple[List[int], List[float]]:
+        """
+        Returns the overdue days and fines of overdue checkouts at now, from the fine policy one loan at a time.
+        """
+        overdue_days = [FinePolicy.overdue_days(due, now.timestamp()) for due, _ in overdue]
+        return overdue_days, [self.fine_policy.fine(days) for days in overdue_days]
 
+    def _loan_columns(self) -> 'LoanColumns':
+        """
+        Returns the current checkouts as columns in due-date order, rebuilt only after a change.
+        """
+        from overdue_analytics import LoanColumns
+        if self._columns is None:
+            checkouts = self.checkouts
+            self._columns = LoanColumns.from_checkouts(checkouts[key] for _, key in self._due_order)
+        return self._columns
 
+    @timed("library_manager_seconds", manager="checkouts", operation="fine_report")
+    def fine_report(self, now: Optional[datetime] = None) -> 'FineReport':
+        """
+        Computes the fine totals per user and per title and the overdue ageing
+        buckets of the current checkouts, vectorized with NumPy.
+
+        Parameters:
+            now (Optional[datetime]): The time to report at. Defaults to the current time.
+
+        Returns:
+            FineReport: The totals.
+
+        Raises:
+            ImportError: If NumPy is not installed.
+        """
+        return self._loan_columns().report(self.fine_policy, now)
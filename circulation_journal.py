@@ -0,0 +1,374 @@
+# circulation_journal.py
+
+import json
+import os
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+CHECKOUT = "checkout"
+CHECKIN = "checkin"
+
+SECONDS_PER_DAY = 86400
+
+
+class Event:
+    """
+    A checkout or check-in, as recorded in the journal.
+
+    Attributes:
+        time (int): When it happened, as a Unix timestamp.
+        kind (str): 'checkout' or 'checkin'.
+        isbn (str): The ISBN of the book.
+        user_id (str): The ID of the user.
+        due (Optional[int]): For checkouts, the due date as a Unix timestamp.
+    """
+
+    __slots__ = ("time", "kind", "isbn", "user_id", "due")
+
+    def __init__(self, time: int, kind: str, isbn: str, user_id: str, due: Optional[int] = None):
+        self.time = time
+        self.kind = kind
+        self.isbn = isbn
+        self.user_id = user_id
+        self.due = due
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Event':
+        return cls(data["t"], data["e"], data["isbn"], data["user_id"], data.get("due"))
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {"t": self.time, "e": self.kind, "isbn": self.isbn, "user_id": self.user_id}
+        if self.due is not None:
+            data["due"] = self.due
+        return data
+
+    def __str__(self) -> str:
+        when = datetime.fromtimestamp(self.time).isoformat(timespec='seconds')
+        return f"{when} {self.kind}: ISBN: {self.isbn}, User ID: {self.user_id}"
+
+
+def _month(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m')
+
+
+class _SegmentIndex:
+    # Byte offsets of a segment's events by ISBN and by user ID, covering the
+    # first `size` bytes of the segment.
+
+    def __init__(self, size: int = 0, isbn: Optional[Dict[str, List[int]]] = None,
+                 user_id: Optional[Dict[str, List[int]]] = None):
+        self.size = size
+        self.isbn = isbn if isbn is not None else {}
+        self.user_id = user_id if user_id is not None else {}
+
+    def add(self, offset: int, line: bytes, event: Event):
+        self.isbn.setdefault(event.isbn, []).append(offset)
+        self.user_id.setdefault(event.user_id, []).append(offset)
+        self.size = offset + len(line)
+
+
+class CirculationJournal:
+    """
+    An append-only journal of checkouts and check-ins, kept as one JSON Lines
+    segment per month ('2026-10.jsonl') with a sidecar index of the byte offsets
+    of each ISBN's and each user's events ('2026-10.idx').
+
+    Events are never changed or removed. Queries stream over the segments in
+    their time range and hold at most one segment's index in memory; ISBN and
+    user queries read only the indexed lines.
+
+    Several processes can append to the same journal: each append holds an
+    advisory lock on the segment and first indexes the events the others
+    appended, so every process's index stays complete.
+
+    Attributes:
+        directory (str): The directory holding the segments.
+    """
+
+    def __init__(self, directory: str = 'library_journal'):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._month: Optional[str] = None
+        self._file = None
+        self._index: Optional[_SegmentIndex] = None
+
+    def _path(self, month: str, suffix: str) -> str:
+        return os.path.join(self.directory, month + suffix)
+
+    def months(self) -> List[str]:
+        """
+        Returns the months that have a segment, oldest first, e.g. ['2026-09', '2026-10'].
+        """
+        return sorted(name[:-len('.jsonl')] for name in os.listdir(self.directory) if name.endswith('.jsonl'))
+
+    # Writing
+
+    def record_checkout(self, isbn: str, user_id: str, due: int, when: Optional[datetime] = None) -> Event:
+        """
+        Appends a checkout to the journal.
+
+        Parameters:
+            isbn (str): The ISBN of the book checked out.
+            user_id (str): The ID of the user checking it out.
+            due (int): The due date as a Unix timestamp.
+            when (Optional[datetime]): When the checkout happened. Defaults to now.
+
+        Returns:
+            Event: The recorded event.
+        """
+        return self._append(Event(int((when or datetime.now()).timestamp()), CHECKOUT, isbn, user_id, due))
+
+    def record_checkin(self, isbn: str, user_id: str, when: Optional[datetime] = None) -> Event:
+        """
+        Appends a check-in to the journal.
+
+        Parameters:
+            isbn (str): The ISBN of the book checked in.
+            user_id (str): The ID of the user who had it.
+            when (Optional[datetime]): When the check-in happened. Defaults to now.
+
+        Returns:
+            Event: The recorded event.
+        """
+        return self._append(Event(int((when or datetime.now()).timestamp()), CHECKIN, isbn, user_id))
+
+    def _append(self, event: Event) -> Event:
+        line = (json.dumps(event.to_dict(), separators=(',', ':')) + '\n').encode('utf-8')
+        month = _month(event.time)
+        with self._lock:
+            if month != self._month:
+                self._open_segment(month)
+            with self._segment_locked():
+                fd = self._file.fileno()
+                if os.fstat(fd).st_size > self._index.size:
+                    self._catch_up(self._month, self._index)
+                    if os.fstat(fd).st_size > self._index.size:
+                        # Drop a torn final write so the event starts on a fresh line.
+                        os.ftruncate(fd, self._index.size)
+                offset = self._index.size
+                self._file.write(line)
+                self._file.flush()
+                self._index.add(offset, line, event)
+        return event
+
+    @contextmanager
+    def _segment_locked(self) -> Iterator[None]:
+        """
+        Holds the advisory lock on the open segment that every process appending to it takes.
+        """
+        fd = self._file.fileno()
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+    def _open_segment(self, month: str):
+        """
+        Switches appends to a month's segment, saving the index of the previous one.
+        Must be called with the lock held.
+        """
+        self._close_segment()
+        self._index = self._load_index(month)
+        self._file = open(self._path(month, '.jsonl'), 'ab')
+        self._month = month
+
+    def _close_segment(self):
+        if self._file is not None:
+            with self._segment_locked():
+                # Index what other processes appended first, so the saved index covers
+                # the whole segment and never replaces a more complete one.
+                self._catch_up(self._month, self._index)
+                self._save_index(self._month, self._index)
+            self._file.close()
+            self._file = self._index = self._month = None
+
+    def _save_index(self, month: str, index: _SegmentIndex):
+        tmp_filename = self._path(month, '.idx.tmp')
+        with open(tmp_filename, 'w') as file:
+            json.dump({"size": index.size, "isbn": index.isbn, "user_id": index.user_id}, file,
+                      separators=(',', ':'))
+        os.replace(tmp_filename, self._path(month, '.idx'))
+
+    def _load_index(self, month: str) -> _SegmentIndex:
+        """
+        Loads a segment's index, indexing any events appended after it was saved
+        (e.g. before a crash).
+        """
+        try:
+            with open(self._path(month, '.idx'), 'r') as file:
+                data = json.load(file)
+            index = _SegmentIndex(data["size"], data["isbn"], data["user_id"])
+        except (FileNotFoundError, ValueError, KeyError):
+            index = _SegmentIndex()
+        return self._catch_up(month, index)
+
+    def _catch_up(self, month: str, index: _SegmentIndex) -> _SegmentIndex:
+        """
+        Adds to a segment's index the complete events written after the bytes it covers.
+        """
+        try:
+            with open(self._path(month, '.jsonl'), 'rb') as file:
+                file.seek(index.size)
+                offset = index.size
+                for line in file:
+                    if not line.endswith(b'\n'):
+                        break  # a torn final write, or one still in progress
+                    index.add(offset, line, Event.from_dict(json.loads(line)))
+                    offset += len(line)
+        except FileNotFoundError:
+            pass
+        return index
+
+    def close(self) -> None:
+        """
+        Closes the current segment and saves its index.
+        """
+        with self._lock:
+            self._close_segment()
+
+    # Reading
+
+    def _offsets(self, month: str, isbn: Optional[str], user_id: Optional[str]) -> List[int]:
+        """
+        Returns the offsets of a segment's events for an ISBN and/or user, in file order.
+        """
+        with self._lock:
+            if month == self._month:
+                return self._match(self._catch_up(month, self._index), isbn, user_id)
+        return self._match(self._load_index(month), isbn, user_id)
+
+    @staticmethod
+    def _match(index: _SegmentIndex, isbn: Optional[str], user_id: Optional[str]) -> List[int]:
+        if isbn is not None and user_id is not None:
+            return sorted(set(index.isbn.get(isbn, ())) & set(index.user_id.get(user_id, ())))
+        if isbn is not None:
+            return list(index.isbn.get(isbn, ()))
+        return list(index.user_id.get(user_id, ()))
+
+    def events(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+               isbn: Optional[str] = None, user_id: Optional[str] = None) -> Iterator[Event]:
+        """
+        Streams the recorded events in time order.
+
+        Parameters:
+            start (Optional[datetime]): Only events at or after this time.
+            end (Optional[datetime]): Only events before this time.
+            isbn (Optional[str]): Only events for this book.
+            user_id (Optional[str]): Only events for this user.
+
+        Yields:
+            Event: The matching events.
+        """
+        start_ts = start.timestamp() if start is not None else None
+        end_ts = end.timestamp() if end is not None else None
+        for month in self.months():
+            if start is not None and month < _month(start_ts):
+                continue
+            if end is not None and month > _month(end_ts):
+                break
+            for event in self._segment_events(month, isbn, user_id):
+                if start_ts is not None and event.time < start_ts:
+                    continue
+                if end_ts is not None and event.time >= end_ts:
+                    continue
+                if isbn is not None and event.isbn != isbn:
+                    continue
+                if user_id is not None and event.user_id != user_id:
+                    continue
+                yield event
+
+    def _segment_events(self, month: str, isbn: Optional[str], user_id: Optional[str]) -> Iterator[Event]:
+        path = self._path(month, '.jsonl')
+        if isbn is None and user_id is None:
+            with open(path, 'rb') as file:
+                for line in file:
+                    if line.endswith(b'\n'):
+                        yield Event.from_dict(json.loads(line))
+            return
+        with open(path, 'rb') as file:
+            for offset in self._offsets(month, isbn, user_id):
+                file.seek(offset)
+                yield Event.from_dict(json.loads(file.readline()))
+
+    # Aggregates
+
+    def loans_per_title(self, start: Optional[datetime] = None,
+                        end: Optional[datetime] = None) -> Dict[Tuple[str, str], int]:
+        """
+        Counts checkouts per title per month.
+
+        Returns:
+            Dict[Tuple[str, str], int]: (month, ISBN) -> number of checkouts, e.g. ('2026-10', '9780...') -> 3.
+        """
+        counts = Counter()
+        for event in self.events(start, end):
+            if event.kind == CHECKOUT:
+                counts[(_month(event.time), event.isbn)] += 1
+        return dict(counts)
+
+    def popular_titles(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                       limit: int = 10) -> List[Tuple[str, int]]:
+        """
+        Returns the most borrowed titles.
+
+        Returns:
+            List[Tuple[str, int]]: (ISBN, number of checkouts) pairs, most borrowed first.
+        """
+        counts = Counter(event.isbn for event in self.events(start, end) if event.kind == CHECKOUT)
+        return counts.most_common(limit)
+
+    def borrowing_history(self, user_id: str, start: Optional[datetime] = None,
+                          end: Optional[datetime] = None) -> Iterator[Event]:
+        """
+        Streams a user's checkouts and check-ins in time order.
+        """
+        return self.events(start, end, user_id=user_id)
+
+    def turnover(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict[str, Dict[str, float]]:
+        """
+        Summarizes how often each title circulates. A loan's length is counted
+        when its check-in falls in the range and its checkout was journaled.
+
+        Returns:
+            Dict[str, Dict[str, float]]: ISBN -> {'checkouts', 'checkins', 'mean_loan_days'}.
+        """
+        stats: Dict[str, Dict[str, float]] = {}
+        open_loans: Dict[Tuple[str, str], int] = {}
+        loan_days: Dict[str, List[float]] = {}
+        # Scan from the beginning so loans opened before the range can be paired.
+        for event in self.events(None, end):
+            key = (event.isbn, event.user_id)
+            in_range = start is None or event.time >= start.timestamp()
+            if event.kind == CHECKOUT:
+                open_loans[key] = event.time
+                if in_range:
+                    stats.setdefault(event.isbn, {"checkouts": 0, "checkins": 0})["checkouts"] += 1
+            else:
+                opened = open_loans.pop(key, None)
+                if in_range:
+                    stats.setdefault(event.isbn, {"checkouts": 0, "checkins": 0})["checkins"] += 1
+                    if opened is not None:
+                        loan_days.setdefault(event.isbn, []).append((event.time - opened) / SECONDS_PER_DAY)
+        for isbn, entry in stats.items():
+            days = loan_days.get(isbn)
+            entry["mean_loan_days"] = sum(days) / len(days) if days else None
+        return stats
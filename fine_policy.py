@@ -0,0 +1,43 @@
+# fine_policy.py
+
+from typing import Optional
+
+SECONDS_PER_DAY = 86400
+
+
+class FinePolicy:
+    """
+    Describes how fines accrue on overdue books.
+
+    Attributes:
+        per_day (float): The fine charged for each full day a book is overdue.
+        grace_days (int): The number of overdue days that are not charged.
+        max_fine (Optional[float]): The cap on the fine for a single checkout, if any.
+    """
+
+    def __init__(self, per_day: float = 0.5, grace_days: int = 0, max_fine: Optional[float] = None):
+        self.per_day = per_day
+        self.grace_days = grace_days
+        self.max_fine = max_fine
+
+    @staticmethod
+    def overdue_days(due_timestamp: float, now_timestamp: float) -> int:
+        """
+        Returns the number of full days between the due date and now, never negative.
+        """
+        return max(int((now_timestamp - due_timestamp) // SECONDS_PER_DAY), 0)
+
+    def fine(self, overdue_days: int) -> float:
+        """
+        Calculates the fine for a book that is overdue by the given number of days.
+
+        Parameters:
+            overdue_days (int): The number of full days the book is overdue.
+
+        Returns:
+            float: The fine amount.
+        """
+        amount = max(overdue_days - self.grace_days, 0) * self.per_day
+        if self.max_fine is not None:
+            amount = min(amount, self.max_fine)
+        return amount
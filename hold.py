@@ -0,0 +1,79 @@
+# hold.py
+
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+
+class Hold:
+    """
+    Represents a user's place in the waitlist for a book.
+
+    A hold is waiting until a copy is set aside for the user, and then ready
+    until it is collected or its pickup deadline passes.
+
+    Attributes:
+        isbn (str): The ISBN of the book on hold.
+        user_id (str): The ID of the user waiting for it.
+        placed (int): When the hold was placed, as a Unix timestamp in whole seconds.
+        priority (int): Holds with a higher priority are served first.
+        seq (int): The order holds were placed in; holds of equal priority are served first come, first served.
+        ready_until (Optional[int]): For a ready hold, the pickup deadline as a Unix timestamp; None while waiting.
+    """
+
+    __slots__ = ("isbn", "user_id", "placed", "priority", "seq", "ready_until")
+
+    def __init__(self, isbn: str, user_id: str, placed: int, priority: int = 0, seq: int = 0,
+                 ready_until: Optional[int] = None):
+        self.isbn = isbn
+        self.user_id = user_id
+        self.placed = placed
+        self.priority = priority
+        self.seq = seq
+        self.ready_until = ready_until
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Hold':
+        """
+        Creates a hold from its stored dictionary form.
+        """
+        ready_until = data.get("ready_until")
+        return cls(data["isbn"], data["user_id"], int(datetime.fromisoformat(data["placed_date"]).timestamp()),
+                   int(data.get("priority", 0)), int(data.get("seq", 0)),
+                   int(datetime.fromisoformat(ready_until).timestamp()) if ready_until else None)
+
+    @property
+    def key(self) -> str:
+        """
+        The storage key of the hold: a user holds at most one place in each ISBN's waitlist.
+        """
+        return f"{self.isbn}:{self.user_id}"
+
+    @property
+    def ready(self) -> bool:
+        """
+        Whether a copy has been set aside for the user.
+        """
+        return self.ready_until is not None
+
+    def __str__(self) -> str:
+        """
+        Provides a string representation of the hold.
+        """
+        if self.ready:
+            state = f"Ready until: {datetime.fromtimestamp(self.ready_until).isoformat()}"
+        else:
+            state = f"Waiting since: {datetime.fromtimestamp(self.placed).isoformat()}"
+        return f"ISBN: {self.isbn}, User ID: {self.user_id}, Priority: {self.priority}, {state}"
+
+    def to_dict(self):
+        """
+        Converts the hold object to a dictionary for storage.
+        """
+        return {
+            "isbn": self.isbn,
+            "user_id": self.user_id,
+            "placed_date": datetime.fromtimestamp(self.placed).isoformat(),
+            "priority": self.priority,
+            "seq": self.seq,
+            "ready_until": datetime.fromtimestamp(self.ready_until).isoformat() if self.ready else None,
+        }
@@ -1,11 +1,141 @@
 # log_config.py
 
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
+from datetime import datetime
+from typing import Optional
 
-def setup_logging():
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_listener: Optional[logging.handlers.QueueListener] = None  # the async mode's writer
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Formats each record as one JSON object per line, with the time, level,
+    logger name, thread name and message, plus the traceback if there is one.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Puts records on the queue as they are, so the message is merged with its
+    arguments and formatted by the writer thread instead of the caller.
+    Arguments must therefore not be modified after they are logged.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class _BatchFlush:
+    # Lets the writer thread skip the flush a stream handler does after every
+    # record and flush once per batch instead.
+    batching = False
+
+    def flush(self):
+        if not self.batching:
+            super().flush()
+
+
+class _FileHandler(_BatchFlush, logging.FileHandler):
+    pass
+
+
+class _RotatingFileHandler(_BatchFlush, logging.handlers.RotatingFileHandler):
+    pass
+
+
+class _TimedRotatingFileHandler(_BatchFlush, logging.handlers.TimedRotatingFileHandler):
+    pass
+
+
+class BatchingQueueListener(logging.handlers.QueueListener):
+    """
+    A QueueListener that writes records in batches: the file is flushed once
+    the queue has been drained rather than after every record.
+    """
+
+    def handle(self, record: logging.LogRecord):
+        for handler in self.handlers:
+            handler.batching = True
+        super().handle(record)
+        if self.queue.empty():
+            for handler in self.handlers:
+                handler.batching = False
+                handler.flush()
+
+
+def _file_handler(filename: str, max_bytes: int, backup_count: int, when: Optional[str]) -> logging.Handler:
+    if when:
+        return _TimedRotatingFileHandler(filename, when=when, backupCount=backup_count, encoding='utf-8')
+    if max_bytes:
+        return _RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+    return _FileHandler(filename, encoding='utf-8')
+
+
+def setup_logging(filename: str = 'library_system.log', level: int = logging.INFO, async_mode: bool = False,
+                  json_lines: bool = False, max_bytes: int = 0, backup_count: int = 5,
+                  when: Optional[str] = None):
     """
     Sets up the logging configuration for the Library Management System.
     It specifies the log file name, the log level, and the log message format.
+
+    In async mode, callers only put the record on a queue; a background thread
+    formats the queued records and writes them to the file in batches, so logging
+    never waits on the disk. Records still queued are written when the process exits.
+
+    Parameters:
+        filename (str): The log file.
+        level (int): The minimum level logged.
+        async_mode (bool): Whether to write the log from a background thread.
+        json_lines (bool): Whether to write JSON lines instead of plain text.
+        max_bytes (int): Rotate the file when it reaches this size; 0 never rotates by size.
+        backup_count (int): The number of rotated files to keep.
+        when (Optional[str]): Rotate the file on a schedule instead, e.g. 'midnight' or 'H'
+            (see logging.handlers.TimedRotatingFileHandler).
+    """
+    global _listener
+    stop_logging()
+    handler = _file_handler(filename, max_bytes, backup_count, when)
+    handler.setFormatter(JSONFormatter() if json_lines else logging.Formatter(LOG_FORMAT))
+    if async_mode:
+        log_queue = queue.SimpleQueue()
+        _listener = BatchingQueueListener(log_queue, handler)
+        _listener.start()
+        atexit.register(stop_logging)
+        handler = DeferredQueueHandler(log_queue)
+    root = logging.getLogger()
+    for previous in root.handlers[:]:
+        root.removeHandler(previous)
+        previous.close()
+    root.addHandler(handler)
+    root.setLevel(level)
+
+
+def stop_logging():
+    """
+    Stops the background writer, if any, after it has written every queued record.
     """
-    logging.basicConfig(filename='library_system.log', level=logging.INFO,
-                        format='%(asctime)s - %(levelname)s - %(message)s')
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+        atexit.unregister(stop_logging)
@@ -1,24 +1,393 @@
 # main.py
 import sys
-#from datetime import datetime
-from book import Book
-from user import User
-from book_manager import BookManager
-from user_manager import UserManager
-from checkout_manager import CheckoutManager
-from storage import Storage
-from log_config import setup_logging
+import argparse
+import shlex
+from datetime import datetime
+import metrics
 import logging
 
-# Initialize logging
-setup_logging()
+# The storage, the managers, the journal and their dependencies are imported
+# where they are used, so a scripted command only pays for what it touches.
 
-def main():
+# The number of records shown between pauses in interactive listings.
+PAGE_SIZE = 20
+
+def build_parser():
+    from unit_of_work import DURABILITY_MODES
+    parser = argparse.ArgumentParser(description="Library Management System. Runs the interactive menus "
+                                                 "when no command is given.")
+    parser.add_argument("--durability", choices=DURABILITY_MODES, default="group",
+                        help="When changes are written: immediately, in groups every second, or only at exit")
+    parser.add_argument("--metrics", action="store_true",
+                        help="Record operation latencies and print them to stderr at exit")
+    parser.add_argument("--metrics-file",
+                        help="Record metrics and keep this file updated in the Prometheus text format")
+    subparsers = parser.add_subparsers(dest="command")
+
+    import_parser = subparsers.add_parser("import", help="Bulk import books or users from a CSV or JSONL file")
+    import_parser.add_argument("kind", choices=["books", "users"])
+    import_parser.add_argument("path")
+    import_parser.add_argument("--format", choices=["csv", "jsonl"], help="Defaults to the file extension")
+    import_parser.add_argument("--batch-size", type=int, default=1000)
+    import_parser.add_argument("--errors", help="Write the per-row error report to this file")
+
+    list_parser = subparsers.add_parser("list", help="Print books, users, checkouts or overdue books")
+    list_parser.add_argument("kind", choices=["books", "users", "checkouts", "overdue"])
+    list_parser.add_argument("--sort", help="Field to order by, e.g. title, name or due_date")
+    list_parser.add_argument("--desc", action="store_true", help="List the largest values first")
+    list_parser.add_argument("--offset", type=int, default=0)
+    list_parser.add_argument("--limit", type=int)
+
+    stats_parser = subparsers.add_parser("stats", help="Circulation statistics from the checkout journal")
+    stats_parser.add_argument("kind", choices=["popular", "monthly", "turnover", "history", "fines"])
+    stats_parser.add_argument("user_id", nargs="?", help="The user whose history to show")
+    stats_parser.add_argument("--since", type=date_arg, help="Start date, YYYY-MM-DD")
+    stats_parser.add_argument("--until", type=date_arg, help="End date (exclusive), YYYY-MM-DD")
+    stats_parser.add_argument("--limit", type=int, default=10)
+
+    overdue_parser = subparsers.add_parser("overdue", help="Print the overdue books, most overdue first")
+    overdue_parser.add_argument("--offset", type=int, default=0)
+    overdue_parser.add_argument("--limit", type=int)
+
+    checkout_parser = subparsers.add_parser("checkout", help="Check out a book to a user")
+    checkout_parser.add_argument("isbn")
+    checkout_parser.add_argument("user_id")
+    checkout_parser.add_argument("--due", type=date_arg, help="Due date, YYYY-MM-DD (default: in 14 days)")
+
+    checkin_parser = subparsers.add_parser("checkin", help="Check in a book")
+    checkin_parser.add_argument("isbn")
+    checkin_parser.add_argument("user_id", nargs="?", help="Needed when several copies are checked out")
+
+    search_parser = subparsers.add_parser("search", help="Search book titles and authors, or user names")
+    search_parser.add_argument("query", nargs="+")
+    search_parser.add_argument("--users", action="store_true", help="Search users instead of books")
+    search_parser.add_argument("--fuzzy", action="store_true", help="Tolerate misspelled words")
+    search_parser.add_argument("--limit", type=int, default=10)
+
+    hold_parser = subparsers.add_parser("hold", help="Place a user in the waitlist for a book")
+    hold_parser.add_argument("isbn")
+    hold_parser.add_argument("user_id")
+    hold_parser.add_argument("--priority", type=int, default=0, help="Higher priorities are served first")
+
+    cancel_hold_parser = subparsers.add_parser("cancel-hold", help="Cancel a user's hold on a book")
+    cancel_hold_parser.add_argument("isbn")
+    cancel_hold_parser.add_argument("user_id")
+
+    holds_parser = subparsers.add_parser("holds", help="Print a book's waitlist in the order it will be served")
+    holds_parser.add_argument("isbn")
+
+    subparsers.add_parser("expire-holds", help="Expire the holds not collected in time")
+
+    fines_parser = subparsers.add_parser("fines", help="Print the fines owed on overdue books")
+    fines_parser.add_argument("--limit", type=int)
+
+    batch_parser = subparsers.add_parser("batch", help="Run commands read one per line from a file or stdin")
+    batch_parser.add_argument("path", nargs="?", default="-", help="The command file (default: stdin)")
+    batch_parser.add_argument("--stop-on-error", action="store_true", help="Stop at the first command that fails")
+    return parser
+
+def parse_args(argv=None):
+    return build_parser().parse_args(argv)
+
+def date_arg(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid date: {value}")
+
+def interactive_page_size():
+    # Pause long listings only when a person is reading them.
+    return PAGE_SIZE if sys.stdin.isatty() and sys.stdout.isatty() else None
+
+class Session:
+    """
+    The managers and journal of one invocation, created on first use so that a
+    command only loads the sections it touches. The commands of a batch share
+    one session, so each section is loaded once for all of them.
+
+    Attributes:
+        storage: The storage the managers read and write.
+        journal_directory (str): The directory of the circulation journal.
+    """
+
+    def __init__(self, storage, journal_directory="library_journal"):
+        self.storage = storage
+        self.journal_directory = journal_directory
+        self._book_manager = None
+        self._user_manager = None
+        self._checkout_manager = None
+        self._reservations = None
+        self._journal = None
+
+    @property
+    def book_manager(self):
+        if self._book_manager is None:
+            from book_manager import BookManager
+            self._book_manager = BookManager(self.storage, reservations=self.reservations)
+        return self._book_manager
+
+    @property
+    def user_manager(self):
+        if self._user_manager is None:
+            from user_manager import UserManager
+            self._user_manager = UserManager(self.storage, reservations=self.reservations)
+        return self._user_manager
+
+    @property
+    def reservations(self):
+        if self._reservations is None:
+            from reservation_manager import ReservationManager
+            self._reservations = ReservationManager(self.storage)
+        return self._reservations
+
+    @property
+    def journal(self):
+        if self._journal is None:
+            from circulation_journal import CirculationJournal
+            self._journal = CirculationJournal(self.journal_directory)
+        return self._journal
+
+    @property
+    def checkout_manager(self):
+        # The managers load nothing up front: checkouts validate ISBNs and user IDs
+        # through the storage's keyed lookups unless the catalog or users are loaded anyway.
+        if self._checkout_manager is None:
+            from checkout_manager import CheckoutManager
+            self._checkout_manager = CheckoutManager(self.storage, book_manager=self.book_manager,
+                                                     user_manager=self.user_manager, journal=self.journal,
+                                                     reservations=self.reservations)
+        return self._checkout_manager
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.close()
+
+def run_list(session, args):
+    if args.kind == "books":
+        session.book_manager.list_books(sort=args.sort, descending=args.desc, offset=args.offset, limit=args.limit)
+    elif args.kind == "users":
+        session.user_manager.list_users(sort=args.sort, descending=args.desc, offset=args.offset,
+                                        limit=args.limit)
+    else:
+        checkout_manager = session.checkout_manager
+        if args.kind == "overdue":
+            checkouts = checkout_manager.iter_overdue(offset=args.offset, limit=args.limit)
+        else:
+            checkouts = checkout_manager.iter_checkouts(sort=args.sort, descending=args.desc,
+                                                        offset=args.offset, limit=args.limit)
+        for checkout in checkouts:
+            print(checkout)
+
+def run_stats(journal, args):
+    from pagination import print_lines
+    if args.kind == "popular":
+        for isbn, checkouts in journal.popular_titles(args.since, args.until, args.limit):
+            print(f"ISBN: {isbn}, Checkouts: {checkouts}")
+    elif args.kind == "monthly":
+        for (month, isbn), checkouts in sorted(journal.loans_per_title(args.since, args.until).items()):
+            print(f"{month} ISBN: {isbn}, Checkouts: {checkouts}")
+    elif args.kind == "turnover":
+        for isbn, entry in sorted(journal.turnover(args.since, args.until).items()):
+            mean = entry["mean_loan_days"]
+            print(f"ISBN: {isbn}, Checkouts: {entry['checkouts']}, Checkins: {entry['checkins']}, "
+                  f"Mean loan: {f'{mean:.1f} days' if mean is not None else '-'}")
+    elif args.kind == "fines":
+        # Fines on the loans checked out since --since, as they stood at --until (default now).
+        from fine_policy import FinePolicy
+        from overdue_analytics import LoanColumns
+        try:
+            report = LoanColumns.from_journal(journal, args.since, args.until).report(FinePolicy(), args.until)
+        except ImportError as e:
+            print(e, file=sys.stderr)
+            return
+        print(f"Loans: {report.loans}, Overdue: {report.overdue}, Total fines: {report.total:.2f}")
+        for bucket, count in report.ageing.items():
+            print(f"Overdue {bucket} days: {count}")
+        for user_id, fine in report.top_users(args.limit):
+            print(f"User ID: {user_id}, Fine: {fine:.2f}")
+    elif args.user_id is None:
+        print("Usage: stats history USER_ID", file=sys.stderr)
+    else:
+        print_lines((str(event) for event in journal.borrowing_history(args.user_id, args.since, args.until)),
+                    "No circulation history for this user.")
+
+def run_import(session, args):
+    from bulk_import import import_books, import_users
+
+    def progress(count):
+        print(f"Processed {count} rows...", file=sys.stderr)
+
+    if args.kind == "books":
+        report = import_books(session.book_manager, args.path, args.format, args.batch_size, progress)
+    else:
+        report = import_users(session.user_manager, args.path, args.format, args.batch_size, progress)
+    print(report)
+    if args.errors:
+        with open(args.errors, "w") as file:
+            for row, message in report.errors:
+                file.write(f"{row if row is not None else '-'}\t{message}\n")
+    else:
+        for row, message in report.errors:
+            print(f"Row {row if row is not None else '-'}: {message}", file=sys.stderr)
+
+def run_checkout(session, args):
+    if session.checkout_manager.checkout_book(args.user_id, args.isbn, args.due):
+        print(f"Checked out: ISBN {args.isbn} to User ID {args.user_id}")
+        return True
+    print(f"Failed to checkout ISBN {args.isbn} to User ID {args.user_id}. No copy may be available, "
+          "or the book or user does not exist.", file=sys.stderr)
+    return False
+
+def run_checkin(session, args):
+    if session.checkout_manager.checkin_book(args.isbn, args.user_id):
+        print(f"Checked in: ISBN {args.isbn}")
+        return True
+    print(f"Failed to checkin ISBN {args.isbn}. It may not have been checked out, or several copies are "
+          "out and the user ID is needed.", file=sys.stderr)
+    return False
+
+def run_hold(session, args):
+    hold = session.checkout_manager.place_hold(args.user_id, args.isbn, args.priority)
+    if hold is None:
+        print(f"Failed to place a hold on ISBN {args.isbn} for User ID {args.user_id}. The book or user may "
+              "not exist, or the user already has the book or a hold on it.", file=sys.stderr)
+        return False
+    print(f"Hold placed: {hold}")
+    return True
+
+def run_search(session, args):
+    query = " ".join(args.query)
+    if args.users:
+        search = session.user_manager.fuzzy_search_users if args.fuzzy else session.user_manager.search_users
+    else:
+        search = session.book_manager.fuzzy_search_books if args.fuzzy else session.book_manager.search_books
+    for record, score in search(query, args.limit):
+        print(f"{score:.2f} {record}")
+
+def run_fines(session, args):
+    fines = session.checkout_manager.calculate_fines()
+    for fine in fines[:args.limit]:
+        print(f"ISBN: {fine['isbn']}, User ID: {fine['user_id']}, "
+              f"Overdue by: {fine['overdue_days']} days, Fine: {fine['fine']:.2f}")
+
+def run_batch(session, args):
+    """
+    Runs the commands in a file, or stdin, one per line, in this process and
+    with the storage's changes written together at the end. Blank lines and
+    lines starting with '#' are skipped. A failed command is reported with its
+    line number and the batch goes on, unless --stop-on-error is given.
+
+    Returns:
+        bool: True if every command succeeded.
+    """
+    parser = build_parser()
+    file = sys.stdin if args.path == "-" else open(args.path, "r")
+    succeeded = True
+    try:
+        with session.storage.batch():
+            for number, line in enumerate(file, 1):
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                try:
+                    command = parser.parse_args(shlex.split(line))
+                except (SystemExit, ValueError):
+                    # argparse has already printed the usage error.
+                    command = None
+                if command is None or command.command in (None, "batch"):
+                    print(f"Line {number}: not a command: {line}", file=sys.stderr)
+                    ok = False
+                else:
+                    ok = run_command(session, command)
+                if not ok:
+                    succeeded = False
+                    if args.stop_on_error:
+                        print(f"Stopped at line {number}.", file=sys.stderr)
+                        break
+    finally:
+        if file is not sys.stdin:
+            file.close()
+    return succeeded
+
+def run_command(session, args):
+    """
+    Runs one non-interactive command.
+
+    Returns:
+        bool: True if the command succeeded.
+    """
+    try:
+        if args.command == "stats":
+            run_stats(session.journal, args)
+        elif args.command == "import":
+            run_import(session, args)
+        elif args.command == "list":
+            run_list(session, args)
+        elif args.command == "overdue":
+            for checkout in session.checkout_manager.iter_overdue(offset=args.offset, limit=args.limit):
+                print(checkout)
+        elif args.command == "checkout":
+            return run_checkout(session, args)
+        elif args.command == "checkin":
+            return run_checkin(session, args)
+        elif args.command == "hold":
+            return run_hold(session, args)
+        elif args.command == "cancel-hold":
+            if not session.checkout_manager.cancel_hold(args.user_id, args.isbn):
+                print(f"No hold on ISBN {args.isbn} for User ID {args.user_id}.", file=sys.stderr)
+                return False
+            print(f"Hold cancelled: ISBN {args.isbn} for User ID {args.user_id}")
+        elif args.command == "holds":
+            for hold in session.checkout_manager.reservations.waitlist(args.isbn):
+                print(hold)
+        elif args.command == "expire-holds":
+            for hold in session.checkout_manager.process_expired_holds():
+                print(f"Expired: {hold}")
+        elif args.command == "search":
+            run_search(session, args)
+        elif args.command == "fines":
+            run_fines(session, args)
+        elif args.command == "batch":
+            return run_batch(session, args)
+    except (ValueError, OSError) as e:
+        print(e, file=sys.stderr)
+        return False
+    return True
+
+def main(argv=None):
+    args = parse_args(argv)
+    from log_config import setup_logging
+    # Initialize logging: written by a background thread, rotated at 10 MB.
+    setup_logging(async_mode=True, max_bytes=10 * 1024 * 1024)
+    exporter = None
+    if args.metrics or args.metrics_file:
+        metrics.enable()
+    if args.metrics_file:
+        exporter = metrics.PrometheusExporter(args.metrics_file)
     # Initialize storage and manager classes
-    storage = Storage("library_data.json")
-    book_manager = BookManager(storage)
-    user_manager = UserManager(storage)
-    checkout_manager = CheckoutManager(storage)
+    from change_feed import VersionedStorage
+    from storage import Storage
+    from unit_of_work import UnitOfWork
+    # Every change is versioned in library_data.json.changes for branch replicas to pull.
+    storage = UnitOfWork(VersionedStorage(Storage("library_data.json")), args.durability)
+    session = Session(storage)
+    try:
+        if args.command is None:
+            run(session)
+            return 0
+        return 0 if run_command(session, args) else 1
+    finally:
+        storage.close()
+        session.close()
+        if exporter is not None:
+            exporter.stop()
+        if args.metrics:
+            print(metrics.REGISTRY.dump(), file=sys.stderr)
+
+def run(session):
+    book_manager = session.book_manager
+    user_manager = session.user_manager
+    checkout_manager = session.checkout_manager
 
     # Main application loop
     while True:
@@ -27,11 +396,12 @@ def main():
         print("2. Manage Users")
         print("3. Checkout or Checkin Books")
         print("4. List Overdue Books")
-        print("5. Exit")
+        print("5. Show Metrics")
+        print("6. Exit")
         choice = input("Please choose an option: ")
 
         if choice == '1':
-            manage_books(book_manager)
+            manage_books(book_manager, checkout_manager)
         elif choice == '2':
             manage_users(user_manager)
         elif choice == '3':
@@ -39,12 +409,22 @@ def main():
         elif choice == '4':
             list_overdue_books(checkout_manager)
         elif choice == '5':
+            if not metrics.REGISTRY.enabled:
+                print("Metrics are off. Start with --metrics or --metrics-file to record them.")
+            print(metrics.REGISTRY.dump())
+            for cache in (book_manager.query_cache, user_manager.query_cache):
+                stats = cache.stats()
+                print(f"Query cache {stats['name']}: {stats['size']}/{stats['max_size']} results, "
+                      f"hits={stats['hits']} misses={stats['misses']} hit ratio={stats['hit_ratio']:.1%} "
+                      f"evictions={stats['evictions']}")
+        elif choice == '6':
             print("Exiting the Library Management System. Goodbye!")
             break
         else:
             print("Invalid choice. Please try again.")
 
-def manage_books(book_manager):
+def manage_books(book_manager, checkout_manager):
+    from book import Book
     # Book management submenu
     while True:
         print("\n--- Book Management ---")
@@ -59,24 +439,31 @@ def manage_books(book_manager):
             title = input("Enter book title: ")
             author = input("Enter author's name: ")
             isbn = input("Enter book ISBN: ")
+            copies = input("Number of copies (press enter for 1): ")
             '''
             isbn = input("Enter book ISBN (format XXX-X-XX-XXXXXX-X): ")
             if not re.match(r'\d{3}-\d-\d{2}-\d{6}-\d', isbn):
                 print("Invalid ISBN format.")
                 continue
             '''
-            book = Book(title, author, isbn)  # Ensure the Book class has an appropriate constructor
+            if not copies.isdigit() or int(copies) < 1:
+                copies = "1"
+            book = Book(title, author, isbn, int(copies))  # Ensure the Book class has an appropriate constructor
             if book_manager.add_book(book):
                 print("Book added successfully.")
             else:
                 print("Failed to add book. It may already exist.")
         elif choice == '2':
-            book_manager.list_books()
+            book_manager.list_books(page_size=interactive_page_size())
         elif choice == '3':
             isbn = input("Enter book ISBN to update: ")
             title = input("New title (press enter to skip): ")
             author = input("New author (press enter to skip): ")
-            if book_manager.update_book(isbn, title, author):
+            copies = input("New number of copies (press enter to skip): ")
+            copies = int(copies) if copies.isdigit() and int(copies) > 0 else None
+            if book_manager.update_book(isbn, title, author, copies):
+                if copies is not None:
+                    checkout_manager.assign_holds(isbn)
                 print("Book updated successfully.")
             else:
                 print("Failed to update book. It may not exist.")
@@ -92,6 +479,7 @@ def manage_books(book_manager):
             print("Invalid choice. Please try again.")
 
 def manage_users(user_manager):
+    from user import User
     # User management submenu
     while True:
         print("\n--- User Management ---")
@@ -111,7 +499,7 @@ def manage_users(user_manager):
             else:
                 print("Failed to add user. They may already exist.")
         elif choice == '2':
-            user_manager.list_users()
+            user_manager.list_users(page_size=interactive_page_size())
         elif choice == '3':
             user_id = input("Enter user ID to update: ")
             name = input("New name (press enter to skip): ")
@@ -136,7 +524,12 @@ def manage_checkouts(checkout_manager):
         print("1. Checkout Book")
         print("2. Checkin Book")
         print("3. List Checked Out Books")
-        print("4. Return to Main Menu")
+        print("4. Book Availability")
+        print("5. Loans for User")
+        print("6. Place Hold")
+        print("7. Cancel Hold")
+        print("8. Holds for Book")
+        print("9. Return to Main Menu")
         choice = input("Select an option: ")
 
         if choice == '1':
@@ -145,24 +538,60 @@ def manage_checkouts(checkout_manager):
             if checkout_manager.checkout_book(user_id, isbn):
                 print("Book checked out successfully.")
             else:
-                print("Failed to checkout book. It may already be checked out or does not exist.")
+                print("Failed to checkout book. No copy may be available, or the book or user does not exist.")
         elif choice == '2':
             isbn = input("Enter book ISBN to checkin: ")
-            if checkout_manager.checkin_book(isbn):
+            user_id = input("Enter user ID (press enter to skip): ")
+            if checkout_manager.checkin_book(isbn, user_id or None):
                 print("Book checked in successfully.")
             else:
                 print("Failed to checkin book. It may not have been checked out or does not exist.")
         elif choice == '3':
-            checkout_manager.list_checked_out_books()
+            checkout_manager.list_checked_out_books(page_size=interactive_page_size())
         elif choice == '4':
+            isbn = input("Enter book ISBN: ")
+            print(f"Available copies: {checkout_manager.available_copies(isbn)} of {checkout_manager.copies(isbn)}")
+        elif choice == '5':
+            user_id = input("Enter user ID: ")
+            loans = checkout_manager.loans_for_user(user_id)
+            if not loans:
+                print("No books checked out by this user.")
+            for checkout in loans:
+                print(checkout)
+        elif choice == '6':
+            isbn = input("Enter book ISBN to place a hold on: ")
+            user_id = input("Enter user ID: ")
+            hold = checkout_manager.place_hold(user_id, isbn)
+            if hold is None:
+                print("Failed to place hold. The book or user may not exist, "
+                      "or the user already has it or a hold on it.")
+            elif hold.ready:
+                print("A copy is available and has been set aside for the user.")
+            else:
+                print(f"Hold placed. Position in waitlist: {checkout_manager.reservations.position(user_id, isbn)}")
+        elif choice == '7':
+            isbn = input("Enter book ISBN: ")
+            user_id = input("Enter user ID: ")
+            if checkout_manager.cancel_hold(user_id, isbn):
+                print("Hold cancelled successfully.")
+            else:
+                print("Failed to cancel hold. The user may not have one on this book.")
+        elif choice == '8':
+            isbn = input("Enter book ISBN: ")
+            holds = checkout_manager.reservations.waitlist(isbn)
+            if not holds:
+                print("No holds on this book.")
+            for hold in holds:
+                print(hold)
+        elif choice == '9':
             break
         else:
             print("Invalid choice. Please try again.")
 
 def list_overdue_books(checkout_manager):
     print("\n--- Overdue Books ---")
-    checkout_manager.list_overdue_books()
+    checkout_manager.list_overdue_books(page_size=interactive_page_size())
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
 
@@ -0,0 +1,275 @@
+# metrics.py
+"""
+Lightweight in-process metrics: counters and latency histograms, with a
+human-readable dump and a Prometheus text exporter.
+
+Collection is off until enable() is called. While disabled, an instrumented
+call costs one flag check on top of the call itself.
+"""
+
+import functools
+import logging
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Tuple
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+BUCKETS = (0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+           0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """
+    Counts observations into fixed buckets.
+
+    Attributes:
+        counts (List[int]): The observations per bucket; the last entry counts those above every bound.
+        total (float): The sum of every observation.
+        count (int): The number of observations.
+        max (float): The largest observation.
+    """
+
+    __slots__ = ("counts", "total", "count", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates a quantile as the upper bound of the bucket it falls in.
+        """
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class Registry:
+    """
+    Holds every counter and histogram, keyed by metric name and labels.
+
+    Attributes:
+        enabled (bool): Whether instrumented code records anything.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+
+    def increment(self, name: str, amount: float = 1, **labels: str):
+        """
+        Adds amount to a counter.
+        """
+        self._increment((name, tuple(sorted(labels.items()))), amount)
+
+    def _increment(self, key: Tuple[str, Labels], amount: float):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels: str):
+        """
+        Records an observation, usually a duration in seconds, in a histogram.
+        """
+        self._observe((name, tuple(sorted(labels.items()))), value)
+
+    def _observe(self, key: Tuple[str, Labels], value: float):
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def reset(self):
+        """
+        Discards every recorded value.
+        """
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Returns the current values as plain data, e.g. for a JSON response.
+        """
+        with self._lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self._counters.items())]
+            histograms = [{"name": name, "labels": dict(labels), "count": h.count, "sum": h.total,
+                           "p50": h.quantile(0.5), "p95": h.quantile(0.95), "p99": h.quantile(0.99), "max": h.max}
+                          for (name, labels), h in sorted(self._histograms.items())]
+        return {"counters": counters, "histograms": histograms}
+
+    def dump(self) -> str:
+        """
+        Formats the current values as a human-readable table.
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for h in snapshot["histograms"]:
+            lines.append(f"{h['name']}{_format_labels(h['labels'])}: count={h['count']} "
+                         f"mean={_ms(h['sum'] / h['count'])} p50={_ms(h['p50'])} p95={_ms(h['p95'])} "
+                         f"p99={_ms(h['p99'])} max={_ms(h['max'])}")
+        for c in snapshot["counters"]:
+            lines.append(f"{c['name']}{_format_labels(c['labels'])}: {c['value']:g}")
+        return "\n".join(lines) if lines else "No metrics recorded."
+
+    def prometheus_text(self) -> str:
+        """
+        Formats the current values in the Prometheus text exposition format.
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, (list(h.counts), h.total, h.count)) for key, h in self._histograms.items())
+        lines = []
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_prometheus_labels(labels)} {value:g}")
+        for (name, labels), (counts, total, count) in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_prometheus_labels(labels + (('le', f'{bound:g}'),))} {cumulative}")
+            lines.append(f"{name}_bucket{_prometheus_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_prometheus_labels(labels)} {total:.9g}")
+            lines.append(f"{name}_count{_prometheus_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.3f}ms"
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    return "{" + ", ".join(f"{k}={v}" for k, v in labels.items()) + "}" if labels else ""
+
+
+def _prometheus_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+REGISTRY = Registry()
+
+
+def enable():
+    """
+    Starts recording metrics.
+    """
+    REGISTRY.enabled = True
+
+
+def disable():
+    """
+    Stops recording metrics. Values recorded so far are kept.
+    """
+    REGISTRY.enabled = False
+
+
+def increment(name: str, amount: float = 1, **labels: str):
+    """
+    Adds amount to a counter if metrics are enabled.
+    """
+    if REGISTRY.enabled:
+        REGISTRY.increment(name, amount, **labels)
+
+
+def timed(name: str, **labels: str) -> Callable[[Callable], Callable]:
+    """
+    Decorates a function so each call's duration is recorded in the histogram
+    name, and each call that raises is counted in name_errors_total.
+    """
+    def decorator(func: Callable) -> Callable:
+        key = (name, tuple(sorted(labels.items())))
+        error_key = (f"{name}_errors_total", key[1])
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not REGISTRY.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except BaseException:
+                REGISTRY._increment(error_key, 1)
+                raise
+            finally:
+                REGISTRY._observe(key, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def write_prometheus(filename: str) -> None:
+    """
+    Atomically writes the current values to a file in the Prometheus text format,
+    e.g. for the node exporter's textfile collector.
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_filename = tempfile.mkstemp(dir=directory, prefix=os.path.basename(filename) + '.')
+    try:
+        with os.fdopen(fd, 'w') as file:
+            file.write(REGISTRY.prometheus_text())
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        os.remove(tmp_filename)
+        raise
+
+
+class PrometheusExporter:
+    """
+    Rewrites a Prometheus text file every interval seconds from a background
+    thread, and once more when stopped.
+
+    Attributes:
+        filename (str): The file to write.
+        interval (float): Seconds between writes.
+    """
+
+    def __init__(self, filename: str, interval: float = 15.0):
+        self.filename = filename
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='metrics-exporter', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                write_prometheus(self.filename)
+            except OSError as e:
+                logging.error("Writing metrics to %s failed: %s", self.filename, e)
+
+    def stop(self) -> None:
+        """
+        Stops the background thread and writes the final values.
+        """
+        self._stop.set()
+        self._thread.join()
+        write_prometheus(self.filename)
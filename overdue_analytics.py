@@ -0,0 +1,241 @@
+# overdue_analytics.py
+"""
+Vectorized overdue and fine analytics over columnar loan data.
+
+Loans are held as NumPy arrays (due and return times as Unix timestamps, and
+ISBNs and user IDs interned as integer codes), so overdue masks, overdue days,
+fines, per-user and per-title totals and ageing buckets over millions of loans
+are computed with a handful of array operations instead of a Python loop.
+
+NumPy is optional for the rest of the system; only this module needs it.
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # analytics are unavailable without NumPy
+    np = None
+
+from checkout import Checkout
+from circulation_journal import CHECKOUT, CirculationJournal
+from fine_policy import SECONDS_PER_DAY, FinePolicy
+
+# Lower bounds, in overdue days, of the ageing buckets: 1-7, 8-30, 31-90 and over 90 days.
+AGEING_BUCKETS = (1, 8, 31, 91)
+
+# The return time of a loan that is still out.
+NOT_RETURNED = np.iinfo(np.int64).max if np is not None else None
+
+
+def available() -> bool:
+    """
+    Returns whether NumPy is installed, i.e. whether the analytics can be used.
+    """
+    return np is not None
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("Overdue analytics need NumPy: pip install numpy")
+
+
+class _Interner:
+    # Assigns consecutive integer codes to strings.
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def __call__(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class LoanColumns:
+    """
+    Loans stored column by column.
+
+    Attributes:
+        due (np.ndarray): The due dates as Unix timestamps (int64).
+        returned (np.ndarray): The return times as Unix timestamps (int64), NOT_RETURNED for loans still out.
+        isbn_codes (np.ndarray): Each loan's ISBN as an index into isbns (int32).
+        user_codes (np.ndarray): Each loan's user ID as an index into user_ids (int32).
+        isbns (List[str]): The distinct ISBNs.
+        user_ids (List[str]): The distinct user IDs.
+    """
+
+    def __init__(self, due, returned, isbn_codes, user_codes, isbns: List[str], user_ids: List[str]):
+        _require_numpy()
+        self.due = due
+        self.returned = returned
+        self.isbn_codes = isbn_codes
+        self.user_codes = user_codes
+        self.isbns = isbns
+        self.user_ids = user_ids
+
+    def __len__(self) -> int:
+        return len(self.due)
+
+    @classmethod
+    def from_loans(cls, loans: Iterable[Tuple[str, str, int, Optional[int]]]) -> 'LoanColumns':
+        """
+        Builds the columns from (isbn, user_id, due, returned) tuples, where
+        returned is None for loans still out.
+        """
+        _require_numpy()
+        isbns, users = _Interner(), _Interner()
+        due, returned, isbn_codes, user_codes = [], [], [], []
+        for isbn, user_id, due_timestamp, returned_timestamp in loans:
+            isbn_codes.append(isbns(isbn))
+            user_codes.append(users(user_id))
+            due.append(due_timestamp)
+            returned.append(NOT_RETURNED if returned_timestamp is None else returned_timestamp)
+        return cls(np.array(due, dtype=np.int64), np.array(returned, dtype=np.int64),
+                   np.array(isbn_codes, dtype=np.int32), np.array(user_codes, dtype=np.int32),
+                   isbns.values, users.values)
+
+    @classmethod
+    def from_checkouts(cls, checkouts: Iterable[Checkout]) -> 'LoanColumns':
+        """
+        Builds the columns from the current checkouts.
+        """
+        return cls.from_loans((checkout.isbn, checkout.user_id, checkout.due, None) for checkout in checkouts)
+
+    @classmethod
+    def from_journal(cls, journal: CirculationJournal, start: Optional[datetime] = None,
+                     end: Optional[datetime] = None) -> 'LoanColumns':
+        """
+        Builds the columns from the loans in a circulation journal: every loan
+        checked out in the range, with its return time if it was returned before end.
+        """
+        start_timestamp = start.timestamp() if start is not None else None
+        open_loans: Dict[Tuple[str, str], int] = {}
+        loans: List[List] = []
+        for event in journal.events(None, end):
+            key = (event.isbn, event.user_id)
+            if event.kind == CHECKOUT:
+                if start_timestamp is None or event.time >= start_timestamp:
+                    open_loans[key] = len(loans)
+                    loans.append([event.isbn, event.user_id, event.due, None])
+                else:
+                    open_loans.pop(key, None)
+            else:
+                position = open_loans.pop(key, None)
+                if position is not None:
+                    loans[position][3] = event.time
+        return cls.from_loans(loans)
+
+    def _end(self, now: float, positions=slice(None)):
+        # When each loan stopped accruing fines: its return, or now if it is still out.
+        return np.minimum(self.returned[positions], int(now))
+
+    def overdue_mask(self, now: float):
+        """
+        Returns a boolean array marking the loans that were past due at now,
+        or when they were returned.
+        """
+        return self.due < self._end(now)
+
+    def overdue_days(self, now: float, positions=slice(None)):
+        """
+        Returns each loan's number of full overdue days at now, or when it was
+        returned; never negative. Only the loans at positions (a slice or a
+        sequence of indexes) are computed when given.
+        """
+        return np.maximum((self._end(now, positions) - self.due[positions]) // SECONDS_PER_DAY, 0)
+
+    def fines(self, policy: FinePolicy, now: float, positions=slice(None)):
+        """
+        Returns each loan's fine under policy at now, or only those of the loans at positions.
+        """
+        amounts = np.maximum(self.overdue_days(now, positions) - policy.grace_days, 0) * float(policy.per_day)
+        if policy.max_fine is not None:
+            amounts = np.minimum(amounts, policy.max_fine)
+        return amounts
+
+    def report(self, policy: FinePolicy, now: Optional[datetime] = None,
+               buckets: Sequence[int] = AGEING_BUCKETS) -> 'FineReport':
+        """
+        Computes the fine and ageing totals of every loan in a few array passes.
+
+        Parameters:
+            policy (FinePolicy): How fines accrue.
+            now (Optional[datetime]): The time to report at. Defaults to the current time.
+            buckets (Sequence[int]): The ascending lower bounds, in overdue days, of the ageing buckets.
+
+        Returns:
+            FineReport: The totals.
+        """
+        now = now or datetime.now()
+        days = self.overdue_days(now.timestamp())
+        amounts = self.fines(policy, now.timestamp())
+        overdue = days > 0
+        by_user = np.bincount(self.user_codes, weights=amounts, minlength=len(self.user_ids))
+        by_isbn = np.bincount(self.isbn_codes, weights=amounts, minlength=len(self.isbns))
+        # Position i + 1 counts the loans in bucket i; position 0 those not overdue by a full day.
+        ageing = np.bincount(np.searchsorted(np.asarray(buckets), days, side='right'), minlength=len(buckets) + 1)
+        return FineReport(
+            now=now,
+            loans=len(self),
+            overdue=int(np.count_nonzero(overdue)),
+            total=float(amounts.sum()),
+            by_user={self.user_ids[code]: float(by_user[code]) for code in np.flatnonzero(by_user)},
+            by_isbn={self.isbns[code]: float(by_isbn[code]) for code in np.flatnonzero(by_isbn)},
+            ageing={_bucket_label(buckets, i): int(ageing[i + 1]) for i in range(len(buckets))},
+        )
+
+
+def _bucket_label(buckets: Sequence[int], i: int) -> str:
+    if i + 1 < len(buckets):
+        return f"{buckets[i]}-{buckets[i + 1] - 1}"
+    return f"{buckets[i]}+"
+
+
+class FineReport:
+    """
+    The fine and ageing totals of a set of loans at a point in time.
+
+    Attributes:
+        now (datetime): The time the report was computed at.
+        loans (int): The number of loans considered.
+        overdue (int): The number of loans overdue by at least a day.
+        total (float): The sum of all fines.
+        by_user (Dict[str, float]): User ID -> the user's total fine, for users who owe one.
+        by_isbn (Dict[str, float]): ISBN -> the total fine on the title, for titles that have one.
+        ageing (Dict[str, int]): Overdue-days bucket (e.g. '8-30') -> the number of loans in it.
+    """
+
+    def __init__(self, now: datetime, loans: int, overdue: int, total: float, by_user: Dict[str, float],
+                 by_isbn: Dict[str, float], ageing: Dict[str, int]):
+        self.now = now
+        self.loans = loans
+        self.overdue = overdue
+        self.total = total
+        self.by_user = by_user
+        self.by_isbn = by_isbn
+        self.ageing = ageing
+
+    def top_users(self, limit: int = 10) -> List[Tuple[str, float]]:
+        """
+        Returns the users owing the most, as (user ID, fine) pairs.
+        """
+        return sorted(self.by_user.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+    def to_dict(self, limit: int = 10) -> Dict:
+        """
+        Converts the report to a dictionary, keeping the limit largest per-user fines.
+        """
+        return {
+            "now": self.now.isoformat(timespec='seconds'),
+            "loans": self.loans,
+            "overdue": self.overdue,
+            "total": self.total,
+            "ageing": self.ageing,
+            "top_users": [{"user_id": user_id, "fine": fine} for user_id, fine in self.top_users(limit)],
+        }
+
@@ -0,0 +1,183 @@
+# pagination.py
+
+import base64
+import heapq
+import json
+from itertools import islice
+from operator import attrgetter
+from typing import Any, Callable, Dict, Generic, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar('T')
+
+
+class Page(Generic[T]):
+    """
+    One page of a listing.
+
+    Attributes:
+        items (List[T]): The records on the page.
+        next_cursor (Optional[str]): The cursor of the following page, or None if this is the last page.
+    """
+
+    def __init__(self, items: List[T], next_cursor: Optional[str]):
+        self.items = items
+        self.next_cursor = next_cursor
+
+
+def sort_field(sort: Callable[[Any], Any]) -> str:
+    """
+    Names the ordering a sort function gives, so a cursor can only be used with
+    the ordering it was issued for.
+    """
+    if isinstance(sort, attrgetter):
+        return repr(sort)
+    return f"{getattr(sort, '__module__', '')}.{getattr(sort, '__qualname__', repr(sort))}"
+
+
+def encode_cursor(position: Tuple[Any, str], field: str) -> str:
+    """
+    Encodes a (sort value, key) position in the ordering named field as an
+    opaque, URL-safe cursor.
+    """
+    return base64.urlsafe_b64encode(json.dumps([field, *position]).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str, field: str) -> Tuple[Any, str]:
+    """
+    Decodes a cursor made by encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed or was issued for another ordering than field.
+    """
+    try:
+        cursor_field, sort_value, key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (TypeError, ValueError) as e:
+        raise ValueError("invalid cursor") from e
+    if cursor_field != field or not isinstance(key, str):
+        raise ValueError("invalid cursor")
+    return sort_value, key
+
+
+def _after(records: Iterable[T], position: Callable[[T], Tuple[Any, str]], start: Tuple[Any, str],
+           descending: bool) -> Iterator[T]:
+    # The records positioned after start; a forged cursor whose sort value cannot be
+    # compared with the records' is rejected rather than failing with a TypeError.
+    try:
+        for record in records:
+            if (position(record) < start) if descending else (position(record) > start):
+                yield record
+    except TypeError as e:
+        raise ValueError("invalid cursor") from e
+
+
+def stream(records: Iterable[T], key: Callable[[T], str], where: Optional[Callable[[T], bool]] = None,
+           sort: Optional[Callable[[T], Any]] = None, descending: bool = False, offset: int = 0,
+           limit: Optional[int] = None, after: Optional[str] = None) -> Iterator[T]:
+    """
+    Lazily filters, orders and slices records.
+
+    Unsorted listings without a cursor are streamed in storage order in constant
+    memory. Sorted listings hold at most offset + limit records (a bounded heap),
+    or every matching record when no limit is given. Records are ordered by
+    (sort value, key) so that ties break deterministically and cursors are stable.
+
+    Parameters:
+        records (Iterable[T]): The records to list.
+        key (Callable[[T], str]): Returns a record's unique key.
+        where (Optional[Callable[[T], bool]]): Keeps only the records it returns True for.
+        sort (Optional[Callable[[T], Any]]): Returns the value to order records by.
+            Cursor pagination without a sort orders by key.
+        descending (bool): Whether to list the largest sort values first.
+        offset (int): The number of leading records to skip.
+        limit (Optional[int]): The maximum number of records to yield, or None for all.
+        after (Optional[str]): A cursor; only records positioned after it are listed.
+            It must have been issued for the same sort.
+
+    Raises:
+        ValueError: If the cursor is invalid or was issued for another sort.
+
+    Yields:
+        T: The matching records, in order.
+    """
+    if where is not None:
+        records = filter(where, records)
+    if sort is None and after is None:
+        yield from islice(records, offset, None if limit is None else offset + limit)
+        return
+
+    sort = sort or key
+    position = lambda record: (sort(record), key(record))
+    if after is not None:
+        records = _after(records, position, decode_cursor(after, sort_field(sort)), descending)
+    if limit is None:
+        ordered = sorted(records, key=position, reverse=descending)
+    else:
+        select = heapq.nlargest if descending else heapq.nsmallest
+        ordered = select(offset + limit, records, key=position)
+    yield from islice(ordered, offset, None)
+
+
+def page(records: Iterable[T], key: Callable[[T], str], limit: int, where: Optional[Callable[[T], bool]] = None,
+         sort: Optional[Callable[[T], Any]] = None, descending: bool = False,
+         after: Optional[str] = None) -> Page[T]:
+    """
+    Fetches one page of records using cursor pagination. Pass the returned
+    next_cursor as after to fetch the following page.
+
+    Parameters are as for stream().
+
+    Returns:
+        Page[T]: The page of records and the cursor of the next one.
+    """
+    sort = sort or key
+    items = list(stream(records, key, where, sort, descending, 0, limit + 1, after))
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor((sort(items[-1]), key(items[-1])), sort_field(sort))
+    return Page(items, next_cursor)
+
+
+def print_lines(lines: Iterable[str], empty_message: str, page_size: Optional[int] = None,
+                prompt: Callable[[str], str] = input) -> int:
+    """
+    Prints lines as they are produced, pausing after every page_size lines until
+    the user presses enter (or stops the listing with 'q').
+
+    Parameters:
+        lines (Iterable[str]): The lines to print, typically a generator.
+        empty_message (str): Printed when there are no lines.
+        page_size (Optional[int]): The number of lines between pauses, or None to never pause.
+        prompt (Callable[[str], str]): Reads the user's answer at each pause.
+
+    Returns:
+        int: The number of lines printed.
+    """
+    count = 0
+    for line in lines:
+        if page_size and count and count % page_size == 0:
+            if prompt("-- more (enter to continue, q to stop) -- ").strip().lower() == 'q':
+                return count
+        print(line)
+        count += 1
+    if not count:
+        print(empty_message)
+    return count
+
+
+def sort_key(sort: Optional[str], fields: Dict[str, str]) -> Optional[Callable[[Any], Any]]:
+    """
+    Resolves a sort field name to a key function.
+
+    Parameters:
+        sort (Optional[str]): The field to sort by, or None for no sorting.
+        fields (Dict[str, str]): The sortable field names, mapped to the record attributes holding them.
+
+    Raises:
+        ValueError: If the field is not sortable.
+    """
+    if sort is None:
+        return None
+    if sort not in fields:
+        raise ValueError(f"Cannot sort by {sort}; expected one of: {', '.join(fields)}")
+    return attrgetter(fields[sort])
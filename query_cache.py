@@ -0,0 +1,97 @@
+# query_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from metrics import increment
+
+
+class QueryCache:
+    """
+    A bounded, thread-safe LRU cache of query results with an optional time to
+    live. The managers put one in front of their search methods and call
+    invalidate() whenever their records change, so a cached result is never
+    stale: each invalidation starts a new generation and drops every result
+    computed in an earlier one.
+
+    Attributes:
+        name (str): The name the cache's hits and misses are counted under in the metrics.
+        max_size (int): The number of results kept; the least recently used is evicted beyond it.
+        ttl (Optional[float]): Seconds a result stays valid, or None to keep it until invalidated.
+        generation (int): Incremented by every invalidation.
+    """
+
+    def __init__(self, name: str, max_size: int = 1024, ttl: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.generation = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (expiry time or None, result), least recently used first.
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Returns the cached result for a query, computing and caching it on a miss.
+
+        Parameters:
+            key (Hashable): The normalized query, e.g. ('author', 'rowling').
+            compute (Callable[[], Any]): Computes the result. It must not change the records.
+
+        Returns:
+            Any: The result. It is shared with later hits and must not be modified.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, result = entry
+                if expires is None or self._clock() < expires:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    increment("library_query_cache_total", cache=self.name, result="hit")
+                    return result
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            generation = self.generation
+        increment("library_query_cache_total", cache=self.name, result="miss")
+        result = compute()
+        with self._lock:
+            # Drop a result computed while the records changed.
+            if generation == self.generation and self.max_size > 0:
+                self._entries[key] = (None if self.ttl is None else self._clock() + self.ttl, result)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return result
+
+    def invalidate(self) -> None:
+        """
+        Drops every cached result. Called whenever the records the queries read change.
+        """
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the cache's size, generation, hits, misses, hit ratio, evictions and expirations.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"name": self.name, "size": len(self._entries), "max_size": self.max_size,
+                    "generation": self.generation, "hits": self.hits, "misses": self.misses,
+                    "hit_ratio": self.hits / lookups if lookups else 0.0,
+                    "evictions": self.evictions, "expirations": self.expirations}
@@ -0,0 +1,314 @@
+# reservation_manager.py
+import heapq
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from storage import StorageBackend
+from hold import Hold
+from metrics import timed
+import logging
+
+# How long a copy set aside for a hold waits on the hold shelf, by default.
+DEFAULT_PICKUP_DAYS = 3
+
+
+class ReservationManager:
+    """
+    Manages the per-ISBN waitlists of holds placed on books that are out.
+
+    Each ISBN's waiting holds are kept in a heap ordered by descending priority
+    and then by the order they were placed, so the next hold to serve is found
+    in O(log n) however long the waitlist. Ready holds are kept in a heap by
+    pickup deadline, so expiring them only touches the holds that are due.
+    Cancelled and served holds are dropped from the heaps lazily, when they
+    reach the top.
+
+    The manager only keeps the waitlists; CheckoutManager decides when a copy
+    is free to be set aside (see CheckoutManager.place_hold and checkin_book).
+
+    Attributes:
+        storage (StorageBackend): Storage handler for data persistence.
+        holds (Dict[str, Hold]): The holds, indexed by hold key ('isbn:user_id').
+        pickup_days (int): The number of days a ready hold waits to be collected.
+        on_release (Optional[Callable[[str], None]]): Called with the ISBN of a copy set aside
+            for a hold that remove_user_holds removed, so it can go to the next hold.
+            CheckoutManager sets it to its assign_holds.
+    """
+
+    def __init__(self, storage: StorageBackend, pickup_days: int = DEFAULT_PICKUP_DAYS):
+        self.storage = storage
+        self.pickup_days = pickup_days
+        self.on_release: Optional[Callable[[str], None]] = None
+        # The holds and their heaps are loaded on first access.
+        self._holds: Optional[Dict[str, Hold]] = None
+
+    @property
+    def holds(self) -> Dict[str, Hold]:
+        if self._holds is None:
+            holds = self.load_holds()
+            # ISBN -> heap of (-priority, seq, user_id) for the waiting holds.
+            self._waitlists: Dict[str, List[Tuple[int, int, str]]] = {}
+            # ISBN -> the number of waiting holds, to tell when a heap is mostly stale.
+            self._waiting: Dict[str, int] = {}
+            # ISBN -> the users whose copy is on the hold shelf.
+            self._ready: Dict[str, Set[str]] = {}
+            # (pickup deadline, seq, hold key) for the ready holds.
+            self._expiry: List[Tuple[int, int, str]] = []
+            for hold in holds.values():
+                if hold.ready:
+                    self._ready.setdefault(hold.isbn, set()).add(hold.user_id)
+                    self._expiry.append((hold.ready_until, hold.seq, hold.key))
+                else:
+                    self._waitlists.setdefault(hold.isbn, []).append((-hold.priority, hold.seq, hold.user_id))
+                    self._waiting[hold.isbn] = self._waiting.get(hold.isbn, 0) + 1
+            for waitlist in self._waitlists.values():
+                heapq.heapify(waitlist)
+            heapq.heapify(self._expiry)
+            self._next_seq = max((hold.seq for hold in holds.values()), default=0) + 1
+            self._holds = holds
+        return self._holds
+
+    @timed("library_manager_seconds", manager="holds", operation="load_holds")
+    def load_holds(self) -> Dict[str, Hold]:
+        """
+        Loads the holds from storage, indexed by hold key.
+        """
+        holds = (Hold.from_dict(data) for data in self.storage.read().get("holds", []))
+        return {hold.key: hold for hold in holds}
+
+    def find_hold(self, isbn: str, user_id: str) -> Optional[Hold]:
+        """
+        Returns a user's hold on a book, if they have one.
+        """
+        return self.holds.get(f"{isbn}:{user_id}")
+
+    @timed("library_manager_seconds", manager="holds", operation="place_hold")
+    def place_hold(self, isbn: str, user_id: str, priority: int = 0, now: Optional[datetime] = None) -> Optional[Hold]:
+        """
+        Adds a user to the end of a book's waitlist, behind the holds of equal or higher priority.
+
+        Parameters:
+            isbn (str): The ISBN of the book.
+            user_id (str): The ID of the user placing the hold.
+            priority (int): Holds with a higher priority are served first; 0 by default.
+            now (Optional[datetime]): When the hold is placed. Defaults to the current time.
+
+        Returns:
+            Optional[Hold]: The new hold, or None if the user already has a hold on the book.
+        """
+        if f"{isbn}:{user_id}" in self.holds:
+            logging.warning("Duplicate hold: ISBN %s by User ID %s", isbn, user_id)
+            return None
+        hold = Hold(isbn, user_id, int((now or datetime.now()).timestamp()), priority, self._next_seq)
+        self._next_seq += 1
+        self.holds[hold.key] = hold
+        heapq.heappush(self._waitlists.setdefault(isbn, []), (-priority, hold.seq, user_id))
+        self._waiting[isbn] = self._waiting.get(isbn, 0) + 1
+        self.storage.put_record("holds", hold.key, hold.to_dict())
+        logging.info("Hold placed: ISBN %s by User ID %s", isbn, user_id)
+        return hold
+
+    def _remove(self, hold: Hold):
+        del self.holds[hold.key]
+        if hold.ready:
+            ready = self._ready[hold.isbn]
+            ready.discard(hold.user_id)
+            if not ready:
+                del self._ready[hold.isbn]
+        else:
+            self._waiting[hold.isbn] -= 1
+            waitlist = self._waitlists[hold.isbn]
+            if not self._waiting[hold.isbn]:
+                del self._waiting[hold.isbn]
+                del self._waitlists[hold.isbn]
+            elif len(waitlist) > 2 * self._waiting[hold.isbn] + 16:
+                # Mostly holds that are gone: rebuild the heap from the live ones.
+                waitlist[:] = [entry for entry in waitlist if self._is_waiting(hold.isbn, entry)]
+                heapq.heapify(waitlist)
+        self.storage.delete_record("holds", hold.key)
+
+    def _is_waiting(self, isbn: str, entry: Tuple[int, int, str]) -> bool:
+        # Whether a waitlist entry is still a waiting hold, rather than one cancelled, served or re-placed.
+        hold = self._holds.get(f"{isbn}:{entry[2]}")
+        return hold is not None and hold.seq == entry[1] and not hold.ready
+
+    @timed("library_manager_seconds", manager="holds", operation="cancel_hold")
+    def cancel_hold(self, isbn: str, user_id: str) -> Optional[Hold]:
+        """
+        Removes a user's hold on a book.
+
+        Returns:
+            Optional[Hold]: The cancelled hold, or None if the user had none. If it was
+            ready, its copy is free for the next hold.
+        """
+        hold = self.find_hold(isbn, user_id)
+        if hold is None:
+            logging.warning("Hold not found for cancellation: ISBN %s by User ID %s", isbn, user_id)
+            return None
+        self._remove(hold)
+        logging.info("Hold cancelled: ISBN %s by User ID %s", isbn, user_id)
+        return hold
+
+    def fulfill(self, isbn: str, user_id: str) -> Optional[Hold]:
+        """
+        Removes a user's hold on a book once they have checked it out.
+
+        Returns:
+            Optional[Hold]: The fulfilled hold, or None if the user had none.
+        """
+        hold = self.find_hold(isbn, user_id)
+        if hold is not None:
+            self._remove(hold)
+            logging.info("Hold fulfilled: ISBN %s by User ID %s", isbn, user_id)
+        return hold
+
+    def remove_book_holds(self, isbn: str) -> List[Hold]:
+        """
+        Removes every hold on a book, when the book is deleted.
+
+        Returns:
+            List[Hold]: The removed holds.
+        """
+        self.holds  # loads the hold indexes on first use
+        removed = [self._holds[f"{isbn}:{user_id}"] for user_id in self._ready.get(isbn, ())]
+        removed += [self._holds[f"{isbn}:{entry[2]}"] for entry in self._waitlists.get(isbn, ())
+                    if self._is_waiting(isbn, entry)]
+        with self.storage.transaction():
+            for hold in removed:
+                self._remove(hold)
+        if removed:
+            logging.info("Holds removed with their book: ISBN %s (%d)", isbn, len(removed))
+        return removed
+
+    def remove_user_holds(self, user_id: str) -> List[Hold]:
+        """
+        Removes every hold a user has placed, when the user is deleted. The copies
+        set aside for them are passed to on_release.
+
+        Returns:
+            List[Hold]: The removed holds.
+        """
+        removed = self.holds_for_user(user_id)
+        with self.storage.transaction():
+            for hold in removed:
+                self._remove(hold)
+        if removed:
+            logging.info("Holds removed with their user: User ID %s (%d)", user_id, len(removed))
+        if self.on_release is not None:
+            for hold in removed:
+                if hold.ready:
+                    self.on_release(hold.isbn)
+        return removed
+
+    @timed("library_manager_seconds", manager="holds", operation="assign")
+    def assign(self, isbn: str, now: Optional[datetime] = None) -> Optional[Hold]:
+        """
+        Sets a copy of a book aside for the next hold in its waitlist, which then
+        has pickup_days to collect it.
+
+        Parameters:
+            isbn (str): The ISBN of the copy that became free.
+            now (Optional[datetime]): The time of the assignment. Defaults to the current time.
+
+        Returns:
+            Optional[Hold]: The hold that is now ready, or None if nobody is waiting.
+        """
+        self.holds  # loads the waitlists on first use
+        waitlist = self._waitlists.get(isbn)
+        while waitlist:
+            entry = heapq.heappop(waitlist)
+            if self._is_waiting(isbn, entry):
+                break
+        else:
+            return None
+        hold = self._holds[f"{isbn}:{entry[2]}"]
+        self._waiting[isbn] -= 1
+        if not self._waiting[isbn]:
+            del self._waiting[isbn]
+            del self._waitlists[isbn]
+        hold.ready_until = int(((now or datetime.now()) + timedelta(days=self.pickup_days)).timestamp())
+        self._ready.setdefault(isbn, set()).add(hold.user_id)
+        heapq.heappush(self._expiry, (hold.ready_until, hold.seq, hold.key))
+        self.storage.put_record("holds", hold.key, hold.to_dict())
+        logging.info("Hold ready: ISBN %s for User ID %s", isbn, hold.user_id)
+        return hold
+
+    @timed("library_manager_seconds", manager="holds", operation="expire")
+    def expire(self, now: Optional[datetime] = None) -> List[Hold]:
+        """
+        Removes the ready holds whose pickup deadline has passed, soonest first.
+
+        Parameters:
+            now (Optional[datetime]): The time to expire holds at. Defaults to the current time.
+
+        Returns:
+            List[Hold]: The expired holds; each one's copy is free for the next hold.
+        """
+        self.holds  # loads the expiry heap on first use
+        timestamp = (now or datetime.now()).timestamp()
+        expired = []
+        while self._expiry and self._expiry[0][0] <= timestamp:
+            ready_until, seq, key = heapq.heappop(self._expiry)
+            hold = self._holds.get(key)
+            if hold is None or hold.seq != seq or hold.ready_until != ready_until:
+                continue  # collected or cancelled
+            self._remove(hold)
+            expired.append(hold)
+            logging.info("Hold expired: ISBN %s for User ID %s", hold.isbn, hold.user_id)
+        return expired
+
+    def next_expiry(self) -> Optional[datetime]:
+        """
+        Returns the earliest pickup deadline of a ready hold, or None if there are
+        none, so a scheduler knows when to call expire() next.
+        """
+        self.holds  # loads the expiry heap on first use
+        while self._expiry:
+            ready_until, seq, key = self._expiry[0]
+            hold = self._holds.get(key)
+            if hold is not None and hold.seq == seq and hold.ready_until == ready_until:
+                return datetime.fromtimestamp(ready_until)
+            heapq.heappop(self._expiry)
+        return None
+
+    def ready_count(self, isbn: str) -> int:
+        """
+        Returns the number of copies of a book set aside on the hold shelf.
+        """
+        self.holds  # loads the hold indexes on first use
+        return len(self._ready.get(isbn, ()))
+
+    def waiting_count(self, isbn: str) -> int:
+        """
+        Returns the number of holds waiting for a copy of a book.
+        """
+        self.holds  # loads the hold indexes on first use
+        return self._waiting.get(isbn, 0)
+
+    def position(self, user_id: str, isbn: str) -> Optional[int]:
+        """
+        Returns a user's place among the holds waiting for a book, 1 for the next
+        to be served, or None if the user has no waiting hold on it.
+        """
+        hold = self.find_hold(isbn, user_id)
+        if hold is None or hold.ready:
+            return None
+        entry = (-hold.priority, hold.seq, user_id)
+        ahead = sum(1 for other in self._waitlists[isbn] if other < entry and self._is_waiting(isbn, other))
+        return ahead + 1
+
+    def waitlist(self, isbn: str) -> List[Hold]:
+        """
+        Returns a book's holds in the order they will be served: the ready holds,
+        then the waiting holds.
+        """
+        self.holds  # loads the hold indexes on first use
+        ready = sorted((self._holds[f"{isbn}:{user_id}"] for user_id in self._ready.get(isbn, ())),
+                       key=lambda hold: hold.ready_until)
+        waiting = sorted(entry for entry in self._waitlists.get(isbn, ()) if self._is_waiting(isbn, entry))
+        return ready + [self._holds[f"{isbn}:{entry[2]}"] for entry in waiting]
+
+    def holds_for_user(self, user_id: str) -> List[Hold]:
+        """
+        Returns the holds a user has placed, in the order they were placed.
+        """
+        return sorted((hold for hold in self.holds.values() if hold.user_id == user_id), key=lambda hold: hold.seq)
@@ -0,0 +1,383 @@
+# search_index.py
+
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from query_cache import QueryCache
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits a text into case-folded word tokens.
+    """
+    return TOKEN_PATTERN.findall(text.casefold())
+
+
+class InvertedIndex:
+    """
+    A case-folded inverted index over one text field of a set of records,
+    answering substring queries without scanning every record.
+
+    Each text is indexed by its character n-grams. A query of at least
+    gram_size characters is answered by intersecting the posting sets of its
+    n-grams and verifying the few remaining candidates; shorter queries are
+    answered from the n-grams that contain them. Texts shorter than gram_size
+    are indexed as a single gram so they remain reachable.
+
+    Attributes:
+        gram_size (int): The length of the character n-grams.
+    """
+
+    def __init__(self, gram_size: int = 3):
+        self.gram_size = gram_size
+        self._texts: Dict[str, str] = {}
+        self._order: Dict[str, int] = {}
+        self._next_order = 0
+        self._grams: Dict[str, Set[str]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def _grams_of(self, text: str) -> Set[str]:
+        n = self.gram_size
+        if len(text) < n:
+            return {text} if text else set()
+        return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+    def add(self, key: str, text: str) -> None:
+        """
+        Indexes the text of a record, replacing any text previously indexed for the key.
+
+        Parameters:
+            key (str): The key of the record, e.g. its ISBN.
+            text (str): The text to index.
+        """
+        if key in self._texts:
+            self._unindex(key)
+        else:
+            self._order[key] = self._next_order
+            self._next_order += 1
+        folded = text.casefold()
+        self._texts[key] = folded
+        for gram in self._grams_of(folded):
+            self._grams[gram].add(key)
+
+    update = add
+
+    def remove(self, key: str) -> None:
+        """
+        Removes a record from the index, if present.
+
+        Parameters:
+            key (str): The key of the record.
+        """
+        if key in self._texts:
+            self._unindex(key)
+            del self._texts[key]
+            del self._order[key]
+
+    def _unindex(self, key: str):
+        for gram in self._grams_of(self._texts[key]):
+            postings = self._grams[gram]
+            postings.discard(key)
+            if not postings:
+                del self._grams[gram]
+
+    def _candidates(self, folded: str) -> Set[str]:
+        """
+        Returns the keys whose text contains the case-folded query.
+        """
+        if not folded:
+            return set(self._texts)
+        if len(folded) < self.gram_size:
+            matches = set()
+            for gram, postings in self._grams.items():
+                if folded in gram:
+                    matches |= postings
+            return matches
+        postings = sorted((self._grams.get(gram, set()) for gram in self._grams_of(folded)), key=len)
+        if not postings[0]:
+            return set()
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+            if not candidates:
+                return candidates
+        texts = self._texts
+        return {key for key in candidates if folded in texts[key]}
+
+    def find(self, query: str) -> List[str]:
+        """
+        Finds the records whose text contains the query, ignoring case.
+
+        Parameters:
+            query (str): The substring to search for.
+
+        Returns:
+            List[str]: The keys of the matching records, in the order they were first indexed.
+        """
+        return sorted(self._candidates(query.casefold()), key=self._order.__getitem__)
+
+    def token_score(self, key: str, token: str) -> float:
+        """
+        Scores how well the text of a record matches a single case-folded token.
+        Whole-word matches rank above word-prefix matches, which rank above
+        plain substring matches.
+
+        Parameters:
+            key (str): The key of the record.
+            token (str): The case-folded token to score.
+
+        Returns:
+            float: The score, or 0.0 if the text does not contain the token.
+        """
+        text = self._texts.get(key)
+        if text is None or token not in text:
+            return 0.0
+        words = tokenize(text)
+        if token in words:
+            score = 3.0
+        elif any(word.startswith(token) for word in words):
+            score = 2.0
+        else:
+            score = 1.0
+        # Shorter texts are more specific matches for the same token.
+        return score + 1.0 / (1 + len(words))
+
+    def search(self, query: str, limit: Optional[int] = None, offset: int = 0) -> List[Tuple[str, float]]:
+        """
+        Finds the records containing every token of the query, best matches first.
+
+        Parameters:
+            query (str): The words or word fragments to search for.
+            limit (Optional[int]): The maximum number of results to return, or None for all.
+            offset (int): The number of leading results to skip, for pagination.
+
+        Returns:
+            List[Tuple[str, float]]: (key, score) pairs ordered by descending score.
+        """
+        return search_fields([self], query, limit, offset)
+
+
+def search_fields(indexes: List[InvertedIndex], query: str, limit: Optional[int] = None,
+                  offset: int = 0) -> List[Tuple[str, float]]:
+    """
+    Ranked search over several indexed fields of the same records. Every token
+    of the query must occur in at least one of the fields; a record's score is
+    the sum, over the tokens, of the token's best score in any field.
+
+    Parameters:
+        indexes (List[InvertedIndex]): The indexes of the fields to search.
+        query (str): The words or word fragments to search for.
+        limit (Optional[int]): The maximum number of results to return, or None for all.
+        offset (int): The number of leading results to skip, for pagination.
+
+    Returns:
+        List[Tuple[str, float]]: (key, score) pairs ordered by descending score,
+        ties broken by the order in which records were first indexed.
+    """
+    tokens = tokenize(query)
+    if not tokens or not indexes:
+        return []
+    candidates = None
+    for token in sorted(set(tokens), key=len, reverse=True):
+        matches = set()
+        for index in indexes:
+            matches |= index._candidates(token)
+        candidates = matches if candidates is None else candidates & matches
+        if not candidates:
+            return []
+    scored = [(key, sum(max(index.token_score(key, token) for index in indexes) for token in tokens))
+              for key in candidates]
+    order = indexes[0]._order
+    scored.sort(key=lambda item: (-item[1], order.get(item[0], 0)))
+    end = None if limit is None else offset + limit
+    return scored[offset:end]
+
+
+class FuzzyIndex:
+    """
+    A typo-tolerant index over the words of one or more text fields of a set
+    of records.
+
+    Every distinct word is indexed by its padded character trigrams, and each
+    word keeps the set of records containing it. A query word is matched
+    against the vocabulary by trigram similarity (shared trigrams over all
+    trigrams of the two words, as in PostgreSQL's pg_trgm), so 'rowlng' still
+    finds 'rowling'. The vocabulary is far smaller than the records, and only
+    the words that can reach the threshold are scored: those whose trigram
+    count is close enough to the query word's, holding one of its rarer
+    trigrams. The similar words of recent query words are kept in a bounded
+    LRU cache, cleared whenever the vocabulary changes.
+
+    Attributes:
+        threshold (float): The minimum similarity, from 0 to 1, for a word to match a query word.
+    """
+
+    def __init__(self, threshold: float = 0.3, cache_size: int = 4096):
+        self.threshold = threshold
+        self._words: Dict[str, Set[str]] = {}  # key -> the words of its text
+        self._order: Dict[str, int] = {}
+        self._next_order = 0
+        self._postings: Dict[str, Set[str]] = {}  # word -> the keys whose text contains it
+        self._gram_counts: Dict[str, int] = {}  # word -> the number of its trigrams
+        # trigram -> the number of trigrams of a word -> the words of that size containing the trigram.
+        self._grams: Dict[str, Dict[int, Set[str]]] = defaultdict(dict)
+        self._similar = QueryCache("fuzzy_words", max_size=cache_size)
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    @staticmethod
+    def _grams_of(word: str) -> Set[str]:
+        padded = f"  {word} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def add(self, key: str, text: str) -> None:
+        """
+        Indexes the words of a record's text, replacing any text previously indexed for the key.
+
+        Parameters:
+            key (str): The key of the record, e.g. its ISBN.
+            text (str): The text to index; several fields can be joined with spaces.
+        """
+        words = set(tokenize(text))
+        if key in self._words:
+            old = self._words[key]
+            for word in old - words:
+                self._unindex_word(key, word)
+            words_added = words - old
+        else:
+            self._order[key] = self._next_order
+            self._next_order += 1
+            words_added = words
+        self._words[key] = words
+        for word in words_added:
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = set()
+                grams = self._grams_of(word)
+                self._gram_counts[word] = len(grams)
+                for gram in grams:
+                    self._grams[gram].setdefault(len(grams), set()).add(word)
+                self._similar.invalidate()
+            postings.add(key)
+
+    update = add
+
+    def remove(self, key: str) -> None:
+        """
+        Removes a record from the index, if present.
+
+        Parameters:
+            key (str): The key of the record.
+        """
+        words = self._words.pop(key, None)
+        if words is not None:
+            for word in words:
+                self._unindex_word(key, word)
+            del self._order[key]
+
+    def _unindex_word(self, key: str, word: str):
+        postings = self._postings[word]
+        postings.discard(key)
+        if not postings:
+            del self._postings[word]
+            size = self._gram_counts.pop(word)
+            for gram in self._grams_of(word):
+                sizes = self._grams[gram]
+                words = sizes[size]
+                words.discard(word)
+                if not words:
+                    del sizes[size]
+                    if not sizes:
+                        del self._grams[gram]
+            self._similar.invalidate()
+
+    def similar_words(self, word: str) -> List[Tuple[str, float]]:
+        """
+        Finds the indexed words similar to a case-folded word.
+
+        Parameters:
+            word (str): The word to match.
+
+        Returns:
+            List[Tuple[str, float]]: (word, similarity) pairs for every indexed word at
+            or above the threshold, most similar first.
+        """
+        return self._similar.get_or_compute(word, lambda: self._score_words(word))
+
+    def _score_words(self, word: str) -> List[Tuple[str, float]]:
+        # A word of n trigrams sharing c of the query word's m scores c / (m + n - c).
+        # Reaching the threshold t needs n between t * m and m / t and c of at least
+        # t * m, so every match holds one of the m - ceil(t * m) + 1 rarest query
+        # trigrams. Only words of those sizes holding those trigrams are counted; the
+        # commonest trigrams are then checked for the candidates alone.
+        threshold = self.threshold
+        empty: Dict[int, Set[str]] = {}
+        gram_sizes = [self._grams.get(gram, empty) for gram in self._grams_of(word)]
+        gram_sizes.sort(key=lambda sizes: sum(len(words) for words in sizes.values()))
+        m = len(gram_sizes)
+        needed = max(math.ceil(threshold * m - 1e-9), 1)
+        largest = math.floor(m / threshold + 1e-9) if threshold > 0 else None
+        shared: Counter = Counter()
+        for sizes in gram_sizes[:m - needed + 1]:
+            for size, words in sizes.items():
+                if size >= needed and (largest is None or size <= largest):
+                    shared.update(words)
+        rest = gram_sizes[m - needed + 1:]
+        similar = []
+        gram_counts = self._gram_counts
+        for candidate, count in shared.items():
+            n = gram_counts[candidate]
+            for sizes in rest:
+                if candidate in sizes.get(n, ()):
+                    count += 1
+            score = count / (m + n - count)
+            if score >= threshold:
+                similar.append((candidate, score))
+        similar.sort(key=lambda item: (-item[1], item[0]))
+        return similar
+
+    def search(self, query: str, limit: Optional[int] = 10, min_score: Optional[float] = None
+               ) -> List[Tuple[str, float]]:
+        """
+        Finds the records best matching the words of a query, allowing for typos.
+        A record's score is the mean, over the query words, of the similarity of
+        the record's closest word, so exact matches of every word score 1.0.
+
+        Parameters:
+            query (str): The words to search for.
+            limit (Optional[int]): The maximum number of results to return, or None for all.
+            min_score (Optional[float]): The lowest score returned; defaults to the threshold.
+
+        Returns:
+            List[Tuple[str, float]]: (key, score) pairs ordered by descending score,
+            ties broken by the order in which records were first indexed.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        min_score = self.threshold if min_score is None else min_score
+        totals: Dict[str, float] = defaultdict(float)
+        for token in tokens:
+            best: Dict[str, float] = {}
+            for word, similarity in self.similar_words(token):
+                for key in self._postings[word]:
+                    if similarity > best.get(key, 0.0):
+                        best[key] = similarity
+            for key, similarity in best.items():
+                totals[key] += similarity
+        order = self._order
+        scored = [(key, total / len(tokens)) for key, total in totals.items() if total / len(tokens) >= min_score]
+
+        def rank(item):
+            return -item[1], order[item[0]]
+        if limit is None:
+            return sorted(scored, key=rank)
+        return heapq.nsmallest(limit, scored, key=rank)
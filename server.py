@@ -0,0 +1,626 @@
+# server.py
+"""
+Asyncio HTTP/JSON front-end for the library managers.
+
+Reads are answered directly on the event loop; every mutation is queued to a
+single writer task so changes are applied one at a time, in arrival order. The
+writer runs each mutation, and its storage I/O, on a worker thread so the event
+loop keeps accepting and parsing requests meanwhile; reads wait for the mutation
+in progress to finish so they never see it half applied.
+Connections are kept alive and requests pipelined on one connection are
+answered in order.
+
+Usage:
+    python server.py [--host 127.0.0.1] [--port 8080] [--data library_data.json]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http import HTTPStatus
+from itertools import islice
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import metrics
+from book import Book
+from book_manager import BOOK_KEY, BOOK_SORT_FIELDS, BookManager
+from checkout_manager import CHECKOUT_KEY, CHECKOUT_SORT_FIELDS, CheckoutManager
+from reservation_manager import ReservationManager
+from change_feed import VersionedStorage
+from circulation_journal import CirculationJournal
+from pagination import page, sort_key, stream
+from user import User
+from user_manager import USER_KEY, USER_SORT_FIELDS, UserManager
+
+MAX_HEADER_LINES = 100
+MAX_BODY_BYTES = 1024 * 1024
+DEFAULT_PAGE_SIZE = 20
+# The longest the server waits between checks for holds past their pickup deadline.
+HOLD_EXPIRY_INTERVAL = 60.0
+
+
+class HTTPError(Exception):
+    """
+    Raised by a handler to answer with an error status and message.
+    """
+
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Request:
+    """
+    A parsed HTTP request.
+
+    Attributes:
+        method (str): The request method, e.g. 'GET'.
+        path (str): The request path, still percent-encoded so that an encoded '/' in
+            an ISBN or user ID is not taken for a separator.
+        query (Dict[str, str]): The query string parameters (last value wins).
+        body (bytes): The request body.
+        keep_alive (bool): Whether the connection stays open after the response.
+    """
+
+    def __init__(self, method: str, path: str, query: Dict[str, str], body: bytes, keep_alive: bool):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.body = body
+        self.keep_alive = keep_alive
+
+    def json(self) -> Dict[str, Any]:
+        """
+        Decodes the body as a JSON object.
+        """
+        try:
+            data = json.loads(self.body or b'{}')
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Body is not valid JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Body must be a JSON object")
+        return data
+
+
+def _required(data: Dict[str, Any], *fields: str) -> List[str]:
+    values = []
+    for field in fields:
+        value = data.get(field)
+        if not isinstance(value, str) or not value:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Missing required field: {field}")
+        values.append(value)
+    return values
+
+
+def _copies(data: Dict[str, Any]) -> Optional[int]:
+    copies = data.get("copies")
+    if copies is not None and (not isinstance(copies, int) or isinstance(copies, bool) or copies < 1):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "copies must be a positive integer")
+    return copies
+
+
+def _page(request: Request) -> Tuple[Optional[int], int]:
+    try:
+        limit = int(request.query['limit']) if 'limit' in request.query else None
+        offset = int(request.query.get('offset', 0))
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "limit and offset must be integers")
+    return limit, offset
+
+
+def _time_range(request: Request) -> Tuple[Optional[datetime], Optional[datetime]]:
+    try:
+        return tuple(datetime.fromisoformat(request.query[name]) if name in request.query else None
+                     for name in ('since', 'until'))
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "since and until must be ISO 8601 dates")
+
+
+def _listing(request: Request, records, key: Callable[[Any], str], fields: Dict[str, str]):
+    """
+    Lists records in the order given by ?sort= and ?desc=1. With ?cursor= (empty for
+    the first page) answers one page and the cursor of the next; otherwise honours
+    ?limit= and ?offset=.
+    """
+    limit, offset = _page(request)
+    descending = request.query.get('desc', '') not in ('', '0', 'false')
+    try:
+        sort = sort_key(request.query.get('sort'), fields)
+        if 'cursor' in request.query:
+            result = page(records, key, limit or DEFAULT_PAGE_SIZE, sort=sort, descending=descending,
+                          after=request.query['cursor'] or None)
+            return {"items": [record.to_dict() for record in result.items], "next_cursor": result.next_cursor}
+        return [record.to_dict() for record in stream(records, key, sort=sort, descending=descending,
+                                                      offset=offset, limit=limit)]
+    except ValueError as e:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, str(e))
+
+
+class LibraryServer:
+    """
+    Serves the book, user and checkout operations over HTTP.
+
+    Attributes:
+        book_manager (BookManager): The manager answering book requests.
+        user_manager (UserManager): The manager answering user requests.
+        checkout_manager (CheckoutManager): The manager answering checkout requests.
+        change_feed (Optional[VersionedStorage]): The versioned storage whose changes are served
+            to replicas, if changes are versioned.
+    """
+
+    def __init__(self, book_manager: BookManager, user_manager: UserManager, checkout_manager: CheckoutManager,
+                 change_feed: Optional[VersionedStorage] = None):
+        self.book_manager = book_manager
+        self.user_manager = user_manager
+        self.checkout_manager = checkout_manager
+        self.change_feed = change_feed
+        self._writes: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        # The worker thread the writer applies mutations on.
+        self._write_executor: Optional[ThreadPoolExecutor] = None
+        # Set while no mutation is being applied, so that reads may run.
+        self._idle: Optional[asyncio.Event] = None
+        self._expiry_task: Optional[asyncio.Task] = None
+        # (method, path pattern, handler, is a mutation)
+        self._routes: List[Tuple[str, re.Pattern, Callable[..., Any], bool]] = [
+            ("GET", re.compile(r"/books"), self.list_books, False),
+            ("POST", re.compile(r"/books"), self.add_book, True),
+            ("GET", re.compile(r"/books/(?P<isbn>[^/]+)"), self.get_book, False),
+            ("GET", re.compile(r"/books/(?P<isbn>[^/]+)/availability"), self.get_availability, False),
+            ("GET", re.compile(r"/books/(?P<isbn>[^/]+)/holds"), self.list_holds, False),
+            ("PUT", re.compile(r"/books/(?P<isbn>[^/]+)"), self.update_book, True),
+            ("DELETE", re.compile(r"/books/(?P<isbn>[^/]+)"), self.delete_book, True),
+            ("GET", re.compile(r"/users"), self.list_users, False),
+            ("POST", re.compile(r"/users"), self.add_user, True),
+            ("GET", re.compile(r"/users/(?P<user_id>[^/]+)"), self.get_user, False),
+            ("GET", re.compile(r"/users/(?P<user_id>[^/]+)/loans"), self.list_user_loans, False),
+            ("GET", re.compile(r"/users/(?P<user_id>[^/]+)/history"), self.list_user_history, False),
+            ("PUT", re.compile(r"/users/(?P<user_id>[^/]+)"), self.update_user, True),
+            ("DELETE", re.compile(r"/users/(?P<user_id>[^/]+)"), self.delete_user, True),
+            ("GET", re.compile(r"/checkouts"), self.list_checkouts, False),
+            ("GET", re.compile(r"/checkouts/overdue"), self.list_overdue, False),
+            ("POST", re.compile(r"/checkouts"), self.checkout_book, True),
+            ("DELETE", re.compile(r"/checkouts/(?P<isbn>[^/]+)"), self.checkin_book, True),
+            ("POST", re.compile(r"/holds"), self.place_hold, True),
+            ("DELETE", re.compile(r"/holds/(?P<isbn>[^/]+)"), self.cancel_hold, True),
+            ("GET", re.compile(r"/fines"), self.list_fines, False),
+            ("GET", re.compile(r"/fines/summary"), self.get_fine_summary, False),
+            ("GET", re.compile(r"/stats/popular"), self.list_popular, False),
+            ("GET", re.compile(r"/changes"), self.list_changes, False),
+            ("GET", re.compile(r"/metrics"), self.get_metrics, False),
+        ]
+
+    # Book endpoints
+
+    def list_books(self, request: Request):
+        limit, offset = _page(request)
+        if 'q' in request.query:
+            return [dict(book.to_dict(), score=score)
+                    for book, score in self.book_manager.search_books(request.query['q'], limit, offset)]
+        if 'fuzzy' in request.query:
+            end = offset + (limit or DEFAULT_PAGE_SIZE)
+            results = self.book_manager.fuzzy_search_books(request.query['fuzzy'], end)
+            return [dict(book.to_dict(), score=score) for book, score in results[offset:]]
+        if 'title' in request.query:
+            books = self.book_manager.find_books_by_title(request.query['title'])
+        elif 'author' in request.query:
+            books = self.book_manager.find_books_by_author(request.query['author'])
+        else:
+            books = self.book_manager.books.values()
+        return _listing(request, books, BOOK_KEY, BOOK_SORT_FIELDS)
+
+    def get_book(self, request: Request, isbn: str):
+        book = self.book_manager.find_book_by_isbn(isbn)
+        if book is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Book not found: {isbn}")
+        return book.to_dict()
+
+    def add_book(self, request: Request):
+        data = request.json()
+        title, author, isbn = _required(data, "title", "author", "isbn")
+        copies = _copies(data)
+        if not self.book_manager.add_book(Book(title, author, isbn, copies if copies is not None else 1)):
+            raise HTTPError(HTTPStatus.CONFLICT, f"Duplicate book ISBN: {isbn}")
+        return HTTPStatus.CREATED, self.book_manager.find_book_by_isbn(isbn).to_dict()
+
+    def update_book(self, request: Request, isbn: str):
+        data = request.json()
+        copies = _copies(data)
+        if not self.book_manager.update_book(isbn, data.get("title"), data.get("author"), copies):
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Book not found: {isbn}")
+        if copies is not None:
+            # Added copies go to the waitlist before the shelf.
+            self.checkout_manager.assign_holds(isbn)
+        return self.book_manager.find_book_by_isbn(isbn).to_dict()
+
+    def delete_book(self, request: Request, isbn: str):
+        if not self.book_manager.delete_book(isbn):
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Book not found: {isbn}")
+        return {"deleted": isbn}
+
+    # User endpoints
+
+    def list_users(self, request: Request):
+        limit, offset = _page(request)
+        if 'q' in request.query:
+            return [dict(user.to_dict(), score=score)
+                    for user, score in self.user_manager.search_users(request.query['q'], limit, offset)]
+        if 'fuzzy' in request.query:
+            end = offset + (limit or DEFAULT_PAGE_SIZE)
+            results = self.user_manager.fuzzy_search_users(request.query['fuzzy'], end)
+            return [dict(user.to_dict(), score=score) for user, score in results[offset:]]
+        if 'name' in request.query:
+            users = self.user_manager.find_users_by_name(request.query['name'])
+        else:
+            users = self.user_manager.users.values()
+        return _listing(request, users, USER_KEY, USER_SORT_FIELDS)
+
+    def get_user(self, request: Request, user_id: str):
+        user = self.user_manager.find_user_by_id(user_id)
+        if user is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"User not found: {user_id}")
+        return user.to_dict()
+
+    def add_user(self, request: Request):
+        name, user_id = _required(request.json(), "name", "user_id")
+        if not self.user_manager.add_user(User(name, user_id)):
+            raise HTTPError(HTTPStatus.CONFLICT, f"Duplicate user ID: {user_id}")
+        return HTTPStatus.CREATED, self.user_manager.find_user_by_id(user_id).to_dict()
+
+    def update_user(self, request: Request, user_id: str):
+        if not self.user_manager.update_user(user_id, request.json().get("name")):
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"User not found: {user_id}")
+        return self.user_manager.find_user_by_id(user_id).to_dict()
+
+    def delete_user(self, request: Request, user_id: str):
+        if not self.user_manager.delete_user(user_id):
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"User not found: {user_id}")
+        return {"deleted": user_id}
+
+    # Checkout endpoints
+
+    def list_checkouts(self, request: Request):
+        checkouts = self.checkout_manager.iter_checkouts(request.query.get('isbn'), request.query.get('user_id'))
+        return _listing(request, checkouts, CHECKOUT_KEY, CHECKOUT_SORT_FIELDS)
+
+    def list_overdue(self, request: Request):
+        limit, offset = _page(request)
+        return [checkout.to_dict() for checkout in self.checkout_manager.iter_overdue(offset=offset, limit=limit)]
+
+    def list_fines(self, request: Request):
+        return self.checkout_manager.calculate_fines()
+
+    def get_fine_summary(self, request: Request):
+        limit, _ = _page(request)
+        try:
+            report = self.checkout_manager.fine_report()
+        except ImportError as e:
+            raise HTTPError(HTTPStatus.NOT_IMPLEMENTED, str(e))
+        return report.to_dict(limit or 10)
+
+    def checkout_book(self, request: Request):
+        data = request.json()
+        user_id, isbn = _required(data, "user_id", "isbn")
+        due_date = None
+        if data.get("due_date"):
+            try:
+                due_date = datetime.fromisoformat(data["due_date"])
+            except (TypeError, ValueError):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "due_date must be an ISO 8601 date")
+        if not self.checkout_manager.checkout_book(user_id, isbn, due_date):
+            raise HTTPError(HTTPStatus.CONFLICT, f"Book not available to user {user_id}: {isbn}")
+        return HTTPStatus.CREATED, self.checkout_manager.checkouts[f"{isbn}:{user_id}"].to_dict()
+
+    def checkin_book(self, request: Request, isbn: str):
+        if not self.checkout_manager.checkin_book(isbn, request.query.get("user_id")):
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Book not checked out: {isbn}")
+        return {"checked_in": isbn}
+
+    # Hold endpoints
+
+    def _reservations(self):
+        if self.checkout_manager.reservations is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "Holds are not kept")
+        return self.checkout_manager.reservations
+
+    def list_holds(self, request: Request, isbn: str):
+        return [hold.to_dict() for hold in self._reservations().waitlist(isbn)]
+
+    def place_hold(self, request: Request):
+        data = request.json()
+        user_id, isbn = _required(data, "user_id", "isbn")
+        try:
+            priority = int(data.get("priority", 0))
+        except (TypeError, ValueError):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "priority must be an integer")
+        self._reservations()
+        hold = self.checkout_manager.place_hold(user_id, isbn, priority)
+        if hold is None:
+            raise HTTPError(HTTPStatus.CONFLICT, f"Hold not placed for user {user_id}: {isbn}")
+        return HTTPStatus.CREATED, hold.to_dict()
+
+    def cancel_hold(self, request: Request, isbn: str):
+        user_id = request.query.get("user_id")
+        if not user_id:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Missing field: user_id")
+        self._reservations()
+        if not self.checkout_manager.cancel_hold(user_id, isbn):
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"No hold by user {user_id}: {isbn}")
+        return {"cancelled": isbn, "user_id": user_id}
+
+    def get_availability(self, request: Request, isbn: str):
+        if self.book_manager.find_book_by_isbn(isbn) is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Book not found: {isbn}")
+        return {"isbn": isbn, "copies": self.checkout_manager.copies(isbn),
+                "available": self.checkout_manager.available_copies(isbn)}
+
+    def list_user_loans(self, request: Request, user_id: str):
+        if self.user_manager.find_user_by_id(user_id) is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"User not found: {user_id}")
+        return [checkout.to_dict() for checkout in self.checkout_manager.loans_for_user(user_id)]
+
+    def _journal(self):
+        if self.checkout_manager.journal is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "No circulation journal is kept")
+        return self.checkout_manager.journal
+
+    def list_user_history(self, request: Request, user_id: str):
+        start, end = _time_range(request)
+        limit, offset = _page(request)
+        events = self._journal().borrowing_history(user_id, start, end)
+        return [{"time": datetime.fromtimestamp(event.time).isoformat(), "event": event.kind, "isbn": event.isbn}
+                for event in islice(events, offset, None if limit is None else offset + limit)]
+
+    def list_popular(self, request: Request):
+        start, end = _time_range(request)
+        limit, _ = _page(request)
+        return [{"isbn": isbn, "checkouts": checkouts}
+                for isbn, checkouts in self._journal().popular_titles(start, end, limit or 10)]
+
+    def list_changes(self, request: Request):
+        if self.change_feed is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "Changes are not versioned")
+        try:
+            since = int(request.query.get('since', 0))
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "since must be a version number")
+        limit, _ = _page(request)
+        # Read the version first, so a replica that applies every change returned reaches at least it.
+        version = self.change_feed.version
+        changes = self.change_feed.changes_since(since, limit, request.query.get('exclude_origin'))
+        if limit is not None and len(changes) == limit:
+            version = changes[-1].version
+        return {"version": max(version, since), "changes": [change.to_dict() for change in changes]}
+
+    def get_metrics(self, request: Request):
+        return dict(metrics.REGISTRY.snapshot(),
+                    query_caches=[self.book_manager.query_cache.stats(), self.user_manager.query_cache.stats()])
+
+    # Dispatch
+
+    async def _writer(self):
+        """
+        The single writer: applies queued mutations one at a time, in arrival order,
+        on the write thread so their storage calls do not block the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            func, future = await self._writes.get()
+            if future.cancelled():
+                continue
+            self._idle.clear()
+            try:
+                result = await loop.run_in_executor(self._write_executor, func)
+            except asyncio.CancelledError:
+                raise
+            except BaseException as e:
+                if not future.cancelled():
+                    future.set_exception(e)
+            else:
+                if not future.cancelled():
+                    future.set_result(result)
+            finally:
+                self._idle.set()
+
+    async def _read(self, func: Callable[[], Any]) -> Any:
+        """
+        Answers a read on the event loop once no mutation is being applied.
+        """
+        while not self._idle.is_set():
+            await self._idle.wait()
+        return func()
+
+    async def _expire_holds(self):
+        """
+        Expires holds as their pickup deadlines pass. Expiry is a mutation, so it is queued to the writer.
+        A failure is logged and retried after HOLD_EXPIRY_INTERVAL, so the task keeps running.
+        """
+        reservations = self.checkout_manager.reservations
+        while True:
+            try:
+                next_expiry = await self._read(reservations.next_expiry)
+                delay = HOLD_EXPIRY_INTERVAL
+                if next_expiry is not None:
+                    delay = min(max((next_expiry - datetime.now()).total_seconds(), 0.0), delay)
+                await asyncio.sleep(delay)
+                future = asyncio.get_running_loop().create_future()
+                await self._writes.put((self.checkout_manager.process_expired_holds, future))
+                await future
+            except Exception as e:
+                logging.error("Hold expiry failed: %r", e)
+                await asyncio.sleep(HOLD_EXPIRY_INTERVAL)
+
+    async def dispatch(self, request: Request) -> Tuple[HTTPStatus, Any]:
+        """
+        Routes a request to its handler. Mutations are queued to the writer task.
+        """
+        allowed = False
+        for method, pattern, handler, is_write in self._routes:
+            match = pattern.fullmatch(request.path)
+            if match is None:
+                continue
+            allowed = True
+            if method != request.method:
+                continue
+            # Routes match the encoded path; the captured ISBNs and user IDs are decoded.
+            params = {name: unquote(value) for name, value in match.groupdict().items()}
+            call = lambda: handler(request, **params)
+            if is_write:
+                future = asyncio.get_running_loop().create_future()
+                await self._writes.put((call, future))
+                result = await future
+            else:
+                result = await self._read(call)
+            if isinstance(result, tuple):
+                return result
+            return HTTPStatus.OK, result
+        if allowed:
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"Method not allowed: {request.method}")
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"No such resource: {request.path}")
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Request]:
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, target, version = request_line.decode('latin-1').split()
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+        headers = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Too many headers")
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+        body = await reader.readexactly(length) if length else b''
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+        url = urlsplit(target)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        return Request(method.upper(), url.path.rstrip('/') or '/', query, body, keep_alive)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                keep_alive = False
+                try:
+                    request = await self._read_request(reader)
+                    if request is None:
+                        break
+                    keep_alive = request.keep_alive
+                    status, payload = await self.dispatch(request)
+                except HTTPError as e:
+                    status, payload = e.status, {"error": e.message}
+                except asyncio.IncompleteReadError:
+                    break
+                except Exception as e:
+                    logging.error("Request failed: %r", e)
+                    status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Internal server error"}
+                body = json.dumps(payload).encode('utf-8')
+                writer.write(
+                    f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8080) -> asyncio.AbstractServer:
+        """
+        Starts the writer task, and the hold expiry task if holds are kept, and begins
+        accepting connections.
+
+        Returns:
+            asyncio.AbstractServer: The listening server.
+        """
+        self._writes = asyncio.Queue()
+        self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="library-writer")
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._writer_task = asyncio.create_task(self._writer())
+        if self.checkout_manager.reservations is not None:
+            self._expiry_task = asyncio.create_task(self._expire_holds())
+        return await asyncio.start_server(self._handle_connection, host, port)
+
+
+async def serve(storage, host: str, port: int, journal: Optional[CirculationJournal] = None,
+                change_feed: Optional[VersionedStorage] = None):
+    """
+    Serves the library stored in storage until cancelled, recording checkouts
+    and check-ins in journal if one is given and serving the changes of
+    change_feed at /changes.
+    """
+    reservations = ReservationManager(storage)
+    book_manager = BookManager(storage, reservations=reservations)
+    user_manager = UserManager(storage, reservations=reservations)
+    checkout_manager = CheckoutManager(storage, book_manager=book_manager, user_manager=user_manager,
+                                       journal=journal, reservations=reservations)
+    server = LibraryServer(book_manager, user_manager, checkout_manager, change_feed)
+    listener = await server.start(host, port)
+    logging.info("Serving on %s:%s", host, port)
+    async with listener:
+        await listener.serve_forever()
+
+
+def main(argv=None):
+    from log_config import setup_logging
+    from storage import open_storage
+    from unit_of_work import UnitOfWork
+
+    parser = argparse.ArgumentParser(description="Serve the library over HTTP/JSON")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--data", default="library_data.json", help="The data file to serve")
+    parser.add_argument("--journal", default="library_journal",
+                        help="The directory of the circulation journal")
+    parser.add_argument("--log-json", action="store_true", help="Write the log as JSON lines")
+    parser.add_argument("--metrics", action="store_true", help="Record metrics and serve them at /metrics")
+    parser.add_argument("--metrics-file",
+                        help="Record metrics and keep this file updated in the Prometheus text format")
+    args = parser.parse_args(argv)
+
+    setup_logging(async_mode=True, json_lines=args.log_json, max_bytes=10 * 1024 * 1024)
+    exporter = None
+    if args.metrics or args.metrics_file:
+        metrics.enable()
+    if args.metrics_file:
+        exporter = metrics.PrometheusExporter(args.metrics_file)
+    # Mutations only touch memory on the event loop; the unit of work writes them in groups.
+    change_feed = VersionedStorage(open_storage(args.data))
+    storage = UnitOfWork(change_feed, "group")
+    journal = CirculationJournal(args.journal)
+    try:
+        asyncio.run(serve(storage, args.host, args.port, journal, change_feed))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        storage.close()
+        journal.close()
+        if exporter is not None:
+            exporter.stop()
+
+
+if __name__ == "__main__":
+    main()
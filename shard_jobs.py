@@ -0,0 +1,237 @@
+# shard_jobs.py
+"""
+Batch jobs that fan out over the shards of a ShardedStorage with a process
+pool, one shard per task, and merge the results: overdue scans, fine runs,
+bulk imports and reindexing. Each worker opens its shard from its file, so the
+jobs scale with the number of cores rather than running on one.
+
+Usage:
+    python shard_jobs.py branches/ overdue
+    python shard_jobs.py branches/ fines --workers 8
+    python shard_jobs.py branches/ import books catalog.csv
+    python shard_jobs.py branches/ reindex
+"""
+
+import argparse
+import heapq
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from operator import itemgetter
+from typing import Any, Callable, Dict, List, Optional
+
+from bulk_import import ImportReport, book_from_record, iter_records, user_from_record
+from fine_policy import FinePolicy
+from sharded_storage import ShardedStorage, open_sharded
+from storage import open_storage
+
+
+def _init_worker():
+    # Workers log straight to the file; the parent's background log writer does not exist in them.
+    from log_config import setup_logging
+    setup_logging()
+
+
+def map_shards(storage: ShardedStorage, job: Callable[..., Any], *args: Any,
+               max_workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Runs job(filename, backend, *args) for every shard in a pool of worker processes.
+
+    Parameters:
+        storage (ShardedStorage): The shards to process. WAL shards are not supported, as a
+            write-ahead log cannot be shared between processes.
+        job (Callable[..., Any]): A module-level function, so that it can be sent to the workers.
+        max_workers (Optional[int]): The number of worker processes; defaults to the number of CPUs.
+
+    Returns:
+        Dict[str, Any]: Each shard's result, by shard name.
+    """
+    if not storage.filenames:
+        raise ValueError("The shards have no files to reopen in worker processes; open them with open_sharded")
+    if storage.backend == "wal":
+        raise ValueError("WAL shards cannot be shared with worker processes")
+    max_workers = min(max_workers or os.cpu_count() or 1, len(storage.filenames))
+    with ProcessPoolExecutor(max_workers, initializer=_init_worker) as pool:
+        futures = {name: pool.submit(job, filename, storage.backend, *args)
+                   for name, filename in storage.filenames.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+# Jobs, run in the workers
+
+def _overdue_job(filename: str, backend: str, now: datetime) -> List[dict]:
+    from checkout_manager import CheckoutManager
+    storage = open_storage(filename, backend)
+    try:
+        return CheckoutManager(storage).find_overdue_books(now)
+    finally:
+        storage.close()
+
+
+def _fines_job(filename: str, backend: str, now: datetime, fine_policy: FinePolicy) -> List[dict]:
+    from checkout_manager import CheckoutManager
+    storage = open_storage(filename, backend)
+    try:
+        return CheckoutManager(storage, fine_policy).calculate_fines(now)
+    finally:
+        storage.close()
+
+
+def _import_job(filename: str, backend: str, kind: str, directory: str, batch_size: int) -> ImportReport:
+    # The shard's validated records were written to directory/<shard name>.jsonl by
+    # bulk_import, each with its row number in the import file.
+    records_path = os.path.join(directory, os.path.splitext(os.path.basename(filename))[0] + '.jsonl')
+    storage = open_storage(filename, backend)
+    try:
+        with open(records_path, 'r', encoding='utf-8') as file:
+            entries = (json.loads(line) for line in file)
+            if kind == "books":
+                from book_manager import BookManager
+                from book import Book
+                return BookManager(storage).add_books_bulk(
+                    ((entry["row"], Book(**entry["record"])) for entry in entries), batch_size)
+            from user_manager import UserManager
+            from user import User
+            return UserManager(storage).add_users_bulk(
+                ((entry["row"], User(**entry["record"])) for entry in entries), batch_size)
+    finally:
+        storage.close()
+
+
+def _reindex_job(filename: str, backend: str) -> Dict[str, int]:
+    storage = open_storage(filename, backend)
+    try:
+        # Rewriting every section rebuilds the shard's file and its key indexes.
+        data = {section: list(records) for section, records in storage.read().items()}
+        storage.write(data)
+        return {section: len(records) for section, records in data.items()}
+    finally:
+        storage.close()
+
+
+# Merged results
+
+def overdue_scan(storage: ShardedStorage, now: Optional[datetime] = None,
+                 max_workers: Optional[int] = None) -> List[dict]:
+    """
+    Finds the overdue books of every shard in parallel.
+
+    Returns:
+        List[dict]: The overdue checkouts of all shards, most overdue first.
+    """
+    results = map_shards(storage, _overdue_job, now or datetime.now(), max_workers=max_workers)
+    return list(heapq.merge(*results.values(), key=itemgetter("due_date")))
+
+
+def fine_run(storage: ShardedStorage, now: Optional[datetime] = None, fine_policy: Optional[FinePolicy] = None,
+             max_workers: Optional[int] = None) -> List[dict]:
+    """
+    Calculates the fines of every shard in parallel.
+
+    Returns:
+        List[dict]: One entry per overdue checkout of all shards, most overdue first,
+        as returned by CheckoutManager.calculate_fines.
+    """
+    results = map_shards(storage, _fines_job, now or datetime.now(), fine_policy or FinePolicy(),
+                         max_workers=max_workers)
+    return list(heapq.merge(*results.values(), key=itemgetter("due_date")))
+
+
+def bulk_import(storage: ShardedStorage, kind: str, path: str, fmt: Optional[str] = None, batch_size: int = 1000,
+                max_workers: Optional[int] = None) -> ImportReport:
+    """
+    Imports books or users into the shards in parallel. The file is read and
+    validated once, split by shard, and each shard's records are then
+    deduplicated and persisted by its own worker.
+
+    Parameters:
+        storage (ShardedStorage): The shards to import into.
+        kind (str): 'books' or 'users'.
+        path (str): The CSV or JSON Lines file to import, as for bulk_import.import_books.
+        fmt (Optional[str]): 'csv' or 'jsonl'. Inferred from the file extension when omitted.
+        batch_size (int): The number of records each worker persists together.
+        max_workers (Optional[int]): The number of worker processes; defaults to the number of CPUs.
+
+    Returns:
+        ImportReport: The merged outcome of the import.
+    """
+    if kind not in ("books", "users"):
+        raise ValueError(f"Unknown import kind: {kind}")
+    build, key = (book_from_record, "isbn") if kind == "books" else (user_from_record, "user_id")
+    report = ImportReport()
+    with tempfile.TemporaryDirectory() as directory:
+        files = {name: open(os.path.join(directory, name + '.jsonl'), 'w', encoding='utf-8')
+                 for name in storage.shards}
+        try:
+            for row, record, error in iter_records(path, fmt):
+                if error is None:
+                    try:
+                        record = build(record).to_dict()
+                    except ValueError as e:
+                        error = str(e)
+                if error is not None:
+                    report.error(row, error)
+                    continue
+                files[storage.shard_for(kind, record[key])].write(json.dumps({"row": row, "record": record}) + '\n')
+        finally:
+            for file in files.values():
+                file.close()
+        results = map_shards(storage, _import_job, kind, directory, batch_size, max_workers=max_workers)
+    for shard_report in results.values():
+        report.added += shard_report.added
+        report.duplicates += shard_report.duplicates
+        report.errors.extend(shard_report.errors)
+    return report
+
+
+def reindex(storage: ShardedStorage, max_workers: Optional[int] = None) -> Dict[str, Dict[str, int]]:
+    """
+    Rewrites every shard in parallel, rebuilding its file and key indexes.
+
+    Returns:
+        Dict[str, Dict[str, int]]: Each shard's record count per section, by shard name.
+    """
+    return map_shards(storage, _reindex_job, max_workers=max_workers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run batch jobs over every shard in parallel")
+    parser.add_argument("directory", help="The shard directory")
+    parser.add_argument("--workers", type=int, help="The number of worker processes (default: one per CPU)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("overdue", help="List the overdue books of every shard")
+    subparsers.add_parser("fines", help="Calculate the fines of every shard")
+    subparsers.add_parser("reindex", help="Rewrite every shard and its key indexes")
+    import_parser = subparsers.add_parser("import", help="Import books or users from a CSV or JSON Lines file")
+    import_parser.add_argument("kind", choices=["books", "users"])
+    import_parser.add_argument("path")
+    import_parser.add_argument("--format", choices=["csv", "jsonl"])
+    import_parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    storage = open_sharded(args.directory)
+    try:
+        if args.command == "overdue":
+            for checkout in overdue_scan(storage, max_workers=args.workers):
+                print(f"ISBN: {checkout['isbn']}, User ID: {checkout['user_id']}, Due Date: {checkout['due_date']}")
+        elif args.command == "fines":
+            for fine in fine_run(storage, max_workers=args.workers):
+                print(f"ISBN: {fine['isbn']}, User ID: {fine['user_id']}, "
+                      f"Overdue by: {fine['overdue_days']} days, Fine: {fine['fine']:.2f}")
+        elif args.command == "reindex":
+            for name, counts in reindex(storage, args.workers).items():
+                print(f"{name}: " + ", ".join(f"{section}: {count}" for section, count in counts.items()))
+        else:
+            report = bulk_import(storage, args.kind, args.path, args.format, args.batch_size, args.workers)
+            print(report, file=sys.stderr)
+            for row, message in report.errors:
+                print(f"Row {row if row is not None else '-'}: {message}", file=sys.stderr)
+    finally:
+        storage.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+# sharded_storage.py
+"""
+Storage split across several shards, each a storage engine with its own file
+or database, so that batch jobs can process the shards in parallel (see
+shard_jobs.py) and no single file holds the whole consortium.
+
+Records are placed in one of two ways:
+    hash     books, checkouts and holds by a stable hash of the ISBN, users by a
+             hash of the user ID, so a book, its checkouts and its holds share a shard.
+    branch   one shard per branch. A record stays in the shard that holds it;
+             new records are added to the home branch's shard.
+
+The shard layout is kept in a 'shards.json' manifest in the shard directory,
+so the directory is always reopened with the same placement.
+"""
+
+import copy
+import json
+import os
+import threading
+import zlib
+from contextlib import ExitStack, contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from storage import StorageBackend, open_storage, record_key
+
+ROUTINGS = ("hash", "branch")
+MANIFEST = "shards.json"
+
+# The file extension of each backend's shard files.
+_EXTENSIONS = {"json": ".json", "wal": ".json", "sqlite": ".db", "binary": ".snap"}
+
+
+def shard_key(section: str, key: str) -> str:
+    """
+    Returns the part of a record key that decides its shard: the ISBN for books,
+    checkouts and holds, the user ID for users and the whole key otherwise.
+    """
+    if section in ("checkouts", "holds"):
+        return key.partition(":")[0]
+    return key
+
+
+class ShardedStorage(StorageBackend):
+    """
+    A storage engine that spreads every section over several shards. It can be
+    passed to the managers wherever a storage is expected.
+
+    Transactions are atomic per shard: a transaction() opens a transaction on a
+    shard when it first touches it, and commits the shards it touched together
+    when it exits. A transaction asked for a snapshot yields the merged sections
+    to modify, and writes back to each shard only its changed share of them.
+
+    Attributes:
+        shards (Dict[str, StorageBackend]): The shards, by name.
+        routing (str): 'hash' or 'branch'.
+        home (Optional[str]): In branch routing, the shard new records are added to.
+        filenames (Dict[str, str]): Each shard's file, used to reopen it in another process.
+        backend (Optional[str]): The storage backend of the shard files.
+    """
+
+    def __init__(self, shards: Dict[str, StorageBackend], routing: str = "hash", home: Optional[str] = None,
+                 filenames: Optional[Dict[str, str]] = None, backend: Optional[str] = None):
+        if routing not in ROUTINGS:
+            raise ValueError(f"Unknown shard routing: {routing}")
+        if routing == "branch" and home not in shards:
+            raise ValueError(f"Branch routing needs a home shard, one of: {', '.join(shards)}")
+        self.shards = shards
+        self.routing = routing
+        self.home = home
+        self.filenames = filenames or {}
+        self.backend = backend
+        self._names = sorted(shards)
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        # Branch routing: (section, key) -> the shard holding the record, loaded on first use.
+        self._owners: Optional[Dict[Tuple[str, str], str]] = None
+
+    def shard_for(self, section: str, key: str) -> str:
+        """
+        Returns the name of the shard a record belongs in.
+        """
+        if self.routing == "hash":
+            return self._names[zlib.crc32(shard_key(section, key).encode('utf-8')) % len(self._names)]
+        return self._load_owners().get((section, key), self.home)
+
+    def _load_owners(self) -> Dict[Tuple[str, str], str]:
+        with self._lock:
+            if self._owners is None:
+                owners = {}
+                for name, shard in self.shards.items():
+                    for section, records in shard.read().items():
+                        for record in records:
+                            owners.setdefault((section, record_key(section, record)), name)
+                self._owners = owners
+            return self._owners
+
+    def _shard(self, name: str) -> StorageBackend:
+        """
+        Returns a shard to change, joining it to the calling thread's transaction if one is open.
+        """
+        stack = getattr(self._local, 'stack', None)
+        if stack is not None and name not in self._local.joined:
+            stack.enter_context(self.shards[name].transaction())
+            self._local.joined.add(name)
+        return self.shards[name]
+
+    def read(self) -> Dict[str, List[Any]]:
+        """
+        Returns every section, made of the records of every shard in shard name order.
+        """
+        data: Dict[str, List[Any]] = {}
+        for name in self._names:
+            for section, records in self.shards[name].read().items():
+                data.setdefault(section, []).extend(records)
+        return data
+
+    def write(self, data: Dict[str, List[Any]]) -> None:
+        """
+        Replaces the given sections, writing each shard its share of the records.
+        Sections that are not present in data are preserved.
+        """
+        self._write(data)
+
+    def _write(self, data: Dict[str, List[Any]], current: Optional[Dict[str, Dict[str, List[Any]]]] = None):
+        # Writes each shard its share of data, skipping the shares equal to those in current (by shard).
+        with self.transaction():
+            split = {name: {section: [] for section in data} for name in self._names}
+            for section, records in data.items():
+                for record in records:
+                    split[self.shard_for(section, record_key(section, record))][section].append(record)
+            for name, sections in split.items():
+                if current is not None:
+                    sections = {section: records for section, records in sections.items()
+                                if current[name].get(section, []) != records}
+                if sections:
+                    self._shard(name).write(sections)
+            if self._owners is not None:
+                self._owners = {owner: name for owner, name in self._owners.items() if owner[0] not in data}
+                for name, sections in split.items():
+                    for section, records in sections.items():
+                        self._owners.update(((section, record_key(section, record)), name) for record in records)
+
+    def put_record(self, section: str, key: str, record: Dict[str, Any]) -> None:
+        """
+        Inserts or replaces a single record in the shard it belongs in.
+        """
+        name = self.shard_for(section, key)
+        self._shard(name).put_record(section, key, record)
+        if self._owners is not None:
+            self._owners[(section, key)] = name
+
+    def delete_record(self, section: str, key: str) -> None:
+        """
+        Removes a single record from the shard holding it, if present.
+        """
+        self._shard(self.shard_for(section, key)).delete_record(section, key)
+        if self._owners is not None:
+            self._owners.pop((section, key), None)
+
+    def find_record(self, section: str, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Finds a single record by key in the shard holding it, reading only that
+        shard. In branch routing, before the owners of the records are known, the
+        shards are searched in turn.
+        """
+        if self.routing == "hash" or self._owners is not None:
+            return self._find_in(self.shard_for(section, key), section, key)
+        for name in self._names:
+            record = self._find_in(name, section, key)
+            if record is not None:
+                return record
+        return None
+
+    def _find_in(self, name: str, section: str, key: str) -> Optional[Dict[str, Any]]:
+        shard = self.shards[name]
+        try:
+            return shard.find_record(section, key)
+        except NotImplementedError:
+            return next((record for record in shard.read().get(section, []) if record_key(section, record) == key),
+                        None)
+
+    @contextmanager
+    def transaction(self, snapshot: bool = False) -> Iterator[Optional[Dict[str, List[Any]]]]:
+        """
+        Runs a transaction across the shards. Record-level calls made by the same
+        thread inside the block join it, and each shard they touch is written
+        once when the outermost transaction exits without an exception.
+
+        Parameters:
+            snapshot (bool): Whether to yield the current data for the block to modify.
+                The sections it changes are written back to their shards when the block exits.
+
+        Yields:
+            Optional[Dict[str, List[Any]]]: The merged sections of every shard, or None
+            without a snapshot.
+        """
+        with self._lock:
+            if getattr(self._local, 'stack', None) is not None:
+                with self._snapshot(snapshot) as data:
+                    yield data
+                return
+            with ExitStack() as stack:
+                self._local.stack = stack
+                self._local.joined = set()
+                try:
+                    with self._snapshot(snapshot) as data:
+                        yield data
+                finally:
+                    self._local.stack = None
+
+    @contextmanager
+    def _snapshot(self, snapshot: bool) -> Iterator[Optional[Dict[str, List[Any]]]]:
+        # Yields the merged sections for a transaction that asked for them, and writes back the changed ones.
+        if not snapshot:
+            yield None
+            return
+        current = {name: self.shards[name].read() for name in self._names}
+        original: Dict[str, List[Any]] = {}
+        for name in self._names:
+            for section, records in current[name].items():
+                original.setdefault(section, []).extend(records)
+        data = copy.deepcopy(original)
+        yield data
+        changed = {section: records for section, records in data.items() if original.get(section) != records}
+        if changed:
+            self._write(changed, current)
+
+    def close(self) -> None:
+        """
+        Closes every shard.
+        """
+        for shard in self.shards.values():
+            shard.close()
+
+
+def open_sharded(directory: str, shards: Optional[int] = None, branches: Optional[List[str]] = None,
+                 home: Optional[str] = None, backend: Optional[str] = None) -> ShardedStorage:
+    """
+    Opens the shards in a directory, creating the directory and its manifest the
+    first time. Once created, the manifest decides the layout and the other
+    arguments are only used to check it.
+
+    Parameters:
+        directory (str): The directory holding the shard files.
+        shards (Optional[int]): For hash routing, the number of shards (8 by default).
+        branches (Optional[List[str]]): For branch routing, the branch names; each branch gets a shard.
+        home (Optional[str]): For branch routing, the branch new records are added to.
+            Defaults to the first branch.
+        backend (Optional[str]): 'json', 'wal', 'sqlite' or 'binary' ('json' by default).
+
+    Returns:
+        ShardedStorage: The opened shards.
+
+    Raises:
+        ValueError: If the arguments disagree with the directory's manifest.
+    """
+    manifest_path = os.path.join(directory, MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as file:
+            manifest = json.load(file)
+        if branches and (manifest["routing"] != "branch" or manifest["names"] != list(branches)):
+            raise ValueError(f"{directory} does not hold the branches {', '.join(branches)}")
+        if shards and (manifest["routing"] != "hash" or len(manifest["names"]) != shards):
+            raise ValueError(f"{directory} does not hold {shards} hash shards")
+        if backend and manifest["backend"] != backend:
+            raise ValueError(f"{directory} holds {manifest['backend']} shards, not {backend}")
+    else:
+        if branches:
+            manifest = {"routing": "branch", "names": list(branches), "home": home or branches[0]}
+        else:
+            manifest = {"routing": "hash", "names": [f"shard-{i:02d}" for i in range(shards or 8)], "home": None}
+        manifest["backend"] = backend or "json"
+        os.makedirs(directory, exist_ok=True)
+        with open(manifest_path, 'w') as file:
+            json.dump(manifest, file, indent=4)
+    extension = _EXTENSIONS[manifest["backend"]]
+    filenames = {name: os.path.join(directory, name + extension) for name in manifest["names"]}
+    return ShardedStorage({name: open_storage(filename, manifest["backend"]) for name, filename in filenames.items()},
+                          manifest["routing"], home or manifest["home"], filenames, manifest["backend"])
@@ -0,0 +1,295 @@
+# sqlite_storage.py
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from metrics import timed
+from storage import StorageBackend, record_key
+
+# section -> (key column, record columns). A key column that is not one of the
+# record columns is a synthetic key that is never returned in records.
+TABLES: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "books": ("isbn", ("isbn", "title", "author", "copies")),
+    "users": ("user_id", ("user_id", "name")),
+    "checkouts": ("id", ("isbn", "user_id", "due_date")),
+    "holds": ("id", ("isbn", "user_id", "placed_date", "priority", "seq", "ready_until")),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    isbn TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    author TEXT NOT NULL,
+    copies INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_books_title ON books (title);
+CREATE INDEX IF NOT EXISTS idx_books_author ON books (author);
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_users_name ON users (name);
+
+CREATE TABLE IF NOT EXISTS checkouts (
+    id TEXT PRIMARY KEY,
+    isbn TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    due_date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_checkouts_isbn ON checkouts (isbn);
+CREATE INDEX IF NOT EXISTS idx_checkouts_user_id ON checkouts (user_id);
+CREATE INDEX IF NOT EXISTS idx_checkouts_due_date ON checkouts (due_date);
+
+CREATE TABLE IF NOT EXISTS holds (
+    id TEXT PRIMARY KEY,
+    isbn TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    placed_date TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    seq INTEGER NOT NULL,
+    ready_until TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_holds_isbn ON holds (isbn);
+CREATE INDEX IF NOT EXISTS idx_holds_user_id ON holds (user_id);
+
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Values for record columns that records written by older versions may lack.
+COLUMN_DEFAULTS: Dict[str, Any] = {"copies": 1, "priority": 0, "ready_until": None}
+
+# The schema version recorded in PRAGMA user_version.
+SCHEMA_VERSION = 2
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    Stores the library's data in a SQLite database with one table per section,
+    following the same read/write contract as Storage.
+
+    Every thread gets its own pooled connection, opened on first use. The
+    database runs in WAL mode so readers are never blocked by a writer.
+
+    Attributes:
+        filename (str): The file path for the SQLite database.
+    """
+
+    def __init__(self, filename: str = 'library_data.db', migrate_from: Optional[str] = None):
+        self.filename = filename
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._pool_lock = threading.Lock()
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        self._upgrade_schema(conn)
+        if migrate_from is not None:
+            self.migrate_from_json(migrate_from)
+
+    def _upgrade_schema(self, conn: sqlite3.Connection):
+        """
+        Brings a database created by an older version up to SCHEMA_VERSION.
+        """
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        with self._begin():
+            if version < 1:
+                columns = [row[1] for row in conn.execute("PRAGMA table_info(books)")]
+                if "copies" not in columns:
+                    conn.execute("ALTER TABLE books ADD COLUMN copies INTEGER NOT NULL DEFAULT 1")
+                # Checkouts used to be keyed by ISBN alone; they are now keyed by ISBN and user.
+                conn.execute("UPDATE checkouts SET id = isbn || ':' || user_id")
+            # Version 2 added the holds table, which SCHEMA creates.
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        logging.info("Upgraded %s to schema version %s", self.filename, SCHEMA_VERSION)
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Returns the calling thread's connection, opening it on first use.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.filename, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._pool_lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def _begin(self) -> Iterator[None]:
+        """
+        Runs a transaction on the calling thread's connection. BEGIN IMMEDIATE takes
+        the database write lock up front, so concurrent read-modify-write
+        transactions from other threads or processes wait instead of conflicting.
+        """
+        conn = self._connection()
+        depth = getattr(self._local, 'txn_depth', 0)
+        if depth == 0:
+            conn.execute("BEGIN IMMEDIATE")
+        self._local.txn_depth = depth + 1
+        try:
+            yield
+        except BaseException:
+            self._local.txn_depth = depth
+            if depth == 0:
+                conn.rollback()
+            raise
+        self._local.txn_depth = depth
+        if depth == 0:
+            conn.commit()
+
+    @contextmanager
+    def _writing(self) -> Iterator[sqlite3.Connection]:
+        """
+        Yields the connection for a write, committing it unless it is part of an
+        enclosing transaction().
+        """
+        with self._begin():
+            yield self._connection()
+
+    @staticmethod
+    def _table(section: str) -> Tuple[str, Tuple[str, ...]]:
+        if section not in TABLES:
+            raise ValueError(f"Unknown storage section: {section}")
+        return TABLES[section]
+
+    @staticmethod
+    def _insert_sql(section: str) -> str:
+        key_column, columns = TABLES[section]
+        all_columns = columns if key_column in columns else (key_column,) + columns
+        placeholders = ", ".join("?" for _ in all_columns)
+        return f"INSERT OR REPLACE INTO {section} ({', '.join(all_columns)}) VALUES ({placeholders})"
+
+    @staticmethod
+    def _row(section: str, key: str, record: Dict[str, Any]) -> Tuple[Any, ...]:
+        key_column, columns = TABLES[section]
+        values = tuple(record[column] if column in record else COLUMN_DEFAULTS[column] for column in columns)
+        return values if key_column in columns else (key,) + values
+
+    @timed("library_storage_seconds", operation="read")
+    def read(self) -> Dict[str, List[Any]]:
+        """
+        Reads every section from the database.
+
+        Returns:
+            A dictionary with keys for 'books', 'users', 'checkouts' and 'holds', each mapping to a list of items.
+        """
+        conn = self._connection()
+        data = {}
+        for section, (_, columns) in TABLES.items():
+            cursor = conn.execute(f"SELECT {', '.join(columns)} FROM {section} ORDER BY rowid")
+            data[section] = [dict(zip(columns, row)) for row in cursor]
+        return data
+
+    @timed("library_storage_seconds", operation="write")
+    def write(self, data: Dict[str, List[Any]]) -> None:
+        """
+        Replaces the given sections in a single transaction. Sections that are not
+        present in data are preserved.
+
+        Parameters:
+            data (Dict[str, List[Any]]): The sections to be replaced.
+        """
+        with self._writing() as conn:
+            self._replace_sections(conn, data)
+
+    def _replace_sections(self, conn: sqlite3.Connection, data: Dict[str, List[Any]]):
+        for section, records in data.items():
+            self._table(section)
+            conn.execute(f"DELETE FROM {section}")
+            conn.executemany(self._insert_sql(section),
+                             (self._row(section, record_key(section, r), r) for r in records))
+
+    @timed("library_storage_seconds", operation="find_record")
+    def find_record(self, section: str, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Finds a single record by key through the table's primary key.
+
+        Parameters:
+            section (str): The section the record belongs to, e.g. 'books'.
+            key (str): The key identifying the record within the section.
+
+        Returns:
+            Optional[Dict[str, Any]]: The record, or None if there is none with this key.
+        """
+        key_column, columns = self._table(section)
+        row = self._connection().execute(
+            f"SELECT {', '.join(columns)} FROM {section} WHERE {key_column} = ?", (key,)).fetchone()
+        return dict(zip(columns, row)) if row is not None else None
+
+    @timed("library_storage_seconds", operation="put_record")
+    def put_record(self, section: str, key: str, record: Dict[str, Any]) -> None:
+        """
+        Inserts or replaces a single record of a section.
+
+        Parameters:
+            section (str): The section the record belongs to, e.g. 'books'.
+            key (str): The key identifying the record within the section.
+            record (Dict[str, Any]): The record to be stored.
+        """
+        self._table(section)
+        with self._writing() as conn:
+            conn.execute(self._insert_sql(section), self._row(section, key, record))
+
+    @timed("library_storage_seconds", operation="delete_record")
+    def delete_record(self, section: str, key: str) -> None:
+        """
+        Removes a single record of a section, if present.
+
+        Parameters:
+            section (str): The section the record belongs to, e.g. 'books'.
+            key (str): The key identifying the record within the section.
+        """
+        key_column, _ = self._table(section)
+        with self._writing() as conn:
+            conn.execute(f"DELETE FROM {section} WHERE {key_column} = ?", (key,))
+
+    def migrate_from_json(self, json_filename: str) -> bool:
+        """
+        Imports the contents of a JSON data file, as written by Storage, into the
+        database. The migration runs at most once per database.
+
+        Parameters:
+            json_filename (str): The JSON data file to import.
+
+        Returns:
+            bool: True if the data was imported, False if it had already been migrated
+            or the file does not exist.
+        """
+        if self._migrated(self._connection()) or not os.path.exists(json_filename):
+            return False
+        with open(json_filename, 'r') as file:
+            data = json.load(file)
+        with self._writing() as conn:
+            # Checked again under the write lock: another process may have migrated in the meantime.
+            if self._migrated(conn):
+                return False
+            self._replace_sections(conn, {section: data.get(section, []) for section in TABLES})
+            conn.execute("INSERT INTO meta (name, value) VALUES ('migrated_from', ?)", (json_filename,))
+        logging.info("Migrated %s into %s", json_filename, self.filename)
+        return True
+
+    @staticmethod
+    def _migrated(conn: sqlite3.Connection) -> bool:
+        return conn.execute("SELECT 1 FROM meta WHERE name = 'migrated_from'").fetchone() is not None
+
+    def close(self) -> None:
+        """
+        Closes every pooled connection.
+        """
+        with self._pool_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
@@ -1,53 +1,422 @@
 # storage.py
 
+import copy
 import json
-from typing import Dict, List, Any
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Any, Optional
 import os
+import stat
+import tempfile
+import threading
 
-class Storage:
+from metrics import increment, timed
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# The fields that together identify a record within each storage section.
+SECTION_KEYS = {"books": ("isbn",), "users": ("user_id",), "checkouts": ("isbn", "user_id"),
+                "holds": ("isbn", "user_id")}
+
+
+def record_key(section: str, record: Dict[str, Any]) -> str:
+    """
+    Returns the storage key of a record within the given section. Keys made of
+    several fields join them with ':'.
+    """
+    return ":".join(record[field] for field in SECTION_KEYS[section])
+
+
+class StorageBackend:
+    """
+    The contract shared by every storage engine. Managers only rely on these
+    methods, so any engine can be passed wherever a Storage is expected.
+    """
+
+    def read(self) -> Dict[str, List[Any]]:
+        """
+        Returns a dictionary with keys for 'books', 'users', and 'checkouts', each mapping to a list of items.
+        """
+        raise NotImplementedError
+
+    def write(self, data: Dict[str, List[Any]]) -> None:
+        """
+        Replaces the given sections. Sections that are not present in data are preserved.
+        """
+        raise NotImplementedError
+
+    def put_record(self, section: str, key: str, record: Dict[str, Any]) -> None:
+        """
+        Inserts or replaces a single record of a section.
+        """
+        raise NotImplementedError
+
+    def delete_record(self, section: str, key: str) -> None:
+        """
+        Removes a single record of a section, if present.
+        """
+        raise NotImplementedError
+
+    def find_record(self, section: str, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Finds a single record by key without loading its whole section. Engines that
+        cannot do this cheaply raise NotImplementedError, and callers fall back to read().
+        """
+        raise NotImplementedError
+
+    @contextmanager
+    def _begin(self) -> Iterator[None]:
+        """
+        Holds whatever lock or database transaction makes a transaction() atomic.
+        """
+        yield
+
+    @contextmanager
+    def transaction(self, snapshot: bool = False) -> Iterator[Optional[Dict[str, List[Any]]]]:
+        """
+        Runs a transaction. Record-level calls made by the same thread inside the
+        block join it, so a batch of mutations is persisted together.
+
+        Nothing is read unless the block asks for a snapshot to modify: the data is
+        then read and copied when the transaction starts, and the sections changed
+        in it are written back when the block exits without an exception. That
+        costs a copy of every section, so batches of record-level calls should not
+        ask for one.
+
+        Parameters:
+            snapshot (bool): Whether to yield the current data for the block to modify.
+
+        Yields:
+            Optional[Dict[str, List[Any]]]: The data read at the start of the
+            transaction, or None without a snapshot.
+        """
+        with self._begin():
+            if not snapshot:
+                yield None
+                return
+            data = self.read()
+            original = copy.deepcopy(data)
+            yield data
+            changed = {section: records for section, records in data.items() if original.get(section) != records}
+            if changed:
+                self.write(changed)
+
+    def close(self) -> None:
+        """
+        Releases any resources held by the storage.
+        """
+
+
+def open_storage(filename: str = 'library_data.json', backend: Optional[str] = None) -> StorageBackend:
+    """
+    Opens the storage engine for a data file.
+
+    Parameters:
+        filename (str): The data file to open.
+        backend (Optional[str]): 'json', 'wal', 'sqlite', 'binary' or 'sharded'. When omitted,
+            files ending in .db, .sqlite or .sqlite3 use SQLite, files ending in .snap use the
+            binary snapshot format, a directory holds shards (see sharded_storage.py) and
+            anything else uses JSON.
+
+    Returns:
+        StorageBackend: The opened storage engine.
+    """
+    if backend is None:
+        if filename.endswith(('.db', '.sqlite', '.sqlite3')):
+            backend = 'sqlite'
+        elif filename.endswith('.snap'):
+            backend = 'binary'
+        elif os.path.isdir(filename):
+            backend = 'sharded'
+        else:
+            backend = 'json'
+    if backend == 'json':
+        return Storage(filename)
+    if backend == 'wal':
+        from wal_storage import WALStorage
+        return WALStorage(filename)
+    if backend == 'sqlite':
+        from sqlite_storage import SQLiteStorage
+        return SQLiteStorage(filename)
+    if backend == 'binary':
+        from binary_snapshot import BinaryStorage
+        return BinaryStorage(filename)
+    if backend == 'sharded':
+        from sharded_storage import open_sharded
+        return open_sharded(filename)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+class Storage(StorageBackend):
     """
     Manages the storage of the library's data using a JSON file.
-    Singleton pattern to ensure one instance manages the file access.
+    Singleton pattern to ensure one instance manages each file's access.
+
+    Access is serialized between threads by a lock and between processes by an
+    advisory lock on a companion '.lock' file. Writes go to a temporary file that
+    atomically replaces the data file, so a crash never leaves it half-written.
+
+    The parsed file is cached as a snapshot shared by every reader and is only
+    parsed again when the file changes on disk (its mtime, size or inode differ),
+    so managers started together parse the file once.
 
     Attributes:
         filename (str): The file path for the JSON storage file.
+        version (int): Incremented every time the cached snapshot changes.
     """
-    
-    _instance = None
+
+    _instances: Dict[str, 'Storage'] = {}
+    _instances_lock = threading.Lock()
 
     def __new__(cls, filename='library_data.json'):
-        if cls._instance is None:
-            cls._instance = super(Storage, cls).__new__(cls)
-            cls._instance.filename = filename
-            cls._instance.init_storage()
-        return cls._instance
+        path = os.path.abspath(filename)
+        with cls._instances_lock:
+            instance = cls._instances.get(path)
+            if instance is None:
+                instance = super(Storage, cls).__new__(cls)
+                instance.filename = filename
+                instance._lock = threading.RLock()
+                instance._lock_depth = 0
+                instance._lock_file = None
+                instance._txn_data = None
+                instance._txn_positions = {}
+                instance._snapshot = None
+                instance._snapshot_stamp = None
+                instance._snapshot_keys = {}
+                instance._snapshot_keys_version = None
+                instance.version = 0
+                instance.init_storage()
+                cls._instances[path] = instance
+        return instance
 
     def init_storage(self):
-        if not os.path.exists(self.filename):
-            with open(self.filename, 'w') as f:
-                json.dump({"books": [], "users": [], "checkouts": []}, f)
-       
+        with self._locked():
+            if not os.path.exists(self.filename):
+                self._write_file({"books": [], "users": [], "checkouts": []})
 
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """
+        Holds the thread lock and the inter-process file lock. Reentrant within a thread.
+        """
+        with self._lock:
+            if self._lock_depth == 0:
+                self._lock_file = open(self.filename + '.lock', 'a+')
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+                else:
+                    self._lock_file.seek(0)
+                    msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    if fcntl is not None:
+                        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+                    else:
+                        self._lock_file.seek(0)
+                        msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+                    self._lock_file.close()
+                    self._lock_file = None
+
+    def _read_file(self) -> Dict[str, List[Any]]:
+        try:
+            with open(self.filename, 'r') as file:
+                data = json.load(file)
+                increment("library_storage_bytes_read_total", os.fstat(file.fileno()).st_size)
+                return data
+        except FileNotFoundError:
+            return {"books": [], "users": [], "checkouts": []}
+
+    def _stamp(self) -> Optional[tuple]:
+        try:
+            stat = os.stat(self.filename)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def _load_snapshot(self) -> Dict[str, List[Any]]:
+        """
+        Returns the cached snapshot, parsing the file again only if it changed on disk.
+        Must be called with the lock held.
+        """
+        stamp = self._stamp()
+        if self._snapshot is None or stamp != self._snapshot_stamp:
+            self._snapshot = self._read_file()
+            self._snapshot_stamp = stamp
+            self.version += 1
+        return self._snapshot
+
+    def _cache_snapshot(self, data: Dict[str, List[Any]]):
+        """
+        Makes data, just written to the file, the cached snapshot. Must be called with the lock held.
+        """
+        self._snapshot = data
+        self._snapshot_stamp = self._stamp()
+        self.version += 1
+
+    def _write_file(self, data: Dict[str, List[Any]]):
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        fd, tmp_filename = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.filename) + '.')
+        try:
+            with os.fdopen(fd, 'w') as file:
+                # mkstemp creates the file readable by its owner only: keep the data file's own permissions.
+                if os.path.exists(self.filename):
+                    os.chmod(tmp_filename, stat.S_IMODE(os.stat(self.filename).st_mode))
+                json.dump(data, file, indent=4)
+                file.flush()
+                os.fsync(file.fileno())
+                increment("library_storage_bytes_written_total", os.fstat(file.fileno()).st_size)
+            os.replace(tmp_filename, self.filename)
+        except BaseException:
+            os.remove(tmp_filename)
+            raise
+
+    @timed("library_storage_seconds", operation="read")
     def read(self) -> Dict[str, List[Any]]:
         """
         Reads data from the JSON file. If the file does not exist, initializes the data structure.
+        The returned data is the shared snapshot and must not be modified; use
+        transaction() to change it.
 
         Returns:
             A dictionary with keys for 'books', 'users', and 'checkouts', each mapping to a list of items.
         """
-        try:
-            with open(self.filename, 'r') as file:
-                return json.load(file)
-        except FileNotFoundError:
-            return {"books": [], "users": [], "checkouts": []}
+        with self._locked():
+            if self._txn_data is not None:
+                return self._txn_data
+            return self._load_snapshot()
 
+    @timed("library_storage_seconds", operation="write")
     def write(self, data: Dict[str, List[Any]]) -> None:
         """
-        Writes the given data to the JSON file.
+        Writes the given sections to the JSON file. Sections that are not present
+        in data are preserved as they are on disk.
 
         Parameters:
             data (Dict[str, List[Any]]): The data to be written to the file.
         """
-        with open(self.filename, 'w') as file:
-            json.dump(data, file, indent=4)
+        with self.transaction() as current:
+            current.update(data)
 
+    @contextmanager
+    def transaction(self, snapshot: bool = False) -> Iterator[Dict[str, List[Any]]]:
+        """
+        Runs a read-modify-write transaction under the file lock. The data is read
+        once, every change made to it by the block (directly or through write,
+        put_record and delete_record) is applied in memory, and the file is
+        replaced once when the outermost transaction exits without an exception.
+
+        Parameters:
+            snapshot (bool): Ignored: the file is rewritten whole, so the data is always yielded.
+
+        Yields:
+            Dict[str, List[Any]]: The data read at the start of the transaction.
+        """
+        with self._locked():
+            if self._txn_data is not None:
+                yield self._txn_data
+                return
+            # Sections are copied so an aborted transaction leaves the snapshot untouched;
+            # records themselves are replaced rather than modified, so they can be shared.
+            self._txn_data = {section: list(records) for section, records in self._load_snapshot().items()}
+            try:
+                yield self._txn_data
+                self._write_file(self._txn_data)
+                self._cache_snapshot(self._txn_data)
+            finally:
+                self._txn_data = None
+                self._txn_positions = {}
+
+    def _position(self, section: str, records: List[Any], key: str) -> Optional[int]:
+        """
+        Returns the position of a record in a section during a transaction, using a
+        key -> position map built once per section so batches avoid repeated scans.
+        """
+        cached = self._txn_positions.get(section)
+        # A map only describes the list it was built for: a section replaced by write()
+        # or by assignment, or grown directly, needs a new one.
+        positions = cached[1] if cached is not None and cached[0] is records else None
+        if positions is not None and len(positions) != len(records):
+            positions = None
+        i = positions.get(key) if positions is not None else None
+        if i is not None and i < len(records) and record_key(section, records[i]) == key:
+            return i
+        if positions is None or i is not None:
+            # The map is missing or stale (the list was modified directly): rebuild it.
+            positions = {record_key(section, r): n for n, r in enumerate(records)}
+            self._txn_positions[section] = (records, positions)
+        return positions.get(key)
+
+    @timed("library_storage_seconds", operation="find_record")
+    def find_record(self, section: str, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Finds a single record by key through a key -> record map of the cached
+        snapshot, built for a section on its first lookup. A few lookups cost one
+        pass over the section, not the manager's whole load and indexing.
+
+        Parameters:
+            section (str): The section the record belongs to, e.g. 'books'.
+            key (str): The key identifying the record within the section.
+
+        Returns:
+            Optional[Dict[str, Any]]: The record, or None if there is none with this key.
+        """
+        with self._locked():
+            if self._txn_data is not None:
+                records = self._txn_data.get(section)
+                i = self._position(section, records, key) if records is not None else None
+                return records[i] if i is not None else None
+            snapshot = self._load_snapshot()
+            if self._snapshot_keys_version != self.version:
+                self._snapshot_keys, self._snapshot_keys_version = {}, self.version
+            keys = self._snapshot_keys.get(section)
+            if keys is None:
+                keys = {record_key(section, r): r for r in snapshot.get(section, [])}
+                self._snapshot_keys[section] = keys
+            return keys.get(key)
+
+    @timed("library_storage_seconds", operation="put_record")
+    def put_record(self, section: str, key: str, record: Dict[str, Any]) -> None:
+        """
+        Inserts or replaces a single record of a section.
+
+        Parameters:
+            section (str): The section the record belongs to, e.g. 'books'.
+            key (str): The key identifying the record within the section.
+            record (Dict[str, Any]): The record to be stored.
+        """
+        with self.transaction() as data:
+            records = data.setdefault(section, [])
+            i = self._position(section, records, key)
+            if i is None:
+                self._txn_positions[section][1][key] = len(records)
+                records.append(record)
+            else:
+                records[i] = record
+
+    @timed("library_storage_seconds", operation="delete_record")
+    def delete_record(self, section: str, key: str) -> None:
+        """
+        Removes a single record of a section, if present.
+
+        Parameters:
+            section (str): The section the record belongs to, e.g. 'books'.
+            key (str): The key identifying the record within the section.
+        """
+        with self.transaction() as data:
+            records = data.setdefault(section, [])
+            i = self._position(section, records, key)
+            if i is not None:
+                del records[i]
+                del self._txn_positions[section]
+
+    def close(self) -> None:
+        """
+        Releases any resources held by the storage. The JSON storage holds none.
+        """
@@ -0,0 +1,67 @@
+# tests/test_bulk_add.py
+
+import pytest
+
+from book import Book
+from book_manager import BookManager
+from storage import Storage
+from user import User
+from user_manager import UserManager
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return Storage(str(tmp_path / "library_data.json"))
+
+
+def failing_writes(storage, monkeypatch, after):
+    # Lets the first `after` writes through, then fails every write.
+    write_file = storage._write_file
+    writes = []
+
+    def write_or_fail(data):
+        if len(writes) >= after:
+            raise OSError("disk full")
+        writes.append(data)
+        write_file(data)
+    monkeypatch.setattr(storage, "_write_file", write_or_fail)
+
+
+def test_bulk_add_reports_duplicates_within_and_across_batches(storage):
+    books = BookManager(storage)
+    books.add_book(Book("Dune", "Herbert", "1"))
+    report = books.add_books_bulk([Book("Dune", "Herbert", "1"), Book("Emma", "Austen", "2"),
+                                   (7, Book("Emma", "Austen", "2")), Book("Ulysses", "Joyce", "3")], batch_size=2)
+    assert (report.added, report.duplicates) == (2, 2)
+    assert report.errors == [(None, "Duplicate key: 1"), (7, "Duplicate key: 2")]
+    assert sorted(book.isbn for book in BookManager(storage).books.values()) == ["1", "2", "3"]
+
+
+def test_books_of_a_failed_batch_are_not_added(storage, monkeypatch):
+    books = BookManager(storage)
+    batch = [Book(f"Title {i}", "Author", str(i)) for i in range(5)]
+    with monkeypatch.context() as patch:
+        failing_writes(storage, patch, after=1)
+        with pytest.raises(OSError):
+            books.add_books_bulk(batch, batch_size=2)
+    assert sorted(books.books) == ["0", "1"]
+    assert [book.isbn for book in books.find_books_by_title("title")] == ["0", "1"]
+
+    report = books.add_books_bulk(batch, batch_size=2)
+    assert (report.added, report.duplicates) == (3, 2)
+    assert sorted(book.isbn for book in BookManager(storage).books.values()) == ["0", "1", "2", "3", "4"]
+
+
+def test_users_of_a_failed_batch_are_not_added(storage, monkeypatch):
+    users = UserManager(storage)
+    batch = [User(f"Patron {i}", f"u{i}") for i in range(3)]
+    with monkeypatch.context() as patch:
+        failing_writes(storage, patch, after=0)
+        with pytest.raises(OSError):
+            users.add_users_bulk(batch)
+    assert users.users == {}
+    assert users.search_users("patron") == []
+
+    report = users.add_users_bulk(batch)
+    assert (report.added, report.duplicates) == (3, 0)
+    assert sorted(UserManager(storage).users) == ["u0", "u1", "u2"]
@@ -0,0 +1,93 @@
+# tests/test_change_feed.py
+
+import multiprocessing
+
+import pytest
+
+from change_feed import DELETE, PUT, Change, ChangeLog, VersionedStorage
+from storage import Storage
+
+WRITES = 30
+
+
+def fail_write(data):
+    raise OSError("disk full")
+
+
+def write_records(filename, writer):
+    feed = VersionedStorage(Storage(filename))
+    for i in range(WRITES):
+        feed.put_record("users", f"{writer}-{i}", {"name": f"{writer}-{i}", "user_id": f"{writer}-{i}"})
+        feed.put_record("users", "shared", {"name": f"{writer}-{i}", "user_id": "shared"})
+
+
+def test_versions_follow_commit_order_across_processes(tmp_path):
+    filename = str(tmp_path / "library_data.json")
+    VersionedStorage(Storage(filename))
+
+    writers = [multiprocessing.Process(target=write_records, args=(filename, writer)) for writer in "ab"]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+    assert [writer.exitcode for writer in writers] == [0, 0]
+
+    feed = VersionedStorage(Storage(filename))
+    changes = feed.changes_since(0)
+    assert [change.version for change in changes] == list(range(1, 4 * WRITES + 1))
+    for writer in "ab":
+        own = [change.key for change in changes if change.key.startswith(f"{writer}-")]
+        assert own == [f"{writer}-{i}" for i in range(WRITES)]
+
+    # Applying the changes in version order reproduces the stored data, including
+    # the record both processes kept overwriting.
+    replica = VersionedStorage(Storage(str(tmp_path / "replica.json")))
+    replica.apply_changes(changes)
+    assert sorted(replica.read()["users"], key=lambda user: user["user_id"]) == \
+        sorted(feed.read()["users"], key=lambda user: user["user_id"])
+    last_shared = [change for change in changes if change.key == "shared"][-1]
+    assert feed.find_record("users", "shared") == last_shared.record
+
+
+def test_changes_since_returns_only_newer_changes(tmp_path):
+    feed = VersionedStorage(Storage(str(tmp_path / "library_data.json")))
+    feed.put_record("users", "1", {"name": "Ann", "user_id": "1"})
+    version = feed.version
+    feed.put_record("users", "2", {"name": "Bob", "user_id": "2"})
+    feed.delete_record("users", "1")
+
+    changes = feed.changes_since(version)
+    assert [(change.op, change.key) for change in changes] == [(PUT, "2"), (DELETE, "1")]
+    assert feed.changes_since(feed.version) == []
+
+
+def test_compaction_is_noticed_after_the_log_grows_back(tmp_path):
+    filename = str(tmp_path / "library_data.json.changes")
+    writer, reader = ChangeLog(filename), ChangeLog(filename)
+    writer.append([Change(0, PUT, "users", "1", {"name": f"Ann {i}", "user_id": "1"}, "a") for i in range(20)])
+    assert reader.version == 20
+
+    # Compaction keeps one change; the log then grows past the size the reader indexed.
+    assert writer.compact() == 19
+    writer.append([Change(0, PUT, "users", str(i), {"name": f"User {i}", "user_id": str(i)}, "a")
+                   for i in range(2, 32)])
+
+    changes = reader.changes_since(0)
+    assert [change.version for change in changes] == [20] + list(range(21, 51))
+    assert [change.version for change in reader.changes_since(45)] == list(range(46, 51))
+
+
+def test_changes_are_discarded_when_the_storage_fails_to_commit(tmp_path, monkeypatch):
+    storage = Storage(str(tmp_path / "library_data.json"))
+    feed = VersionedStorage(storage)
+    feed.put_record("users", "1", {"name": "Ann", "user_id": "1"})
+    with monkeypatch.context() as patch:
+        patch.setattr(storage, "_write_file", fail_write)
+        with pytest.raises(OSError):
+            feed.put_record("users", "2", {"name": "Bob", "user_id": "2"})
+
+    assert storage.find_record("users", "2") is None
+    assert [change.key for change in feed.changes_since(0)] == ["1"]
+    # The discarded version is not issued again, so a replica that saw it misses nothing.
+    feed.put_record("users", "3", {"name": "Cy", "user_id": "3"})
+    assert [(change.version, change.key) for change in feed.changes_since(0)] == [(1, "1"), (3, "3")]
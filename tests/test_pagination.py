@@ -0,0 +1,100 @@
+# tests/test_pagination.py
+
+import base64
+import json
+
+import pytest
+
+from book import Book
+from book_manager import BookManager
+from pagination import encode_cursor, page, sort_field, stream
+from storage import Storage
+
+# Few distinct copy counts, so sorting by copies has many ties.
+RECORDS = [{"key": f"k{i:02}", "value": i % 4} for i in range(23)]
+
+
+def key(record):
+    return record["key"]
+
+
+def value(record):
+    return record["value"]
+
+
+def all_pages(limit, **kwargs):
+    pages, after = [], None
+    while True:
+        current = page(RECORDS, key, limit, after=after, **kwargs)
+        pages.append(current.items)
+        if current.next_cursor is None:
+            return pages
+        after = current.next_cursor
+
+
+@pytest.mark.parametrize("limit", [1, 5, 23, 50])
+@pytest.mark.parametrize("descending", [False, True])
+def test_paging_lists_every_record_once_in_order(limit, descending):
+    pages = all_pages(limit, sort=value, descending=descending)
+    listed = [record for items in pages for record in items]
+    expected = sorted(RECORDS, key=lambda record: (value(record), key(record)), reverse=descending)
+    assert listed == expected
+    assert all(len(items) == limit for items in pages[:-1])
+
+
+def test_ties_break_by_key():
+    listed = list(stream(RECORDS, key, sort=value, descending=True, limit=6))
+    assert [key(record) for record in listed] == ["k19", "k15", "k11", "k07", "k03", "k22"]
+
+
+def test_stream_offset_and_limit():
+    assert [key(record) for record in stream(RECORDS, key, offset=20)] == ["k20", "k21", "k22"]
+    listed = stream(RECORDS, key, where=lambda record: value(record) == 1, sort=key, descending=True,
+                    offset=1, limit=2)
+    assert [key(record) for record in listed] == ["k17", "k13"]
+
+
+def test_cursor_is_stable_while_records_are_added(tmp_path):
+    books = BookManager(Storage(str(tmp_path / "library_data.json")))
+    for i in range(10):
+        books.add_book(Book(f"Title {i}", "Author", f"isbn-{i}", i % 3))
+    first = books.page_books(limit=4, sort="copies")
+    # A book ordered before the cursor is not listed; one after it is.
+    books.add_book(Book("Early", "Author", "isbn-00", 0))
+    books.add_book(Book("Late", "Author", "isbn-99", 2))
+    rest, after = [], first.next_cursor
+    while after is not None:
+        current = books.page_books(limit=4, sort="copies", after=after)
+        rest.extend(current.items)
+        after = current.next_cursor
+    assert [book.isbn for book in first.items] == ["isbn-0", "isbn-3", "isbn-6", "isbn-9"]
+    assert [book.isbn for book in rest] == ["isbn-1", "isbn-4", "isbn-7", "isbn-2", "isbn-5", "isbn-8", "isbn-99"]
+
+
+def test_cursor_is_rejected_for_another_sort(tmp_path):
+    books = BookManager(Storage(str(tmp_path / "library_data.json")))
+    for i in range(5):
+        books.add_book(Book(f"Title {i}", "Author", f"isbn-{i}", i))
+    cursor = books.page_books(limit=2, sort="title").next_cursor
+    assert books.page_books(limit=2, sort="title", after=cursor).items
+    for sort in ("copies", "author", None):
+        with pytest.raises(ValueError, match="invalid cursor"):
+            books.page_books(limit=2, sort=sort, after=cursor)
+    with pytest.raises(ValueError, match="Cannot sort by"):
+        books.page_books(limit=2, sort="pages")
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    base64.urlsafe_b64encode(b"not json").decode('ascii'),
+    base64.urlsafe_b64encode(json.dumps(["field"]).encode('utf-8')).decode('ascii'),
+])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError, match="invalid cursor"):
+        page(RECORDS, key, 5, sort=value, after=cursor)
+
+
+def test_forged_cursor_with_an_incomparable_value_is_rejected():
+    cursor = encode_cursor((["a list"], "k00"), sort_field(value))
+    with pytest.raises(ValueError, match="invalid cursor"):
+        page(RECORDS, key, 5, sort=value, after=cursor)
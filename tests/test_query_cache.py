@@ -0,0 +1,90 @@
+# tests/test_query_cache.py
+
+import pytest
+
+from book import Book
+from book_manager import BookManager
+from query_cache import QueryCache
+from storage import Storage
+
+
+@pytest.fixture
+def books(tmp_path):
+    books = BookManager(Storage(str(tmp_path / "library_data.json")))
+    books.add_book(Book("The Hobbit", "Tolkien", "1"))
+    books.add_book(Book("Dune", "Herbert", "2"))
+    return books
+
+
+def isbns(results):
+    return [(book if isinstance(book, Book) else book[0]).isbn for book in results]
+
+
+def test_repeated_searches_are_served_from_the_cache(books):
+    for _ in range(3):
+        assert isbns(books.find_books_by_title("hobbit")) == ["1"]
+        assert isbns(books.search_books("dune")) == ["2"]
+        assert isbns(books.fuzzy_search_books("hobit")) == ["1"]
+    stats = books.query_cache.stats()
+    assert (stats["misses"], stats["hits"], stats["size"]) == (3, 6, 3)
+
+
+def test_adding_a_book_drops_the_cached_searches(books):
+    assert isbns(books.find_books_by_title("hobbit")) == ["1"]
+    assert isbns(books.search_books("hobbit")) == ["1"]
+    assert isbns(books.fuzzy_search_books("hobit")) == ["1"]
+    generation = books.query_cache.stats()["generation"]
+
+    books.add_book(Book("The Hobbit Companion", "Day", "3"))
+    assert books.query_cache.stats()["generation"] > generation
+    assert len(books.query_cache) == 0
+    assert isbns(books.find_books_by_title("hobbit")) == ["1", "3"]
+    assert isbns(books.search_books("hobbit")) == ["1", "3"]
+    assert isbns(books.fuzzy_search_books("hobit")) == ["1", "3"]
+
+
+def test_updating_a_book_drops_the_cached_searches(books):
+    assert isbns(books.find_books_by_title("dune")) == ["2"]
+    assert isbns(books.search_books("messiah")) == []
+    assert isbns(books.fuzzy_search_books("mesiah")) == []
+
+    assert books.update_book("2", title="Dune Messiah")
+    assert isbns(books.find_books_by_title("dune")) == ["2"]
+    assert books.find_books_by_title("dune")[0].title == "Dune Messiah"
+    assert isbns(books.search_books("messiah")) == ["2"]
+    assert isbns(books.fuzzy_search_books("mesiah")) == ["2"]
+
+    assert books.update_book("2", title="Children of Dune")
+    assert isbns(books.search_books("messiah")) == []
+    assert isbns(books.find_books_by_title("children")) == ["2"]
+
+
+def test_deleting_a_book_drops_the_cached_searches(books):
+    assert isbns(books.search_books("hobbit")) == ["1"]
+    assert books.delete_book("1")
+    assert isbns(books.search_books("hobbit")) == []
+    assert isbns(books.fuzzy_search_books("hobit")) == []
+
+
+def test_a_result_computed_across_an_invalidation_is_not_cached():
+    cache = QueryCache("test")
+
+    def compute():
+        cache.invalidate()
+        return "stale"
+    assert cache.get_or_compute("key", compute) == "stale"
+    assert cache.get_or_compute("key", lambda: "fresh") == "fresh"
+
+
+def test_least_recently_used_results_are_evicted_and_expired():
+    now = [0.0]
+    cache = QueryCache("test", max_size=2, ttl=10, clock=lambda: now[0])
+    cache.get_or_compute("a", lambda: 1)
+    cache.get_or_compute("b", lambda: 2)
+    cache.get_or_compute("a", lambda: None)
+    cache.get_or_compute("c", lambda: 3)
+    assert cache.get_or_compute("b", lambda: "recomputed") == "recomputed"
+    now[0] = 11
+    assert cache.get_or_compute("c", lambda: "expired") == "expired"
+    stats = cache.stats()
+    assert (stats["evictions"], stats["expirations"]) == (2, 1)
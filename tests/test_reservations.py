@@ -0,0 +1,110 @@
+# tests/test_reservations.py
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from book import Book
+from book_manager import BookManager
+from checkout_manager import CheckoutManager
+from reservation_manager import DEFAULT_PICKUP_DAYS, ReservationManager
+from storage import Storage
+from user import User
+from user_manager import UserManager
+
+ISBN = "978-1"
+
+
+@pytest.fixture
+def library(tmp_path):
+    storage = Storage(str(tmp_path / "library_data.json"))
+    reservations = ReservationManager(storage)
+    books = BookManager(storage, reservations=reservations)
+    users = UserManager(storage, reservations=reservations)
+    books.add_book(Book("Dune", "Herbert", ISBN))
+    for i in range(5):
+        users.add_user(User(f"Patron {i}", f"u{i}"))
+    checkouts = CheckoutManager(storage, book_manager=books, user_manager=users, reservations=reservations)
+    # The only copy is out, so every hold placed waits.
+    assert checkouts.checkout_book("u0", ISBN)
+    return books, users, checkouts, reservations
+
+
+def ready(reservations):
+    return [hold.user_id for hold in reservations.waitlist(ISBN) if hold.ready]
+
+
+def test_checkin_serves_holds_first_come_first_served(library):
+    _, _, checkouts, reservations = library
+    for user_id in ("u1", "u2", "u3"):
+        checkouts.place_hold(user_id, ISBN)
+
+    assert checkouts.checkin_book(ISBN, "u0")
+    assert ready(reservations) == ["u1"]
+    # The copy is set aside: only the hold's user can take it.
+    assert not checkouts.checkout_book("u2", ISBN)
+    assert checkouts.checkout_book("u1", ISBN)
+    assert checkouts.checkin_book(ISBN, "u1")
+    assert ready(reservations) == ["u2"]
+
+
+def test_cancelled_ready_hold_passes_the_copy_on(library):
+    _, _, checkouts, reservations = library
+    for user_id in ("u1", "u2"):
+        checkouts.place_hold(user_id, ISBN)
+    checkouts.checkin_book(ISBN, "u0")
+
+    assert checkouts.cancel_hold("u1", ISBN)
+    assert ready(reservations) == ["u2"]
+    assert reservations.find_hold(ISBN, "u1") is None
+
+
+def test_expired_hold_promotes_the_next_patron(library):
+    _, _, checkouts, reservations = library
+    for user_id in ("u1", "u2"):
+        checkouts.place_hold(user_id, ISBN)
+    checkouts.checkin_book(ISBN, "u0")
+
+    assert checkouts.process_expired_holds(datetime.now()) == []
+    expired = checkouts.process_expired_holds(datetime.now() + timedelta(days=DEFAULT_PICKUP_DAYS, hours=1))
+    assert [hold.user_id for hold in expired] == ["u1"]
+    assert ready(reservations) == ["u2"]
+
+
+def test_position_counts_only_live_holds_ahead(library):
+    _, _, checkouts, reservations = library
+    for user_id in ("u1", "u2", "u3"):
+        checkouts.place_hold(user_id, ISBN)
+    assert [reservations.position(user_id, ISBN) for user_id in ("u1", "u2", "u3")] == [1, 2, 3]
+
+    checkouts.place_hold("u4", ISBN, priority=1)
+    checkouts.cancel_hold("u2", ISBN)
+    assert [reservations.position(user_id, ISBN) for user_id in ("u4", "u1", "u3")] == [1, 2, 3]
+    assert reservations.position("u2", ISBN) is None
+
+    checkouts.checkin_book(ISBN, "u0")
+    assert reservations.position("u4", ISBN) is None  # ready, no longer waiting
+    assert reservations.position("u3", ISBN) == 2
+
+
+def test_deleting_a_book_removes_its_holds(library):
+    books, _, checkouts, reservations = library
+    for user_id in ("u1", "u2"):
+        checkouts.place_hold(user_id, ISBN)
+
+    assert books.delete_book(ISBN)
+    assert reservations.waitlist(ISBN) == []
+    assert ReservationManager(reservations.storage).holds == {}
+
+
+def test_deleting_a_user_passes_their_ready_copy_on(library):
+    _, users, checkouts, reservations = library
+    for user_id in ("u1", "u2", "u3"):
+        checkouts.place_hold(user_id, ISBN)
+    checkouts.checkin_book(ISBN, "u0")
+
+    assert users.delete_user("u1")
+    assert reservations.find_hold(ISBN, "u1") is None
+    assert ready(reservations) == ["u2"]
+    assert users.delete_user("u3")
+    assert [hold.user_id for hold in reservations.waitlist(ISBN)] == ["u2"]
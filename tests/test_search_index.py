@@ -0,0 +1,73 @@
+# tests/test_search_index.py
+
+import random
+
+import pytest
+
+from search_index import FuzzyIndex
+
+TITLES = {
+    "1": "Harry Potter and the Philosopher's Stone Rowling",
+    "2": "The Hobbit Tolkien",
+    "3": "The Lord of the Rings Tolkien",
+    "4": "Dune Herbert",
+    "5": "Harry Potter and the Chamber of Secrets Rowling",
+}
+
+
+@pytest.fixture
+def index():
+    index = FuzzyIndex()
+    for key, text in TITLES.items():
+        index.add(key, text)
+    return index
+
+
+def trigram_similarity(a, b):
+    grams_a, grams_b = FuzzyIndex._grams_of(a), FuzzyIndex._grams_of(b)
+    return len(grams_a & grams_b) / len(grams_a | grams_b)
+
+
+@pytest.mark.parametrize("typo, word", [("rowlng", "rowling"), ("hobit", "hobbit"), ("tolkein", "tolkien"),
+                                        ("dunes", "dune"), ("potterr", "potter"), ("herbrt", "herbert")])
+def test_one_edit_typo_matches_the_word(index, typo, word):
+    assert word in [similar for similar, _ in index.similar_words(typo)]
+
+
+def test_exact_matches_rank_first_and_ties_keep_index_order(index):
+    results = index.search("harry potter rowling")
+    assert results[:2] == [("1", 1.0), ("5", 1.0)]
+    assert all(score < 1.0 for _, score in results[2:])
+
+    typo_results = index.search("hary poter")
+    assert [key for key, _ in typo_results] == ["1", "5"]
+    assert typo_results[0][1] == typo_results[1][1] < 1.0
+
+
+def test_closer_spelling_scores_higher(index):
+    scores = [dict(index.similar_words(query)).get("hobbit", 0.0) for query in ("hobbit", "hobit", "hobbt", "hbit")]
+    assert scores == sorted(scores, reverse=True)
+    assert scores[0] == 1.0 > scores[1]
+
+
+def test_pruned_candidates_score_like_a_full_scan():
+    rng = random.Random(7)
+    letters = "abcdefghij"
+    words = {"".join(rng.choice(letters) for _ in range(rng.randint(2, 9))) for _ in range(400)}
+    index = FuzzyIndex(threshold=0.3)
+    for i, word in enumerate(sorted(words)):
+        index.add(str(i), word)
+
+    for _ in range(200):
+        query = "".join(rng.choice(letters) for _ in range(rng.randint(1, 10)))
+        expected = sorted(((word, trigram_similarity(query, word)) for word in words
+                           if trigram_similarity(query, word) >= 0.3), key=lambda item: (-item[1], item[0]))
+        assert index.similar_words(query) == pytest.approx(expected)
+
+
+def test_removed_words_stop_matching(index):
+    assert index.search("dune")
+    index.remove("4")
+    assert index.search("dune") == []
+    index.update("2", "The Hobbit Tolkien Dune")
+    assert [key for key, _ in index.search("dune")] == ["2"]
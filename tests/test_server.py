@@ -0,0 +1,109 @@
+# tests/test_server.py
+
+import asyncio
+import json
+import threading
+
+import pytest
+
+import server
+from book_manager import BookManager
+from checkout_manager import CheckoutManager
+from reservation_manager import ReservationManager
+from storage import Storage
+from user_manager import UserManager
+
+
+@pytest.fixture
+def library_server(tmp_path):
+    storage = Storage(str(tmp_path / "library_data.json"))
+    reservations = ReservationManager(storage)
+    book_manager = BookManager(storage, reservations=reservations)
+    user_manager = UserManager(storage, reservations=reservations)
+    checkout_manager = CheckoutManager(storage, book_manager=book_manager, user_manager=user_manager,
+                                       reservations=reservations)
+    return server.LibraryServer(book_manager, user_manager, checkout_manager)
+
+
+async def request(port, method, target, body=None, headers=""):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    payload = json.dumps(body).encode('utf-8') if body is not None else b''
+    if body is not None:
+        headers += f"Content-Length: {len(payload)}\r\n"
+    writer.write(f"{method} {target} HTTP/1.1\r\n{headers}Connection: close\r\n\r\n".encode('latin-1') + payload)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(content)
+
+
+def run(library_server, scenario):
+    async def main():
+        listener = await library_server.start('127.0.0.1', 0)
+        try:
+            return await scenario(listener.sockets[0].getsockname()[1])
+        finally:
+            listener.close()
+            for task in (library_server._writer_task, library_server._expiry_task):
+                if task is not None:
+                    task.cancel()
+    return asyncio.run(main())
+
+
+def test_routes_decode_captured_keys_after_matching(library_server):
+    async def scenario(port):
+        book = {"title": "Dune", "author": "Herbert", "isbn": "SN/42"}
+        assert await request(port, "POST", "/books", book) == (201, dict(book, copies=1))
+        assert await request(port, "GET", "/books/SN%2F42") == (200, dict(book, copies=1))
+        assert (await request(port, "GET", "/books/SN/42"))[0] == 404
+        assert (await request(port, "PATCH", "/books/SN%2F42"))[0] == 405
+    run(library_server, scenario)
+
+
+@pytest.mark.parametrize("length", ["-5", "abc"])
+def test_bad_content_length_is_rejected(library_server, length):
+    async def scenario(port):
+        return await request(port, "POST", "/books", headers=f"Content-Length: {length}\r\n")
+    assert run(library_server, scenario) == (400, {"error": "Invalid Content-Length"})
+
+
+def test_writes_are_applied_off_the_event_loop(library_server, monkeypatch):
+    threads = []
+    add_book = library_server.book_manager.add_book
+
+    def recording_add_book(book):
+        threads.append(threading.current_thread())
+        return add_book(book)
+
+    monkeypatch.setattr(library_server.book_manager, "add_book", recording_add_book)
+
+    async def scenario(port):
+        results = await asyncio.gather(*(request(port, "POST", "/books", {"title": f"T{i}", "author": "A",
+                                                                            "isbn": str(i)}) for i in range(5)))
+        assert [status for status, _ in results] == [201] * 5
+        status, books = await request(port, "GET", "/books?sort=isbn")
+        assert status == 200 and [book["isbn"] for book in books] == [str(i) for i in range(5)]
+    run(library_server, scenario)
+    assert threads and threading.main_thread() not in threads
+
+
+def test_hold_expiry_survives_a_failure(library_server, monkeypatch):
+    monkeypatch.setattr(server, "HOLD_EXPIRY_INTERVAL", 0.01)
+    reservations = library_server.checkout_manager.reservations
+    calls = []
+    next_expiry = reservations.next_expiry
+
+    def failing_once():
+        calls.append(None)
+        if len(calls) == 1:
+            raise OSError("storage unavailable")
+        return next_expiry()
+
+    monkeypatch.setattr(reservations, "next_expiry", failing_once)
+
+    async def scenario(port):
+        await asyncio.sleep(0.2)
+        assert not library_server._expiry_task.done()
+    run(library_server, scenario)
+    assert len(calls) > 2
@@ -0,0 +1,42 @@
+# tests/test_sharded_storage.py
+
+import pytest
+
+from sharded_storage import open_sharded
+
+
+def book(isbn):
+    return {"title": f"Title {isbn}", "author": "Author", "isbn": isbn, "copies": 1}
+
+
+def test_snapshot_transaction_writes_changes_back_to_their_shards(tmp_path):
+    storage = open_sharded(str(tmp_path / "shards"), shards=4)
+    storage.write({"books": [book(str(i)) for i in range(10)]})
+
+    with storage.transaction(snapshot=True) as data:
+        data["books"].append(book("10"))
+        data["books"] = [record for record in data["books"] if record["isbn"] != "3"]
+        data["books"][0]["copies"] = 5
+
+    assert sorted(record["isbn"] for record in storage.read()["books"]) == sorted(str(i) for i in range(11) if i != 3)
+    assert storage.find_record("books", "10") == book("10")
+    assert storage.find_record("books", "3") is None
+    assert sum(record["copies"] for record in storage.read()["books"]) == 14
+
+
+def test_failed_snapshot_transaction_changes_nothing(tmp_path):
+    storage = open_sharded(str(tmp_path / "shards"), shards=4)
+    storage.write({"books": [book(str(i)) for i in range(4)]})
+    with pytest.raises(RuntimeError):
+        with storage.transaction(snapshot=True) as data:
+            data["books"].clear()
+            raise RuntimeError
+    assert len(storage.read()["books"]) == 4
+
+
+def test_transaction_without_snapshot_yields_nothing(tmp_path):
+    storage = open_sharded(str(tmp_path / "shards"), shards=2)
+    with storage.transaction() as data:
+        assert data is None
+        storage.put_record("books", "1", book("1"))
+    assert storage.find_record("books", "1") == book("1")
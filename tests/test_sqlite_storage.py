@@ -0,0 +1,29 @@
+# tests/test_sqlite_storage.py
+
+import json
+
+from sqlite_storage import SQLiteStorage
+
+
+def test_migration_is_rechecked_under_the_write_lock(tmp_path, monkeypatch):
+    source = tmp_path / "library_data.json"
+    source.write_text(json.dumps({"books": [{"title": "T", "author": "A", "isbn": "1", "copies": 1}]}))
+    database = str(tmp_path / "library_data.db")
+    first, second = SQLiteStorage(database), SQLiteStorage(database)
+
+    # The second process checked before the first migrated, and only then takes the write lock.
+    checks = []
+
+    def stale_first_check(conn):
+        checks.append(conn)
+        return False if len(checks) == 1 else SQLiteStorage._migrated(conn)
+
+    monkeypatch.setattr(second, "_migrated", stale_first_check)
+    assert first.migrate_from_json(str(source))
+    first.put_record("books", "2", {"title": "U", "author": "A", "isbn": "2", "copies": 1})
+
+    assert not second.migrate_from_json(str(source))
+    assert len(checks) == 2
+    assert sorted(book["isbn"] for book in second.read()["books"]) == ["1", "2"]
+    first.close()
+    second.close()
@@ -0,0 +1,43 @@
+# tests/test_storage.py
+
+import multiprocessing
+
+from storage import Storage
+
+INCREMENTS = 50
+
+
+def increment_counter(filename):
+    storage = Storage(filename)
+    for _ in range(INCREMENTS):
+        with storage.transaction():
+            counter = storage.find_record("users", "counter")
+            storage.put_record("users", "counter", {"name": str(int(counter["name"]) + 1), "user_id": "counter"})
+
+
+def test_transactions_are_serialized_across_processes(tmp_path):
+    filename = str(tmp_path / "library_data.json")
+    Storage(filename).put_record("users", "counter", {"name": "0", "user_id": "counter"})
+
+    workers = [multiprocessing.Process(target=increment_counter, args=(filename,)) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert [worker.exitcode for worker in workers] == [0, 0]
+    # Every read-modify-write saw the other process's committed increments.
+    assert Storage(filename).find_record("users", "counter")["name"] == str(2 * INCREMENTS)
+
+
+def test_aborted_transaction_leaves_file_unchanged(tmp_path):
+    filename = str(tmp_path / "library_data.json")
+    storage = Storage(filename)
+    storage.put_record("users", "1", {"name": "Ann", "user_id": "1"})
+    try:
+        with storage.transaction():
+            storage.delete_record("users", "1")
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert storage.read()["users"] == [{"name": "Ann", "user_id": "1"}]
@@ -0,0 +1,81 @@
+# tests/test_wal_storage.py
+
+import json
+import os
+
+import pytest
+
+from wal_storage import WALStorage
+
+
+def book(isbn):
+    return {"title": f"Title {isbn}", "author": "Author", "isbn": isbn, "copies": 1}
+
+
+def isbns(storage):
+    return sorted(record["isbn"] for record in storage.read()["books"])
+
+
+def fail_snapshot(state):
+    raise OSError("disk full")
+
+
+@pytest.fixture
+def filename(tmp_path):
+    return str(tmp_path / "library_data.json")
+
+
+def test_replay_stops_at_torn_line_and_keeps_later_appends(filename):
+    storage = WALStorage(filename)
+    storage.put_record("books", "1", book("1"))
+    storage.put_record("books", "2", book("2"))
+    storage.close()
+    # A crash mid-append leaves a partial final line.
+    with open(filename + '.wal', 'a', encoding='utf-8') as log:
+        log.write('{"op":"put","s":"books","k":"3","r":{"ti')
+
+    storage = WALStorage(filename)
+    assert isbns(storage) == ["1", "2"]
+    storage.put_record("books", "4", book("4"))
+    storage.close()
+
+    storage = WALStorage(filename)
+    assert isbns(storage) == ["1", "2", "4"]
+    storage.close()
+
+
+def test_interrupted_compaction_is_finished_on_recovery(filename, monkeypatch):
+    storage = WALStorage(filename)
+    storage.put_record("books", "1", book("1"))
+    monkeypatch.setattr(storage, "_write_snapshot", fail_snapshot)
+    with pytest.raises(OSError):
+        storage.compact()
+    assert os.path.exists(filename + '.wal.compacting')
+    storage.put_record("books", "2", book("2"))
+    storage.delete_record("books", "1")
+    storage.close()
+
+    storage = WALStorage(filename)
+    assert isbns(storage) == ["2"]
+    assert not os.path.exists(filename + '.wal.compacting')
+    storage.close()
+    with open(filename, encoding='utf-8') as file:
+        assert [record["isbn"] for record in json.load(file)["books"]] == ["2"]
+
+
+def test_failed_compaction_is_retried(filename, monkeypatch):
+    storage = WALStorage(filename)
+    storage.put_record("books", "1", book("1"))
+    with monkeypatch.context() as patch:
+        patch.setattr(storage, "_write_snapshot", fail_snapshot)
+        with pytest.raises(OSError):
+            storage.compact()
+    storage.put_record("books", "2", book("2"))
+    storage.compact()
+    assert not os.path.exists(filename + '.wal.compacting')
+    assert os.path.getsize(filename + '.wal') == 0
+    storage.close()
+
+    storage = WALStorage(filename)
+    assert isbns(storage) == ["1", "2"]
+    storage.close()
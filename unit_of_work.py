@@ -0,0 +1,209 @@
+# unit_of_work.py
+
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from metrics import increment, timed
+from storage import StorageBackend
+
+DURABILITY_MODES = ("immediate", "group", "deferred")
+
+_DELETED = object()
+
+
+class UnitOfWork(StorageBackend):
+    """
+    Wraps a storage engine, collecting the records the managers change and
+    writing them in one storage transaction instead of one write per change.
+
+    Durability modes:
+        immediate: every change is written before the call returns.
+        group: changes are flushed every flush_interval seconds by a background
+            thread, or as soon as max_pending records are dirty.
+        deferred: changes are only flushed by flush(), at the end of a batch(),
+            or when the process exits.
+
+    A UnitOfWork can be passed to the managers wherever a storage is expected.
+
+    Attributes:
+        storage (StorageBackend): The wrapped storage engine.
+        durability (str): One of 'immediate', 'group' or 'deferred'.
+        flush_interval (float): Seconds between background flushes in 'group' mode.
+        max_pending (int): Number of dirty records that forces a flush in 'group' mode.
+    """
+
+    def __init__(self, storage: StorageBackend, durability: str = "group", flush_interval: float = 1.0,
+                 max_pending: int = 1000):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode: {durability}")
+        self.storage = storage
+        self.durability = durability
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._lock = threading.RLock()
+        self._pending: Dict[Tuple[str, str], Any] = {}
+        self._local = threading.local()
+
+        self._stop = threading.Event()
+        self._worker = None
+        if durability == "group":
+            self._worker = threading.Thread(target=self._run, name='unit-of-work', daemon=True)
+            self._worker.start()
+        atexit.register(self.close)
+
+    def _batch_depth(self) -> int:
+        return getattr(self._local, 'batch_depth', 0)
+
+    def _in_transaction(self) -> bool:
+        return getattr(self._local, 'txn_depth', 0) > 0
+
+    @property
+    def pending(self) -> int:
+        """
+        The number of dirty records waiting to be flushed.
+        """
+        return len(self._pending)
+
+    def _mark(self, section: str, key: str, record: Any):
+        with self._lock:
+            self._pending[(section, key)] = record
+            if self._batch_depth():
+                return
+            if self.durability == "immediate" or (self.durability == "group" and len(self._pending) >= self.max_pending):
+                self.flush()
+
+    def put_record(self, section: str, key: str, record: Dict[str, Any]) -> None:
+        """
+        Marks a record as changed.
+
+        Parameters:
+            section (str): The section the record belongs to, e.g. 'books'.
+            key (str): The key identifying the record within the section.
+            record (Dict[str, Any]): The record to be stored.
+        """
+        if self._in_transaction():
+            self.storage.put_record(section, key, record)
+        else:
+            self._mark(section, key, record)
+
+    def delete_record(self, section: str, key: str) -> None:
+        """
+        Marks a record as deleted.
+
+        Parameters:
+            section (str): The section the record belongs to, e.g. 'books'.
+            key (str): The key identifying the record within the section.
+        """
+        if self._in_transaction():
+            self.storage.delete_record(section, key)
+        else:
+            self._mark(section, key, _DELETED)
+
+    def find_record(self, section: str, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Finds a single record by key, seeing changes that have not been flushed yet.
+        Raises NotImplementedError if the wrapped storage cannot look records up.
+        """
+        with self._lock:
+            record = self._pending.get((section, key))
+            if record is not None:
+                return None if record is _DELETED else record
+            return self.storage.find_record(section, key)
+
+    @timed("library_unit_of_work_flush_seconds")
+    def flush(self) -> int:
+        """
+        Writes every dirty record to the storage in a single transaction.
+
+        Returns:
+            int: The number of records written.
+        """
+        with self._lock:
+            if not self._pending:
+                return 0
+            pending, self._pending = self._pending, {}
+            try:
+                with self.storage.transaction():
+                    for (section, key), record in pending.items():
+                        if record is _DELETED:
+                            self.storage.delete_record(section, key)
+                        else:
+                            self.storage.put_record(section, key, record)
+            except BaseException:
+                # Keep the changes dirty, behind anything marked since, so they are retried.
+                pending.update(self._pending)
+                self._pending = pending
+                raise
+        increment("library_unit_of_work_records_flushed_total", len(pending))
+        logging.info("Flushed %s changes to storage.", len(pending))
+        return len(pending)
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """
+        Defers flushing until the block exits, then flushes everything it changed
+        (unless the durability mode is 'deferred').
+        """
+        self._local.batch_depth = self._batch_depth() + 1
+        try:
+            yield
+        finally:
+            self._local.batch_depth -= 1
+        if not self._batch_depth() and self.durability != "deferred":
+            self.flush()
+
+    def read(self) -> Dict[str, List[Any]]:
+        """
+        Flushes any dirty records and reads every section from the storage.
+        """
+        self.flush()
+        return self.storage.read()
+
+    def write(self, data: Dict[str, List[Any]]) -> None:
+        """
+        Flushes any dirty records and replaces the given sections in the storage.
+        """
+        with self._lock:
+            self.flush()
+            self.storage.write(data)
+
+    @contextmanager
+    def transaction(self, snapshot: bool = False) -> Iterator[Optional[Dict[str, List[Any]]]]:
+        """
+        Flushes any dirty records and runs a transaction on the storage. Record-level
+        calls made inside it go straight to the storage transaction.
+
+        Parameters:
+            snapshot (bool): Whether the storage should yield its data for the block to modify.
+        """
+        with self._lock:
+            self.flush()
+            with self.storage.transaction(snapshot) as data:
+                self._local.txn_depth = getattr(self._local, 'txn_depth', 0) + 1
+                try:
+                    yield data
+                finally:
+                    self._local.txn_depth -= 1
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error("Background flush failed: %s", e)
+
+    def close(self) -> None:
+        """
+        Stops the background flusher, flushes any dirty records and closes the storage.
+        """
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        if self._worker is not None:
+            self._worker.join()
+        self.flush()
+        self.storage.close()
+        atexit.unregister(self.close)
@@ -8,7 +8,9 @@ class User:
         name (str): The name of the user.
         user_id (str): A unique identifier for the user.
     """
-    
+
+    __slots__ = ("name", "user_id")
+
     def __init__(self, name: str, user_id: str):
         self.name = name
         self.user_id = user_id
@@ -1,38 +1,70 @@
 # user_manager.py
 
-from typing import List, Optional
-from storage import Storage
+from operator import attrgetter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from storage import StorageBackend
 from user import User
+from bulk_import import ImportReport
+from metrics import timed
+from pagination import Page, page, print_lines, sort_key, stream
+from query_cache import QueryCache
+from reservation_manager import ReservationManager
+from search_index import FuzzyIndex, InvertedIndex, tokenize
 import logging
 
+# The fields users can be listed in order of, mapped to the User attributes holding them.
+USER_SORT_FIELDS = {"name": "name", "user_id": "user_id"}
+USER_KEY = attrgetter("user_id")
+
 class UserManager:
     """
     Manages the collection of users in the library, handling operations such as
     adding, updating, deleting, and searching for users.
 
     Attributes:
-        storage (Storage): Storage handler for data persistence.
+        storage (StorageBackend): Storage handler for data persistence.
+        users (Dict[str, User]): The registered users, indexed by user ID.
+        query_cache (QueryCache): The results of recent searches, dropped whenever a user changes.
+        reservations (Optional[ReservationManager]): The waitlists a deleted user's holds are removed from.
     """
 
-    def __init__(self, storage: Storage):
+    def __init__(self, storage: StorageBackend, query_cache: Optional[QueryCache] = None,
+                 reservations: Optional[ReservationManager] = None):
         self.storage = storage
-        self.users = self.load_users()
+        self.query_cache = query_cache if query_cache is not None else QueryCache("users")
+        self.reservations = reservations
+        # The users and their name index are loaded on first access.
+        self._users: Optional[Dict[str, User]] = None
+
+    @property
+    def users(self) -> Dict[str, User]:
+        if self._users is None:
+            users = self.load_users()
+            self._name_index = InvertedIndex()
+            self._fuzzy_index = FuzzyIndex()
+            for user in users.values():
+                self._name_index.add(user.user_id, user.name)
+                self._fuzzy_index.add(user.user_id, user.name)
+            self._users = users
+        return self._users
 
-    def load_users(self) -> List[User]:
+    @timed("library_manager_seconds", manager="users", operation="load_users")
+    def load_users(self) -> Dict[str, User]:
         """
-        Loads users from the storage.
+        Loads users from the storage, indexed by user ID.
         """
         user_data = self.storage.read().get("users", [])
-        return [User(**data) for data in user_data]
+        return {data["user_id"]: User(**data) for data in user_data}
 
     def save_users(self):
         """
         Saves the current list of users back to storage.
         """
-        user_data = [user.to_dict() for user in self.users]
+        user_data = [user.to_dict() for user in self.users.values()]
         self.storage.write({"users": user_data})
         logging.info("Users have been successfully saved to storage.")
 
+    @timed("library_manager_seconds", manager="users", operation="add_user")
     def add_user(self, user: User) -> bool:
         """
         Adds a new user to the library if there is no user with the same user ID already present.
@@ -43,14 +75,71 @@ class UserManager:
         Returns:
             bool: True if the user was added, False otherwise.
         """
-        if any(u.user_id == user.user_id for u in self.users):
-            logging.warning(f"Attempted to add a user with duplicate ID: {user.user_id}")
+        if user.user_id in self.users:
+            logging.warning("Attempted to add a user with duplicate ID: %s", user.user_id)
             return False
-        self.users.append(user)
-        self.save_users()
-        logging.info(f"User added: {user.name}, ID: {user.user_id}")
+        self.users[user.user_id] = user
+        self._name_index.add(user.user_id, user.name)
+        self._fuzzy_index.add(user.user_id, user.name)
+        self.query_cache.invalidate()
+        self.storage.put_record("users", user.user_id, user.to_dict())
+        logging.info("User added: %s, ID: %s", user.name, user.user_id)
         return True
 
+    @timed("library_manager_seconds", manager="users", operation="add_users_bulk")
+    def add_users_bulk(self, users: Iterable[User], batch_size: int = 1000,
+                       progress: Optional[Callable[[int], None]] = None,
+                       report: Optional[ImportReport] = None) -> ImportReport:
+        """
+        Adds many users, skipping any whose user ID already exists. The users are
+        consumed lazily and persisted once per batch.
+
+        Parameters:
+            users (Iterable[Union[User, Tuple[Optional[int], User]]]): The users to be added, alone
+                or as (row number, user) pairs from an import file so duplicates are reported by row.
+            batch_size (int): The number of users persisted together.
+            progress (Optional[Callable[[int], None]]): Called with the number of users processed after each batch.
+            report (Optional[ImportReport]): A report to record the outcome in; a new one is created if omitted.
+
+        Returns:
+            ImportReport: The number of users added and the duplicates skipped.
+        """
+        report = report if report is not None else ImportReport()
+        processed = 0
+        # The users of the current batch, added to the library once they are persisted.
+        batch: Dict[str, User] = {}
+        for user in users:
+            row, user = user if isinstance(user, tuple) else (None, user)
+            processed += 1
+            if user.user_id in self.users or user.user_id in batch:
+                report.duplicate(row, user.user_id)
+            else:
+                batch[user.user_id] = user
+            if processed % batch_size == 0:
+                self._save_batch(batch, report)
+                batch = {}
+                if progress:
+                    progress(processed)
+        self._save_batch(batch, report)
+        if progress and processed % batch_size:
+            progress(processed)
+        logging.info("Bulk user import: %s", report)
+        return report
+
+    def _save_batch(self, batch: Dict[str, User], report: ImportReport):
+        if not batch:
+            return
+        with self.storage.transaction():
+            for user_id, user in batch.items():
+                self.storage.put_record("users", user_id, user.to_dict())
+        for user in batch.values():
+            self.users[user.user_id] = user
+            self._name_index.add(user.user_id, user.name)
+            self._fuzzy_index.add(user.user_id, user.name)
+        self.query_cache.invalidate()
+        report.added += len(batch)
+
+    @timed("library_manager_seconds", manager="users", operation="update_user")
     def update_user(self, user_id: str, name: Optional[str] = None) -> bool:
         """
         Updates the name of a user identified by their user ID.
@@ -62,19 +151,23 @@ class UserManager:
         Returns:
             bool: True if the user was updated, False otherwise.
         """
-        for user in self.users:
-            if user.user_id == user_id:
-                if name is not None:
-                    user.name = name
-                self.save_users()
-                logging.info(f"User updated: ID: {user_id}")
-                return True
-        logging.warning(f"User not found for update: ID: {user_id}")
-        return False
+        user = self.users.get(user_id)
+        if user is None:
+            logging.warning("User not found for update: ID: %s", user_id)
+            return False
+        if name is not None:
+            user.name = name
+            self._name_index.update(user_id, name)
+            self._fuzzy_index.update(user_id, name)
+            self.query_cache.invalidate()
+        self.storage.put_record("users", user_id, user.to_dict())
+        logging.info("User updated: ID: %s", user_id)
+        return True
 
+    @timed("library_manager_seconds", manager="users", operation="delete_user")
     def delete_user(self, user_id: str) -> bool:
         """
-        Deletes a user from the library identified by their user ID.
+        Deletes a user from the library identified by their user ID, along with their holds.
 
         Parameters:
             user_id (str): The ID of the user to delete.
@@ -82,15 +175,19 @@ class UserManager:
         Returns:
             bool: True if the user was deleted, False otherwise.
         """
-        for i, user in enumerate(self.users):
-            if user.user_id == user_id:
-                del self.users[i]
-                self.save_users()
-                logging.info(f"User deleted: ID: {user_id}")
-                return True
-        logging.warning(f"User not found for deletion: ID: {user_id}")
-        return False
+        if self.users.pop(user_id, None) is None:
+            logging.warning("User not found for deletion: ID: %s", user_id)
+            return False
+        self._name_index.remove(user_id)
+        self._fuzzy_index.remove(user_id)
+        self.query_cache.invalidate()
+        self.storage.delete_record("users", user_id)
+        if self.reservations is not None:
+            self.reservations.remove_user_holds(user_id)
+        logging.info("User deleted: ID: %s", user_id)
+        return True
 
+    @timed("library_manager_seconds", manager="users", operation="find_user_by_id")
     def find_user_by_id(self, user_id: str) -> Optional[User]:
         """
         Finds a user by their user ID.
@@ -101,8 +198,17 @@ class UserManager:
         Returns:
             Optional[User]: The found user or None if not found.
         """
-        return next((user for user in self.users if user.user_id == user_id), None)
+        if self._users is None:
+            # Until the users are loaded, answer from the storage's key index if it has one.
+            try:
+                data = self.storage.find_record("users", user_id)
+            except NotImplementedError:
+                pass
+            else:
+                return User(**data) if data is not None else None
+        return self.users.get(user_id)
 
+    @timed("library_manager_seconds", manager="users", operation="find_users_by_name")
     def find_users_by_name(self, name: str) -> List[User]:
         """
         Finds users whose names contain the given substring.
@@ -113,17 +219,95 @@ class UserManager:
         Returns:
             List[User]: A list of users that match the search criteria.
         """
-        return [user for user in self.users if name.lower() in user.name.lower()]
+        users = self.users
+        return list(self.query_cache.get_or_compute(
+            ("name", name.casefold()), lambda: [users[user_id] for user_id in self._name_index.find(name)]))
+
+    @timed("library_manager_seconds", manager="users", operation="search_users")
+    def search_users(self, query: str, limit: Optional[int] = 10, offset: int = 0) -> List[Tuple[User, float]]:
+        """
+        Searches user names for every word of the query, best matches first.
+
+        Parameters:
+            query (str): The words or word fragments to search for.
+            limit (Optional[int]): The maximum number of results to return, or None for all.
+            offset (int): The number of leading results to skip, for pagination.
 
-    def list_users(self) -> None:
+        Returns:
+            List[Tuple[User, float]]: (user, score) pairs ordered by descending score.
         """
-        Prints a list of all users in the library.
+        users = self.users
+
+        def search():
+            return [(users[user_id], score) for user_id, score in self._name_index.search(query, limit, offset)]
+        return list(self.query_cache.get_or_compute(("search", tuple(sorted(tokenize(query))), limit, offset), search))
+
+    @timed("library_manager_seconds", manager="users", operation="fuzzy_search_users")
+    def fuzzy_search_users(self, query: str, limit: Optional[int] = 10) -> List[Tuple[User, float]]:
         """
-        if not self.users:
-            print("No users available.")
-            return
-        for user in self.users:
-            print(f"ID: {user.user_id}, Name: {user.name}")
+        Searches user names for the words of the query, tolerating typos. See
+        FuzzyIndex.search for the scoring.
+
+        Parameters:
+            query (str): The words to search for.
+            limit (Optional[int]): The maximum number of results to return, or None for all.
+
+        Returns:
+            List[Tuple[User, float]]: (user, score) pairs ordered by descending score, 1.0 being an exact match.
+        """
+        users = self.users
+
+        def search():
+            return [(users[user_id], score) for user_id, score in self._fuzzy_index.search(query, limit)]
+        return list(self.query_cache.get_or_compute(("fuzzy", tuple(tokenize(query)), limit), search))
+
+    def iter_users(self, where: Optional[Callable[[User], bool]] = None, sort: Optional[str] = None,
+                   descending: bool = False, offset: int = 0, limit: Optional[int] = None,
+                   after: Optional[str] = None) -> Iterator[User]:
+        """
+        Lazily lists the users in the library. Without a sort the users are
+        streamed in registration order in constant memory.
+
+        Parameters:
+            where (Optional[Callable[[User], bool]]): Keeps only the users it returns True for.
+            sort (Optional[str]): The field to order by: 'name' or 'user_id'.
+            descending (bool): Whether to list the largest values first.
+            offset (int): The number of leading users to skip.
+            limit (Optional[int]): The maximum number of users to list, or None for all.
+            after (Optional[str]): A cursor returned by page_users; only users after it are listed.
+
+        Returns:
+            Iterator[User]: The matching users, in order.
+
+        Raises:
+            ValueError: If the sort field or cursor is invalid.
+        """
+        return stream(self.users.values(), USER_KEY, where, sort_key(sort, USER_SORT_FIELDS),
+                      descending, offset, limit, after)
+
+    def page_users(self, limit: int = 20, where: Optional[Callable[[User], bool]] = None,
+                   sort: Optional[str] = None, descending: bool = False, after: Optional[str] = None) -> Page[User]:
+        """
+        Fetches one page of users using cursor pagination. Parameters are as for iter_users.
+
+        Returns:
+            Page[User]: The users on the page and the cursor of the next page.
+        """
+        return page(self.users.values(), USER_KEY, limit, where, sort_key(sort, USER_SORT_FIELDS), descending, after)
+
+    def list_users(self, where: Optional[Callable[[User], bool]] = None, sort: Optional[str] = None,
+                   descending: bool = False, offset: int = 0, limit: Optional[int] = None,
+                   page_size: Optional[int] = None) -> int:
+        """
+        Prints the users in the library as they are listed, pausing every
+        page_size users. Parameters are as for iter_users.
+
+        Returns:
+            int: The number of users printed.
+        """
+        users = self.iter_users(where, sort, descending, offset, limit)
+        return print_lines((f"ID: {user.user_id}, Name: {user.name}" for user in users), "No users available.",
+                           page_size)
 '''
 
     def to_dict(self) -> dict:
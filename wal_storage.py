@@ -0,0 +1,333 @@
+# wal_storage.py
+
+import atexit
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+from metrics import increment, timed
+from storage import StorageBackend, record_key
+
+SECTIONS = ("books", "users", "checkouts", "holds")
+
+_MISSING = object()
+
+
+class WALStorage(StorageBackend):
+    """
+    Storage engine that appends each mutation as a compact record to a
+    write-ahead log instead of rewriting the whole JSON file.
+
+    The log is fsynced on a group-commit schedule (every group_commit_size
+    records or every sync_interval seconds, whichever comes first) and is
+    compacted by a background thread into a snapshot that uses the same JSON
+    layout as Storage, so a compacted snapshot can still be opened by Storage.
+
+    Attributes:
+        filename (str): The file path for the JSON snapshot.
+        log_filename (str): The file path for the write-ahead log.
+        group_commit_size (int): Number of appended records that forces an fsync.
+        sync_interval (float): Maximum number of seconds between fsyncs.
+        compact_threshold (int): Number of log records that triggers a compaction.
+    """
+
+    def __init__(self, filename: str = 'library_data.json', group_commit_size: int = 64,
+                 sync_interval: float = 0.2, compact_threshold: int = 10000):
+        self.filename = filename
+        self.log_filename = filename + '.wal'
+        self.group_commit_size = group_commit_size
+        self.sync_interval = sync_interval
+        self.compact_threshold = compact_threshold
+
+        self._lock = threading.RLock()
+        self._sections: Dict[str, Dict[str, Any]] = {section: {} for section in SECTIONS}
+        self._unsynced = 0
+        self._log_records = 0
+        self._last_sync = time.monotonic()
+        self._compacting = False
+        self._txn_depth = 0
+        self._txn_undo: List[Any] = []
+        self._txn_lines: List[str] = []
+
+        self._recover()
+        self._log = open(self.log_filename, 'a', encoding='utf-8')
+
+        self._stop = threading.Event()
+        self._worker = threading.Thread(target=self._run, name='wal-storage', daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+
+    def _recover(self):
+        """
+        Rebuilds the in-memory state from the snapshot and replays the logs on top.
+        A log left over from an interrupted compaction is replayed first.
+        """
+        try:
+            with open(self.filename, 'r', encoding='utf-8') as file:
+                snapshot = json.load(file)
+        except FileNotFoundError:
+            snapshot = {}
+        for section, records in snapshot.items():
+            self._sections[section] = {record_key(section, r): r for r in records}
+
+        leftover = self.log_filename + '.compacting'
+        for path in (leftover, self.log_filename):
+            self._log_records += self._replay(path)
+        if os.path.exists(leftover):
+            # A compaction was interrupted: finish it before accepting new records.
+            self._write_snapshot(self.read())
+            os.remove(leftover)
+            if os.path.exists(self.log_filename):
+                os.remove(self.log_filename)
+            self._log_records = 0
+
+    def _replay(self, path: str) -> int:
+        """
+        Applies the records of a log file to the in-memory state. A torn final
+        record, left by a crash mid-append, is cut off the log so that records
+        appended after recovery start on a line of their own.
+
+        Returns:
+            int: The number of records replayed.
+        """
+        count = 0
+        try:
+            with open(path, 'r+b') as file:
+                size = 0
+                for line in file:
+                    try:
+                        if not line.endswith(b'\n'):
+                            raise ValueError("record without its line end")
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Everything before the torn record is intact.
+                        logging.warning("Truncating torn record at byte %d of %s", size, path)
+                        file.truncate(size)
+                        os.fsync(file.fileno())
+                        break
+                    self._apply(entry)
+                    count += 1
+                    size += len(line)
+        except FileNotFoundError:
+            pass
+        return count
+
+    def _apply(self, entry: Dict[str, Any]):
+        op, section = entry['op'], entry['s']
+        if op == 'put':
+            self._sections.setdefault(section, {})[entry['k']] = entry['r']
+        elif op == 'del':
+            self._sections.setdefault(section, {}).pop(entry['k'], None)
+        elif op == 'set':
+            self._sections[section] = {record_key(section, r): r for r in entry['r']}
+
+    def _append(self, entry: Dict[str, Any]):
+        with self._lock:
+            line = json.dumps(entry, separators=(',', ':')) + '\n'
+            if self._txn_depth:
+                # Inside a transaction: remember how to undo the change and hold the
+                # record back until the transaction commits.
+                section = entry['s']
+                records = self._sections.setdefault(section, {})
+                if entry['op'] == 'set':
+                    self._txn_undo.append((section, None, records))
+                else:
+                    self._txn_undo.append((section, entry['k'], records.get(entry['k'], _MISSING)))
+                self._apply(entry)
+                self._txn_lines.append(line)
+                return
+            self._apply(entry)
+            self._log.write(line)
+            increment("library_storage_bytes_written_total", len(line))
+            self._unsynced += 1
+            self._log_records += 1
+            if self._unsynced >= self.group_commit_size:
+                self._sync()
+
+    def _sync(self):
+        """
+        Flushes and fsyncs the log. Must be called with the lock held.
+        """
+        if self._unsynced:
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    @timed("library_storage_seconds", operation="read")
+    def read(self) -> Dict[str, List[Any]]:
+        """
+        Returns the current state of every section.
+
+        Returns:
+            A dictionary with keys for 'books', 'users', and 'checkouts', each mapping to a list of items.
+        """
+        with self._lock:
+            return {section: list(records.values()) for section, records in self._sections.items()}
+
+    @timed("library_storage_seconds", operation="write")
+    def write(self, data: Dict[str, List[Any]]) -> None:
+        """
+        Replaces the given sections. Sections that are not present in data are preserved.
+
+        Parameters:
+            data (Dict[str, List[Any]]): The sections to be replaced.
+        """
+        for section, records in data.items():
+            self._append({'op': 'set', 's': section, 'r': records})
+
+    @timed("library_storage_seconds", operation="put_record")
+    def put_record(self, section: str, key: str, record: Dict[str, Any]) -> None:
+        """
+        Inserts or replaces a single record of a section by appending it to the log.
+
+        Parameters:
+            section (str): The section the record belongs to, e.g. 'books'.
+            key (str): The key identifying the record within the section.
+            record (Dict[str, Any]): The record to be stored.
+        """
+        self._append({'op': 'put', 's': section, 'k': key, 'r': record})
+
+    @timed("library_storage_seconds", operation="delete_record")
+    def delete_record(self, section: str, key: str) -> None:
+        """
+        Removes a single record of a section by appending a deletion to the log.
+
+        Parameters:
+            section (str): The section the record belongs to, e.g. 'books'.
+            key (str): The key identifying the record within the section.
+        """
+        self._append({'op': 'del', 's': section, 'k': key})
+
+    @contextmanager
+    def _begin(self) -> Iterator[None]:
+        """
+        Holds the log lock for a transaction. Its records are appended and synced
+        together when it commits, and undone in memory if it fails.
+        """
+        with self._lock:
+            self._txn_depth += 1
+            try:
+                yield
+            except BaseException:
+                self._txn_depth -= 1
+                if not self._txn_depth:
+                    for section, key, previous in reversed(self._txn_undo):
+                        if key is None:
+                            self._sections[section] = previous
+                        elif previous is _MISSING:
+                            self._sections[section].pop(key, None)
+                        else:
+                            self._sections[section][key] = previous
+                    self._txn_undo, self._txn_lines = [], []
+                raise
+            self._txn_depth -= 1
+            if not self._txn_depth:
+                lines = ''.join(self._txn_lines)
+                self._log.write(lines)
+                increment("library_storage_bytes_written_total", len(lines))
+                self._unsynced += len(self._txn_lines)
+                self._log_records += len(self._txn_lines)
+                self._txn_undo, self._txn_lines = [], []
+                self._sync()
+
+    def flush(self) -> None:
+        """
+        Forces every appended record to disk without waiting for the group commit.
+        """
+        with self._lock:
+            self._sync()
+
+    @timed("library_storage_seconds", operation="compact")
+    def compact(self) -> None:
+        """
+        Writes the current state to a new snapshot and discards the log records it covers.
+
+        Mutations are only blocked while the log is rotated and the state is copied;
+        the snapshot itself is serialized without holding the lock. If writing the
+        snapshot fails, the rotated records stay pending and the next compaction
+        retries them.
+        """
+        rotated = self.log_filename + '.compacting'
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+            try:
+                self._sync()
+                self._log.close()
+                if os.path.exists(rotated):
+                    # A failed compaction left records no snapshot covers yet: keep
+                    # them, and add the new records after them.
+                    with open(self.log_filename, 'rb') as source, open(rotated, 'ab') as target:
+                        size = target.tell()
+                        try:
+                            shutil.copyfileobj(source, target)
+                            target.flush()
+                            os.fsync(target.fileno())
+                        except BaseException:
+                            target.truncate(size)
+                            raise
+                    os.remove(self.log_filename)
+                else:
+                    os.replace(self.log_filename, rotated)
+            except BaseException:
+                self._compacting = False
+                raise
+            finally:
+                self._log = open(self.log_filename, 'a', encoding='utf-8')
+            pending, self._log_records = self._log_records, 0
+            state = {section: list(records.values()) for section, records in self._sections.items()}
+        try:
+            self._write_snapshot(state)
+            os.remove(rotated)
+            logging.info("Storage compacted into snapshot %s", self.filename)
+        except BaseException:
+            with self._lock:
+                self._log_records += pending
+            raise
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def _write_snapshot(self, state: Dict[str, List[Any]]):
+        tmp_filename = self.filename + '.tmp'
+        with open(tmp_filename, 'w', encoding='utf-8') as file:
+            json.dump(state, file, separators=(',', ':'))
+            file.flush()
+            os.fsync(file.fileno())
+            increment("library_storage_bytes_written_total", file.tell())
+        os.replace(tmp_filename, self.filename)
+
+    def _run(self):
+        """
+        Background loop that performs the time-based group commit and compaction.
+        """
+        while not self._stop.wait(self.sync_interval):
+            with self._lock:
+                if self._unsynced and time.monotonic() - self._last_sync >= self.sync_interval:
+                    self._sync()
+                needs_compaction = self._log_records >= self.compact_threshold
+            if needs_compaction:
+                try:
+                    self.compact()
+                except OSError as e:
+                    logging.error("Storage compaction failed: %s", e)
+
+    def close(self) -> None:
+        """
+        Stops the background thread and syncs any outstanding log records.
+        """
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._worker.join()
+        with self._lock:
+            self._sync()
+            self._log.close()
+        atexit.unregister(self.close)